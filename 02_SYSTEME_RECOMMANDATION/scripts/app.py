@@ -1,102 +1,504 @@
-from flask import Flask, request, jsonify
+from flask import Flask, Response, g, request, jsonify
 from flasgger import Swagger
+import hashlib
+import os
 import pickle
+import sys
+import threading
+import time
 from flask_cors import CORS
 import numpy as np
 import pandas as pd
-from sentence_transformers import SentenceTransformer
-from sklearn.metrics.pairwise import cosine_similarity
+
+from embeddings_titres import charger_embeddings_titres, encoder_titres
+from index_titres import creer_index_titres
+from stockage_similarite import charger_matrice_similarite
+from index_logements import charger_index_logements, enrichir_logement as _enrichir_logement
+from matrice_utilisateur_item import (ajuster_knn_creux, candidats_collaboratifs_lot,
+                                      charger_matrice_utilisateur_item)
+from scoring_hybride import classer_vecteurs, construire_table_index, vecteurs_candidats
+from recommandations_precalculees import charger_table_recommandations
+from voisins_precalcules import charger_table_voisins
+from registre_artefacts import RegistreArtefacts
+from artefacts_colonnes import COLONNES_DF_GROUPED, COLONNES_METADATA, fichier_source, lire_table
+from encodeur_micro_lots import EncodeurMicroLots
+from cache_reponses import BackendRedis, CacheReponses, cle_requete
+from cache_embeddings import CacheEmbeddings
+from encodeur_onnx import charger_modele_embeddings, identifiant_modele_charge
+from metriques import SEAUX_TAILLES, Chronometre, RegistreMetriques
+
+# Paramètres de performance partagés avec le chatbot (cache_results, cache_size, cache_ttl)
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             '03_CHATBOT', 'config'))
+try:
+    from config_chatbot import PERFORMANCE_CONFIG
+except ImportError:
+    PERFORMANCE_CONFIG = {}
 
 app = Flask(__name__)
 CORS(app, origins=["http://localhost:3000"])  # <-- ici
 swagger = Swagger(app)
 
-# Chargement des fichiers nécessaires
-with open('knn_model.pkl', 'rb') as f:
-    knn_model = pickle.load(f)
+# Chargement des fichiers nécessaires : en parallèle et en arrière-plan
+# (voir registre_artefacts.py) ; /ready indique quand le service est prêt
+registre = RegistreArtefacts(max_workers=int(os.environ.get('ARTEFACT_LOADER_THREADS', 4)))
+
+def _lire_pickle(chemin):
+    with open(chemin, 'rb') as f:
+        return pickle.load(f)
+
+# Seules les colonnes utilisées sont lues (depuis l'export Arrow s'il est à jour)
+def _lire_df_grouped(chemin):
+    return lire_table(chemin, COLONNES_DF_GROUPED)
+
+def _lire_metadata(chemin):
+    return lire_table(chemin, COLONNES_METADATA)
+
+MODELE_BERT = 'all-MiniLM-L6-v2'
+
+# EMBEDDING_BACKEND=onnx : modèle exporté en ONNX int8 (encodeur_onnx.py),
+# avec repli automatique sur SentenceTransformer (PyTorch)
+def _charger_bert():
+    return charger_modele_embeddings(MODELE_BERT)
+
+registre.declarer_fichier('knn_model_pickle', 'knn_model.pkl', _lire_pickle)
+
+# Matrice utilisateur-item creuse (CSR/CSC) et KNN ajusté dessus
+registre.declarer('user_item_matrix', lambda: charger_matrice_utilisateur_item('user_item_matrix.pkl'))
+registre.declarer('knn_model', ajuster_knn_creux, depend_de=('user_item_matrix', 'knn_model_pickle'))
+
+registre.declarer_fichier('df_grouped', 'df_grouped.pkl', _lire_df_grouped)
+# Lu seulement si listing_index.pkl doit être reconstruit
+registre.declarer_fichier('metadata', 'metadata.pkl', _lire_metadata, optionnel=True)
+
+registre.declarer('table_index', lambda: construire_table_index(_lire_pickle('id_to_index.pkl')))
+
+# Matrice mappée en mémoire (pages partagées entre workers) ;
+# SIMILARITY_FORMAT='float16' ou 'topk' pour une forme compressée
+SIMILARITY_FORMAT = os.environ.get('SIMILARITY_FORMAT', 'dense')
+SIMILARITY_TOP_K = int(os.environ.get('SIMILARITY_TOP_K', 50))
+registre.declarer('similarity_matrix_bert', lambda: charger_matrice_similarite(
+    'similarity_matrix_bert.npy', SIMILARITY_FORMAT, k=SIMILARITY_TOP_K
+))
+registre.declarer('bert_model', _charger_bert)
 
-user_item_matrix = pd.read_pickle('user_item_matrix.pkl')
-metadata = pd.read_pickle('metadata.pkl')
-df_grouped = pd.read_pickle('df_grouped.pkl')
+# Un titre par logement : df_grouped contient une ligne par avis
+registre.declarer('logements_titres',
+                  lambda df_grouped: df_grouped.drop_duplicates("id_listing").reset_index(drop=True),
+                  depend_de=('df_grouped',))
 
-with open('id_to_index.pkl', 'rb') as f:
-    id_to_index = pickle.load(f)
+# Embeddings des titres calculés une seule fois (reconstruits si df_grouped.pkl ou le backend change)
+registre.declarer('titres_embeddings',
+                  lambda logements_titres, bert_model: charger_embeddings_titres(
+                      logements_titres, bert_model, source_file=fichier_source('df_grouped.pkl'),
+                      model_name=identifiant_modele_charge(bert_model, MODELE_BERT)),
+                  depend_de=('logements_titres', 'bert_model'))
 
-similarity_matrix_bert = np.load('similarity_matrix_bert.npy')
-bert_model = SentenceTransformer('all-MiniLM-L6-v2')
+# Index des titres : 'exact' (défaut), 'ivf' ou 'faiss' pour les grands catalogues
+TITLE_INDEX_MODE = os.environ.get('TITLE_INDEX_MODE', 'exact')
+registre.declarer('index_titres', lambda emb: creer_index_titres(emb, TITLE_INDEX_MODE),
+                  depend_de=('titres_embeddings',))
 
-# Charger la vraie DataFrame des reviews (adapté à ton fichier)
-# Exemple pickle :
-all_reviews2 = pd.read_pickle('df_grouped.pkl')
+# Charger la vraie DataFrame des reviews (adapté à ton fichier) : même pickle
+# que df_grouped, désérialisé une seule fois
+registre.declarer_fichier('all_reviews2', 'df_grouped.pkl', _lire_df_grouped, optionnel=True)
 # ou CSV si tu préfères :
-# all_reviews2 = pd.read_csv('all_reviews_final.csv')
+# registre.declarer_fichier('all_reviews2', 'all_reviews_final.csv', pd.read_csv, optionnel=True)
 
-def recommander_hybride_par_titre(titre_saisi, top_n=5, alpha=0.5, beta=0.5):
-    titre_embedding = bert_model.encode([titre_saisi])
-    titres = df_grouped["title"].fillna("").tolist()
-    titres_embeddings = bert_model.encode(titres)
+# Recommandations pré-calculées par logement (voir recommandations_precalculees.py),
+# chargées à la première requête ; ignorées si construites pour une autre forme
+# de similarité ou un autre KNN
+registre.declarer('table_precalculee',
+                  lambda uim, knn: charger_table_recommandations(
+                      uim, knn, 'similarity_matrix_bert.npy', SIMILARITY_FORMAT, SIMILARITY_TOP_K),
+                  depend_de=('user_item_matrix', 'knn_model'), optionnel=True)
 
-    similarities = cosine_similarity(titre_embedding, titres_embeddings)[0]
-    idx_best = similarities.argmax()
+# Voisins KNN et candidats pré-calculés par logement (voir voisins_precalcules.py) :
+# une référence unique présente dans la table ne passe pas par le KNN
+registre.declarer('table_voisins', charger_table_voisins,
+                  depend_de=('user_item_matrix', 'knn_model'), optionnel=True)
 
-    logement_ref = df_grouped.iloc[idx_best]
-    id_listing_ref = logement_ref["id_listing"]
+# Métadonnées et avis positifs indexés par id_listing (listing_index.pkl) ;
+# metadata et les avis ne sont chargés que si l'index doit être reconstruit
+registre.declarer('index_logements', lambda: charger_index_logements(
+    lambda: registre['metadata'], lambda: registre['all_reviews2'],
+    fichier_source('metadata.pkl'), fichier_source('df_grouped.pkl')))
 
-    users_ayant_note = user_item_matrix[user_item_matrix[id_listing_ref].notna()].index.tolist()
-    if not users_ayant_note:
-        return {"error": "Aucun utilisateur trouvé ayant noté ce logement."}
+# Requêtes HTTP en cours dans ce worker (mises à jour par _debut_requete / _fin_requete)
+_verrou_requetes = threading.Lock()
+_requetes_en_cours = 0
 
-    user_vector_moyen = user_item_matrix.loc[users_ayant_note].mean()
+def requetes_en_cours():
+    return _requetes_en_cours
 
-    distances, indices = knn_model.kneighbors([user_vector_moyen.fillna(0)], n_neighbors=10)
-    similar_users = user_item_matrix.index[indices.flatten()[1:]]
+# Threads par worker (RECO_THREADS, fixé par serveur_production.py) : un worker
+# synchrone n'a qu'une requête à la fois, attendre d'autres titres serait inutile
+THREADS_WORKER = int(os.environ.get('RECO_THREADS', 1))
+
+# Titres des requêtes concurrentes encodés ensemble : un lot part à ENCODER_MAX_BATCH
+# titres, après ENCODER_MAX_WAIT_MS millisecondes (0 : seulement les titres déjà en file),
+# ou dès que toutes les requêtes en cours y ont déposé leurs titres
+encodeur_titres = EncodeurMicroLots(
+    lambda titres: encoder_titres(registre['bert_model'], titres),
+    max_batch=int(os.environ.get('ENCODER_MAX_BATCH', 64)),
+    max_wait_ms=float(os.environ.get('ENCODER_MAX_WAIT_MS', 5 if THREADS_WORKER > 1 else 0)),
+    requetes_en_cours=requetes_en_cours
+)
+
+# Embeddings des titres saisis en cache par (modèle, titre normalisé) : seuls les
+# titres absents partent à l'encodeur ; RECO_EMBEDDING_CACHE_DIR ajoute un cache
+# disque conservé entre les redémarrages (et partagé avec le chatbot). La clé est
+# celle du modèle réellement chargé : ONNX, ou PyTorch après un repli
+registre.declarer('cache_embeddings', lambda bert_model: CacheEmbeddings(
+    identifiant_modele_charge(bert_model, MODELE_BERT), encodeur_titres.encoder_sync,
+    taille_memoire_mo=PERFORMANCE_CONFIG.get('embedding_cache_mb', 64),
+    dossier=os.environ.get('RECO_EMBEDDING_CACHE_DIR', PERFORMANCE_CONFIG.get('embedding_cache_dir'))
+), depend_de=('bert_model',))
+
+registre.demarrer()
+
+# Fichiers dont dépendent les réponses : leur taille et date forment la version du cache
+FICHIERS_ARTEFACTS = (
+    'knn_model.pkl', 'user_item_matrix.pkl', 'user_item_matrix.feather', 'user_item_sparse.pkl',
+    'df_grouped.pkl', 'df_grouped.feather', 'metadata.pkl', 'metadata.feather', 'id_to_index.pkl',
+    'similarity_matrix_bert.npy', 'title_embeddings_bert.npy', 'listing_index.pkl',
+    'recommandations_precalculees.npz', 'voisins_precalcules.npz'
+)
+
+def version_artefacts():
+    """Empreinte (taille, date de modification) des artefacts et des réglages de chargement"""
+    h = hashlib.blake2b(digest_size=8)
+    for chemin in FICHIERS_ARTEFACTS:
+        if os.path.exists(chemin):
+            etat = os.stat(chemin)
+            h.update(f"{chemin}:{etat.st_size}:{etat.st_mtime_ns};".encode())
+    for variable in ('SIMILARITY_FORMAT', 'SIMILARITY_TOP_K', 'TITLE_INDEX_MODE', 'EMBEDDING_BACKEND'):
+        h.update(f"{variable}={os.environ.get(variable, '')};".encode())
+    return h.hexdigest()
+
+def _backend_cache():
+    """Backend partagé entre workers si RECO_CACHE_REDIS_URL est défini"""
+    url = os.environ.get('RECO_CACHE_REDIS_URL')
+    if not url:
+        return None
+    import redis
+    return BackendRedis(redis.Redis.from_url(url))
+
+# Réponses en cache par (titre normalisé, top_n, alpha, beta, top_k_refs) ; un
+# nouveau chargement des artefacts (serveur_production.py) repart d'un cache vide
+cache_reponses = CacheReponses(
+    taille=PERFORMANCE_CONFIG.get('cache_size', 100),
+    ttl=PERFORMANCE_CONFIG.get('cache_ttl', 3600),
+    backend=_backend_cache(),
+    version=version_artefacts(),
+    actif=PERFORMANCE_CONFIG.get('cache_results', True)
+)
+
+# Vecteurs des candidats (id, sim_bert, note_estimee) par jeu de références :
+# re-pondérer un résultat ne relance ni le KNN ni la lecture des similarités
+cache_candidats = CacheReponses(
+    taille=PERFORMANCE_CONFIG.get('candidate_cache_size', 1000),
+    ttl=None,
+    actif=PERFORMANCE_CONFIG.get('cache_results', True)
+)
+
+# Les fichiers d'artefacts sont relus au plus toutes les RECO_ARTEFACT_CHECK_S secondes
+INTERVALLE_VERIFICATION_S = float(os.environ.get('RECO_ARTEFACT_CHECK_S', 5))
+_verrou_version = threading.Lock()
+_version_chargee = None
+_prochaine_verification = 0.0
+
+def verifier_version_artefacts():
+    """
+    Vide les caches si les fichiers d'artefacts ont changé depuis le chargement
 
-    logements_candidats = user_item_matrix.loc[similar_users].mean().dropna()
-    logements_candidats = logements_candidats.drop(id_listing_ref, errors='ignore')
+    La version de référence est relevée une fois les artefacts chargés (les
+    fichiers dérivés, title_embeddings_bert.npy ou listing_index.pkl, ont pu
+    être écrits pendant le chargement). Si un fichier change ensuite, les
+    réponses en cache sont abandonnées et plus rien n'est mis en cache : ce
+    worker sert encore les anciens artefacts jusqu'au rechargement
+    (serveur_production.py --recharger), ses réponses ne doivent pas être
+    partagées sous la nouvelle version.
+
+    Returns:
+        bool: True si les caches viennent d'être vidés
+    """
+    global _version_chargee, _prochaine_verification
+    maintenant = time.monotonic()
+    if maintenant < _prochaine_verification or not registre.pret():
+        return False
+    with _verrou_version:
+        if maintenant < _prochaine_verification or not cache_reponses.actif:
+            return False
+        _prochaine_verification = maintenant + INTERVALLE_VERIFICATION_S
+        version = version_artefacts()
+        if _version_chargee is None:
+            _version_chargee = version
+            if version != cache_reponses.version:
+                cache_reponses.invalider(version)
+            return False
+        if version == _version_chargee:
+            return False
+        print("⚠️ Artefacts modifiés sur le disque : caches vidés et désactivés jusqu'au rechargement")
+        for cache in (cache_reponses, cache_candidats):
+            cache.invalider()
+            cache.actif = False
+        return True
+
+# Métriques exposées sur /metrics (format Prometheus)
+metriques = RegistreMetriques()
+duree_etapes = metriques.histogramme(
+    'recommandation_etape_secondes', "Durée de chaque étape d'un lot de recommandations",
+    etiquettes=('etape',))
+taille_candidats = metriques.histogramme(
+    'recommandation_candidats', 'Nombre de logements candidats classés par requête',
+    seaux=SEAUX_TAILLES)
+reponses_servies = metriques.compteur(
+    'recommandation_reponses_total', 'Réponses de recommandation par origine',
+    etiquettes=('source',))
+voisins_servis = metriques.compteur(
+    'recommandation_voisins_total', 'Jeux de références résolus par la table des voisins ou par le KNN',
+    etiquettes=('source',))
+duree_requetes = metriques.histogramme(
+    'http_requete_secondes', 'Durée des requêtes HTTP', etiquettes=('endpoint', 'statut'))
+
+def precharger_artefacts():
+    """
+    Charge tous les artefacts servis, optionnels compris, puis arrête les threads
+    de chargement : appelé par serveur_production.py avant le fork des workers
+    """
+    registre.attendre()
+    registre['table_precalculee']
+    registre['table_voisins']
+    registre.fermer()
+
+def enrichir_logement(id_logement, score_final, sim_bert, note_estimee):
+    """Construit la recommandation d'un logement avec ses métadonnées et avis positifs"""
+    return _enrichir_logement(registre['index_logements'], id_logement, score_final, sim_bert, note_estimee)
+
+def _references(scores_refs, indices_refs):
+    """Logements de référence trouvés par l'index des titres et leurs id notés"""
+    positions_refs = [int(i) for i in indices_refs if i >= 0]
+    logements_ref = registre['logements_titres'].iloc[positions_refs]
+    user_item_matrix = registre['user_item_matrix']
+    ids_listing_ref = [i for i in logements_ref["id_listing"].tolist() if user_item_matrix.contient_item(i)]
+    references = [
+        {"id_listing": int(ref["id_listing"]),
+         "title": ref["title"] if pd.notna(ref["title"]) else None,
+         "similarity": float(score)}
+        for (_, ref), score in zip(logements_ref.iterrows(), scores_refs)
+    ]
+    return references, ids_listing_ref
+
+def recommander_lot(requetes, chrono=None):
+    """
+    Recommandations hybrides pour plusieurs titres, avec plusieurs pondérations
+
+    Chaque pondération de "weights" est traitée comme une requête de plus
+    (même titre, autres alpha/beta) : elles partagent l'encodage, la recherche
+    des références et les vecteurs des candidats, seul le classement change.
+
+    Args:
+        requetes (list): dicts avec "title", "top_n", "alpha", "beta", "top_k_refs"
+            et optionnellement "weights" (liste de couples (alpha, beta))
+        chrono (Chronometre): Reçoit la durée de chaque étape (cache, encodage,
+            references, utilisateurs, knn, scoring, enrichissement)
+
+    Returns:
+        list: Une réponse par requête, dans l'ordre d'entrée ; avec "weights",
+            la clé "weightings" donne les recommandations de chaque pondération
+    """
+    etendues, plages = [], []
+    for r in requetes:
+        debut = len(etendues)
+        etendues.append(r)
+        etendues.extend(dict(r, alpha=alpha, beta=beta) for alpha, beta in r.get("weights", ()))
+        plages.append((debut, len(etendues)))
+
+    chrono = chrono if chrono is not None else Chronometre()
+    reponses = _recommander_lot_en_cache(etendues, chrono)
+    for etape, duree in chrono.durees.items():
+        duree_etapes.observer(duree, etape=etape)
+
+    resultats = []
+    for debut, fin in plages:
+        reponse = reponses[debut]
+        if fin - debut > 1 and "error" not in reponse:
+            reponse = dict(reponse, weightings=[
+                {"alpha": e["alpha"], "beta": e["beta"], "recommendations": rep.get("recommendations", [])}
+                for e, rep in zip(etendues[debut + 1:fin], reponses[debut + 1:fin])
+            ])
+        resultats.append(reponse)
+    return resultats
+
+def _recommander_lot_en_cache(requetes, chrono):
+    """
+    Recommandations servies depuis le cache des réponses si possible
+
+    Les requêtes absentes du cache (une seule fois par clé) sont calculées
+    ensemble par `_calculer_lot` puis mises en cache.
+
+    Args:
+        requetes (list): dicts avec "title", "top_n", "alpha", "beta", "top_k_refs"
+        chrono (Chronometre): Durées des étapes
+
+    Returns:
+        list: Une réponse par requête, dans l'ordre d'entrée
+    """
+    verifier_version_artefacts()
+    resultats = [None] * len(requetes)
+    manquantes = {}
+    for i, requete in enumerate(requetes):
+        cle = cle_requete(requete)
+        resultats[i] = cache_reponses.lire(cle)
+        if resultats[i] is None:
+            manquantes.setdefault(cle, []).append(i)
+    reponses_servies.incrementer(len(requetes) - sum(map(len, manquantes.values())), source='cache')
+    chrono.marquer('cache')
 
-    results = []
-    idx_ref = id_to_index.get(id_listing_ref)
+    calcules = _calculer_lot([requetes[positions[0]] for positions in manquantes.values()], chrono)
+    for (cle, positions), reponse in zip(manquantes.items(), calcules):
+        cache_reponses.ecrire(cle, reponse)
+        for i in positions:
+            resultats[i] = reponse
+    return resultats
 
-    for id_logement, note_estimee in logements_candidats.items():
-        idx_candidat = id_to_index.get(id_logement)
-        if idx_candidat is None or idx_ref is None:
+def _calculer_lot(requetes, chrono):
+    """
+    Recommandations hybrides pour plusieurs titres en un seul passage
+
+    Un seul encodage BERT pour tous les titres, une seule recherche dans
+    l'index des titres et un seul appel au KNN.
+
+    Args:
+        requetes (list): dicts avec "title", "top_n", "alpha", "beta", "top_k_refs"
+        chrono (Chronometre): Durées des étapes
+
+    Returns:
+        list: Une réponse par requête, dans l'ordre d'entrée
+    """
+    if not requetes:
+        return []
+
+    # Seuls les titres saisis absents du cache sont encodés (avec ceux des requêtes
+    # concurrentes) ; les titres du catalogue sont pré-calculés
+    embeddings = registre['cache_embeddings'].encoder([r["title"] for r in requetes])
+    chrono.marquer('encodage')
+
+    k_max = max(r["top_k_refs"] for r in requetes)
+    scores_refs, indices_refs = registre['index_titres'].rechercher(embeddings, k=k_max)
+    table_precalculee = registre['table_precalculee']
+
+    resultats = [None] * len(requetes)
+    references = [None] * len(requetes)
+    ids_refs = [None] * len(requetes)
+    tops = [None] * len(requetes)
+    a_calculer = []
+    for i, r in enumerate(requetes):
+        k = r["top_k_refs"]
+        references[i], ids_refs[i] = _references(scores_refs[i, :k], indices_refs[i, :k])
+
+        # Référence unique déjà connue : lecture de la ligne pré-calculée
+        if table_precalculee is not None and len(ids_refs[i]) == 1:
+            tops[i] = table_precalculee.servir(ids_refs[i][0], r["alpha"], r["beta"], r["top_n"])
+            if tops[i] is not None:
+                continue
+        a_calculer.append(i)
+    reponses_servies.incrementer(len(requetes) - len(a_calculer), source='precalcule')
+    chrono.marquer('references')
+
+    # Vecteurs des candidats par jeu de références : depuis le cache, sinon depuis les
+    # voisins pré-calculés (référence unique), sinon utilisateurs ayant noté les
+    # références (tranches CSC), vecteurs moyens creux, un seul KNN
+    vecteurs = {}
+    for cle in dict.fromkeys(tuple(ids_refs[i]) for i in a_calculer):
+        vecteurs[cle] = cache_candidats.lire(cle)
+    manquantes = [cle for cle, v in vecteurs.items() if v is None]
+    table_voisins = registre['table_voisins']
+    candidats = {}
+    if table_voisins is not None:
+        for cle in manquantes:
+            if len(cle) == 1 and cle[0] in table_voisins:
+                candidats[cle] = table_voisins.candidats(cle[0])
+    sans_table = [cle for cle in manquantes if cle not in candidats]
+    voisins_servis.incrementer(len(candidats), source='table')
+    voisins_servis.incrementer(len(sans_table), source='knn')
+    candidats.update(zip(sans_table, candidats_collaboratifs_lot(
+        registre['user_item_matrix'], registre['knn_model'], [list(cle) for cle in sans_table], chrono=chrono)))
+    for cle, candidats_cle in candidats.items():
+        # () : personne n'a noté ces références (mis en cache aussi)
+        vecteurs[cle] = () if candidats_cle is None else vecteurs_candidats(
+            registre['similarity_matrix_bert'], registre['table_index'], list(cle), *candidats_cle)
+        cache_candidats.ecrire(cle, vecteurs[cle])
+
+    for i in a_calculer:
+        vecteurs_i = vecteurs[tuple(ids_refs[i])]
+        taille_candidats.observer(len(vecteurs_i[0]) if vecteurs_i else 0)
+        if not vecteurs_i:
+            reponses_servies.incrementer(source='aucun_utilisateur')
+            resultats[i] = {"error": "Aucun utilisateur trouvé ayant noté ce logement."}
             continue
+        r = requetes[i]
+        # Scoring vectorisé ; les métadonnées ne sont jointes que pour les top_n retenus
+        tops[i] = classer_vecteurs(*vecteurs_i, r["alpha"], r["beta"], r["top_n"])
+        reponses_servies.incrementer(source='calcul')
+    chrono.marquer('scoring')
 
-        sim_bert = similarity_matrix_bert[idx_ref, idx_candidat]
-        score_final = alpha * float(sim_bert) + beta * (float(note_estimee) / 5.0)
-
-        meta = metadata[metadata["id_listing"] == id_logement]
-        rating = meta["rating_review_moyen"].values[0] if not meta.empty else None
-        accuracy = meta["accuracy_moyen"].values[0] if not meta.empty else None
-
-        subset = all_reviews2[all_reviews2["id_listing"] == id_logement]
-        if not subset.empty:
-            infos = subset.iloc[0].to_dict()
-        else:
-            infos = {}
-
-        reviews_pos = all_reviews2[
-            (all_reviews2["id_listing"] == id_logement) & 
-            (all_reviews2["sentiment_bert"] == "positive")
-        ]["localizedText"].dropna().tolist()
-
-        results.append({
-            "id_listing": int(id_logement),
-            "score": float(score_final),
-            "similarity_bert": float(sim_bert),
-            "note_estimée_knn": float(note_estimee),
-            "rating": float(rating) if rating is not None else None,
-            "accuracy": float(accuracy) if accuracy is not None else None,
-            "title": infos.get("title", None),
-            "city_listing": infos.get("city_listing", None),
-            "description": (infos.get("description", "")[:300] + "...") if infos.get("description") else None,
-            "sentiment_moyen": float(infos.get("sentiment_moyen", 0)) if "sentiment_moyen" in infos else None,
-            "reviews_positives": reviews_pos[:3]
-        })
-
-    top_results = sorted(results, key=lambda x: x["score"], reverse=True)[:top_n]
-
-    return {"recommendations": top_results}
+    for i, top in enumerate(tops):
+        if top is not None:
+            resultats[i] = {"references": references[i],
+                            "recommendations": [enrichir_logement(*l) for l in zip(*top)]}
+    chrono.marquer('enrichissement')
+    return resultats
+
+def recommander_hybride_par_titre(titre_saisi, top_n=5, alpha=0.5, beta=0.5, top_k_refs=1, weights=(),
+                                  chrono=None):
+    return recommander_lot([{"title": titre_saisi, "top_n": top_n, "alpha": alpha,
+                             "beta": beta, "top_k_refs": top_k_refs, "weights": list(weights)}], chrono)[0]
+
+def _lire_entier(data, nom, defaut, minimum=1):
+    """Lit un paramètre entier du corps JSON ; lève ValueError avec un message lisible"""
+    try:
+        valeur = int(data.get(nom, defaut))
+    except (TypeError, ValueError):
+        raise ValueError(f"{nom} must be an integer")
+    if valeur < minimum:
+        raise ValueError(f"{nom} must be >= {minimum}")
+    return valeur
+
+def _lire_reel(data, nom, defaut):
+    """Lit un paramètre réel du corps JSON ; lève ValueError avec un message lisible"""
+    try:
+        return float(data.get(nom, defaut))
+    except (TypeError, ValueError):
+        raise ValueError(f"{nom} must be a number")
+
+def _debug_demande(data):
+    """Détail des durées demandé par "debug": true dans le corps ou ?debug=1"""
+    return data.get('debug') is True or request.args.get('debug', '').lower() in ('1', 'true')
+
+def _durees_ms(chrono, debut):
+    """Durées des étapes en millisecondes, et durée totale depuis `debut`"""
+    durees = {etape: round(duree * 1000, 3) for etape, duree in chrono.durees.items()}
+    durees["total"] = round((time.perf_counter() - debut) * 1000, 3)
+    return durees
+
+# Nombre maximal de pondérations ("weights") par titre
+MAX_WEIGHTINGS = int(os.environ.get('MAX_WEIGHTINGS', 50))
+
+def _lire_ponderations(data):
+    """Lit "weights" (liste de {"alpha", "beta"}) en couples (alpha, beta) ; lève ValueError"""
+    poids = data.get('weights')
+    if poids is None:
+        return []
+    if not isinstance(poids, list) or len(poids) > MAX_WEIGHTINGS:
+        raise ValueError(f"weights must be a list of at most {MAX_WEIGHTINGS} objects")
+    ponderations = []
+    for position, p in enumerate(poids):
+        if not isinstance(p, dict):
+            raise ValueError(f"weights[{position}] must be an object with alpha and beta")
+        ponderations.append((_lire_reel(p, 'alpha', 0.5), _lire_reel(p, 'beta', 0.5)))
+    return ponderations
 
 @app.route('/recommend', methods=['POST'])
 def recommend():
@@ -117,12 +519,52 @@ def recommend():
             title:
               type: string
               example: "Appartement moderne avec vue sur mer"
+            top_n:
+              type: integer
+              default: 5
+            alpha:
+              type: number
+              default: 0.5
+              description: Poids de la similarité de contenu (BERT)
+            beta:
+              type: number
+              default: 0.5
+              description: Poids de la note collaborative (KNN)
+            weights:
+              type: array
+              description: Pondérations supplémentaires, classées sur les mêmes candidats
+              items:
+                type: object
+                properties:
+                  alpha:
+                    type: number
+                  beta:
+                    type: number
+            top_k_refs:
+              type: integer
+              default: 1
+              description: Nombre de logements de référence retenus pour le titre
+            debug:
+              type: boolean
+              default: false
+              description: Ajoute "timings_ms" (aussi avec ?debug=1)
     responses:
       200:
         description: Résultats de recommandation
         schema:
           type: object
           properties:
+            references:
+              type: array
+              items:
+                type: object
+                properties:
+                  id_listing:
+                    type: integer
+                  title:
+                    type: string
+                  similarity:
+                    type: number
             recommendations:
               type: array
               items:
@@ -152,19 +594,347 @@ def recommend():
                     type: array
                     items:
                       type: string
+            weightings:
+              type: array
+              description: Avec "weights", les recommandations de chaque pondération
+              items:
+                type: object
+                properties:
+                  alpha:
+                    type: number
+                  beta:
+                    type: number
+                  recommendations:
+                    type: array
+                    items:
+                      type: object
+            timings_ms:
+              type: object
+              description: Avec "debug", durée de chaque étape (cache, encodage, references, utilisateurs, knn, scoring, enrichissement) et totale
     """
+    debut = time.perf_counter()
     data = request.json
     titre = data.get('title', '')
     if not titre:
         return jsonify({"error": "Title is required"}), 400
 
-    recommendations = recommander_hybride_par_titre(titre)
+    try:
+        parametres = {
+            "top_n": _lire_entier(data, 'top_n', 5),
+            "alpha": _lire_reel(data, 'alpha', 0.5),
+            "beta": _lire_reel(data, 'beta', 0.5),
+            "top_k_refs": _lire_entier(data, 'top_k_refs', 1),
+            "weights": _lire_ponderations(data)
+        }
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    chrono = Chronometre() if _debug_demande(data) else None
+    recommendations = recommander_hybride_par_titre(titre, chrono=chrono, **parametres)
+    if chrono is not None:
+        recommendations = dict(recommendations, timings_ms=_durees_ms(chrono, debut))
     return jsonify(recommendations)
 
+# Nombre maximal de titres par appel à /recommend/batch
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))
+
+@app.route('/recommend/batch', methods=['POST'])
+def recommend_batch():
+    """
+    Recommandations hybrides pour plusieurs titres en un seul appel
+    ---
+    tags:
+      - Recommandation
+    parameters:
+      - name: body
+        in: body
+        required: true
+        schema:
+          type: object
+          required:
+            - requests
+          properties:
+            requests:
+              type: array
+              items:
+                type: object
+                required:
+                  - title
+                properties:
+                  title:
+                    type: string
+                    example: "Appartement moderne avec vue sur mer"
+                  top_n:
+                    type: integer
+                    default: 5
+                  alpha:
+                    type: number
+                    default: 0.5
+                  beta:
+                    type: number
+                    default: 0.5
+                  top_k_refs:
+                    type: integer
+                    default: 1
+                  weights:
+                    type: array
+                    description: Pondérations supplémentaires (voir /recommend)
+                    items:
+                      type: object
+            debug:
+              type: boolean
+              default: false
+              description: Ajoute "timings_ms" (aussi avec ?debug=1)
+    responses:
+      200:
+        description: Une réponse par titre, dans l'ordre de la requête (même format que /recommend)
+        schema:
+          type: object
+          properties:
+            results:
+              type: array
+              items:
+                type: object
+            timings_ms:
+              type: object
+              description: Avec "debug", durée de chaque étape pour tout le lot
+      400:
+        description: Corps de requête invalide
+    """
+    debut = time.perf_counter()
+    data = request.get_json(silent=True) or {}
+    items = data.get('requests')
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "requests must be a non-empty list"}), 400
+    if len(items) > MAX_BATCH_SIZE:
+        return jsonify({"error": f"At most {MAX_BATCH_SIZE} requests per batch"}), 400
+
+    requetes = []
+    for position, item in enumerate(items):
+        if isinstance(item, str):
+            item = {"title": item}
+        if not isinstance(item, dict) or not item.get('title'):
+            return jsonify({"error": f"requests[{position}]: title is required"}), 400
+        try:
+            requetes.append({
+                "title": str(item['title']),
+                "top_n": _lire_entier(item, 'top_n', 5),
+                "alpha": _lire_reel(item, 'alpha', 0.5),
+                "beta": _lire_reel(item, 'beta', 0.5),
+                "top_k_refs": _lire_entier(item, 'top_k_refs', 1),
+                "weights": _lire_ponderations(item)
+            })
+        except ValueError as e:
+            return jsonify({"error": f"requests[{position}]: {e}"}), 400
+
+    chrono = Chronometre() if _debug_demande(data) else None
+    reponse = {"results": recommander_lot(requetes, chrono)}
+    if chrono is not None:
+        reponse["timings_ms"] = _durees_ms(chrono, debut)
+    return jsonify(reponse)
+
+@app.route('/ready')
+def ready():
+    """
+    État du chargement des artefacts (sonde de disponibilité)
+    ---
+    tags:
+      - Service
+    responses:
+      200:
+        description: Tous les artefacts obligatoires sont chargés
+        schema:
+          type: object
+          properties:
+            status:
+              type: string
+              example: ready
+            artefacts:
+              type: object
+              description: Par artefact, statut (en_attente, charge, erreur, differe) et durée de chargement
+      503:
+        description: Chargement en cours
+      500:
+        description: Échec du chargement d'un artefact
+    """
+    etat = registre.etat()
+    if registre.pret():
+        return jsonify({"status": "ready", "artefacts": etat})
+    if any(e["statut"] == "erreur" for e in etat.values()):
+        return jsonify({"status": "error", "artefacts": etat}), 500
+    return jsonify({"status": "loading", "artefacts": etat}), 503
+
+@app.route('/stats/encoder')
+def stats_encoder():
+    """
+    Statistiques de l'encodage des titres par micro-lots
+    ---
+    tags:
+      - Service
+    responses:
+      200:
+        description: Compteurs, taille moyenne des lots et percentiles des latences (ms)
+        schema:
+          type: object
+          properties:
+            max_batch:
+              type: integer
+            max_wait_ms:
+              type: number
+            requetes:
+              type: integer
+            lots:
+              type: integer
+            taille_lot_moyenne:
+              type: number
+            latence_ms:
+              type: object
+              description: p50, p95 et p99 du temps entre la mise en file et le résultat
+            attente_ms:
+              type: object
+              description: p50, p95 et p99 de l'attente avant encodage
+            encodage_ms:
+              type: object
+              description: p50, p95 et p99 de la durée d'encodage d'un lot
+    """
+    return jsonify(encodeur_titres.statistiques())
+
+@app.route('/stats/embeddings')
+def stats_embeddings():
+    """
+    Statistiques du cache des embeddings de titres
+    ---
+    tags:
+      - Service
+    responses:
+      200:
+        description: Compteurs, taux de succès et temps économisé
+        schema:
+          type: object
+          properties:
+            modele:
+              type: string
+            entrees_memoire:
+              type: integer
+            octets_memoire:
+              type: integer
+            taille_max_octets:
+              type: integer
+            entrees_disque:
+              type: integer
+              description: Vecteurs du cache disque (null sans cache disque)
+            taux_hits:
+              type: number
+            temps_encodage_s:
+              type: number
+            temps_economise_s:
+              type: number
+              description: Hits x durée moyenne d'encodage d'un titre
+            hits_memoire:
+              type: integer
+            hits_disque:
+              type: integer
+            misses:
+              type: integer
+            evictions:
+              type: integer
+    """
+    return jsonify(registre['cache_embeddings'].statistiques())
+
+@app.route('/stats/cache')
+def stats_cache():
+    """
+    Statistiques du cache des réponses
+    ---
+    tags:
+      - Service
+    responses:
+      200:
+        description: Compteurs et paramètres du cache
+        schema:
+          type: object
+          properties:
+            actif:
+              type: boolean
+            taille_max:
+              type: integer
+            ttl_s:
+              type: number
+            entrees:
+              type: integer
+            version:
+              type: string
+              description: Version des artefacts incluse dans les clés
+            backend:
+              type: string
+            taux_hits:
+              type: number
+            hits:
+              type: integer
+            hits_partages:
+              type: integer
+              description: Réponses trouvées dans le backend partagé
+            misses:
+              type: integer
+            evictions:
+              type: integer
+            expirations:
+              type: integer
+            invalidations:
+              type: integer
+            candidats:
+              type: object
+              description: Mêmes compteurs pour le cache des vecteurs candidats par jeu de références
+    """
+    return jsonify(dict(cache_reponses.statistiques(), candidats=cache_candidats.statistiques()))
+
+@app.before_request
+def _debut_requete():
+    global _requetes_en_cours
+    g.debut_requete = time.perf_counter()
+    with _verrou_requetes:
+        _requetes_en_cours += 1
+    g.requete_comptee = True
+
+@app.teardown_request
+def _fin_requete_comptee(exception=None):
+    global _requetes_en_cours
+    if g.pop('requete_comptee', False):
+        with _verrou_requetes:
+            _requetes_en_cours -= 1
+
+@app.after_request
+def _fin_requete(reponse):
+    debut = g.get('debut_requete')
+    if debut is not None and request.endpoint is not None:
+        duree_requetes.observer(time.perf_counter() - debut, endpoint=request.endpoint,
+                                statut=reponse.status_code)
+    return reponse
+
+@app.route('/metrics')
+def metrics():
+    """
+    Métriques du worker au format texte Prometheus
+    ---
+    tags:
+      - Service
+    produces:
+      - text/plain
+    responses:
+      200:
+        description: >
+          Histogrammes recommandation_etape_secondes (par étape),
+          recommandation_candidats (taille des ensembles de candidats) et
+          http_requete_secondes ; compteurs recommandation_reponses_total (par origine)
+          et recommandation_voisins_total (table des voisins ou KNN)
+    """
+    return Response(metriques.exposer(), content_type='text/plain; version=0.0.4; charset=utf-8')
+
 @app.route('/')
 def index():
     return "Bienvenue dans le système de recommandation. Accédez à la documentation Swagger via /apidocs/."
 
 if __name__ == '__main__':
+    # Serveur de développement ; en production : python serveur_production.py
     app.run(debug=True)
 
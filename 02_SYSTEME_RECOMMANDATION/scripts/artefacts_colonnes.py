@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Artefacts colonnaires (Arrow IPC / Feather) du recommandeur
+===========================================================
+
+Les pickles pandas (`metadata.pkl`, `df_grouped.pkl`, `user_item_matrix.pkl`)
+sont lents à charger, dépendants de la version de Python/pandas et chargent
+toutes les colonnes. Ce module les exporte au format Arrow IPC (Feather v2)
+à côté du pickle (`df_grouped.pkl` -> `df_grouped.feather`) et relit seulement
+les colonnes utilisées par le service.
+
+- fichiers non compressés par défaut : lecture par mappage mémoire, sans
+  décodage (pages partagées entre processus, comme la matrice de similarité)
+- chaque export garde l'empreinte, la taille et la date du pickle source :
+  tant que taille et date sont inchangées, le pickle n'est même pas haché ;
+  s'il a changé, il est relu (avec un avertissement) jusqu'au prochain export
+- sans pickle, l'export est utilisé directement
+- la matrice utilisateur-item (presque entièrement NaN) est exportée en
+  triplets (ligne, colonne, note) : seules les notes connues sont écrites
+- sans pyarrow, les pickles sont lus comme avant
+
+Utilisation :
+    python artefacts_colonnes.py [--compression lz4|zstd]  # export des pickles présents
+    python artefacts_colonnes.py --benchmark                # temps de chargement et mémoire
+"""
+
+import json
+import os
+
+import numpy as np
+import pandas as pd
+
+from embeddings_titres import empreinte_fichier, memoriser_empreinte
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# Colonnes lues par le service
+COLONNES_METADATA = ('id_listing', 'rating_review_moyen', 'accuracy_moyen')
+COLONNES_DF_GROUPED = ('id_listing', 'title', 'city_listing', 'description',
+                       'sentiment_moyen', 'sentiment_bert', 'localizedText')
+
+CLE_SOURCE = b'source_sha256'
+CLE_ETAT_SOURCE = b'source_taille_mtime'
+CLE_AXES = b'axes_utilisateur_item'
+
+
+def chemin_colonnes(chemin_pickle):
+    """`df_grouped.pkl` -> `df_grouped.feather`"""
+    return os.path.splitext(chemin_pickle)[0] + '.feather'
+
+
+def _schema(chemin_feather):
+    with pa.memory_map(chemin_feather) as source:
+        return pa.ipc.open_file(source).schema
+
+
+def _etat_fichier(chemin):
+    etat = os.stat(chemin)
+    return f"{etat.st_size}:{etat.st_mtime_ns}".encode()
+
+
+def export_utilisable(chemin_pickle):
+    """
+    Indique si l'export colonnaire peut remplacer le pickle
+
+    Args:
+        chemin_pickle (str): Pickle d'origine
+
+    Returns:
+        bool: True si l'export existe et correspond au pickle (ou si le pickle est absent)
+    """
+    chemin_feather = chemin_colonnes(chemin_pickle)
+    if not PYARROW_AVAILABLE or not os.path.exists(chemin_feather):
+        return False
+    if not os.path.exists(chemin_pickle):
+        return True
+    metadonnees = _schema(chemin_feather).metadata or {}
+    source = metadonnees.get(CLE_SOURCE, b'').decode()
+    if metadonnees.get(CLE_ETAT_SOURCE) == _etat_fichier(chemin_pickle):
+        # Pickle intact depuis l'export : son empreinte est celle notée dans l'export
+        memoriser_empreinte(chemin_pickle, source)
+        return True
+    if source != empreinte_fichier(chemin_pickle):
+        print(f"⚠️ {chemin_feather} ne correspond plus à {chemin_pickle} : lecture du pickle")
+        return False
+    return True
+
+
+def fichier_source(chemin_pickle):
+    """
+    Fichier dont l'empreinte identifie les données (clé des caches dérivés)
+
+    Le pickle s'il existe (les caches existants restent valides), sinon l'export.
+    """
+    return chemin_pickle if os.path.exists(chemin_pickle) else chemin_colonnes(chemin_pickle)
+
+
+def _ecrire(table, chemin_feather, chemin_pickle, compression, extra=None):
+    """Écrit la table avec l'empreinte du pickle source dans les métadonnées du schéma"""
+    metadonnees = dict(table.schema.metadata or {})
+    metadonnees[CLE_SOURCE] = empreinte_fichier(chemin_pickle).encode()
+    metadonnees[CLE_ETAT_SOURCE] = _etat_fichier(chemin_pickle)
+    metadonnees.update(extra or {})
+    feather.write_feather(table.replace_schema_metadata(metadonnees), chemin_feather,
+                          compression=compression)
+
+
+def exporter_table(chemin_pickle, chemin_feather=None, compression='uncompressed'):
+    """
+    Exporte un DataFrame picklé (metadata, df_grouped) au format Arrow IPC
+
+    Args:
+        chemin_pickle (str): Pickle d'origine
+        chemin_feather (str): Fichier de sortie (défaut : même nom en .feather)
+        compression (str): 'uncompressed' (mappage mémoire), 'lz4' ou 'zstd'
+
+    Returns:
+        str: Chemin du fichier écrit
+    """
+    chemin_feather = chemin_feather or chemin_colonnes(chemin_pickle)
+    df = pd.read_pickle(chemin_pickle)
+    _ecrire(pa.Table.from_pandas(df), chemin_feather, chemin_pickle, compression)
+    print(f"✅ {chemin_pickle} exporté vers {chemin_feather} ({df.shape[0]:,} lignes, {df.shape[1]} colonnes)")
+    return chemin_feather
+
+
+def lire_table(chemin_pickle, colonnes=None):
+    """
+    Lit un DataFrame depuis son export colonnaire (colonnes demandées seulement),
+    ou depuis le pickle si l'export est absent ou périmé
+
+    Args:
+        chemin_pickle (str): Pickle d'origine
+        colonnes (tuple): Colonnes à lire ; celles absentes du fichier sont ignorées
+
+    Returns:
+        DataFrame: Données lues
+    """
+    if export_utilisable(chemin_pickle):
+        chemin_feather = chemin_colonnes(chemin_pickle)
+        if colonnes is not None:
+            disponibles = set(_schema(chemin_feather).names)
+            colonnes = [c for c in colonnes if c in disponibles]
+        return feather.read_table(chemin_feather, columns=colonnes, memory_map=True).to_pandas()
+
+    df = pd.read_pickle(chemin_pickle)
+    if colonnes is not None:
+        df = df[[c for c in colonnes if c in df.columns]]
+    return df
+
+
+def exporter_matrice_utilisateur_item(chemin_pickle='user_item_matrix.pkl', chemin_feather=None,
+                                      compression='uncompressed'):
+    """
+    Exporte la matrice utilisateur-item dense en triplets (ligne, colonne, note)
+
+    L'ordre des utilisateurs et des logements est conservé dans les métadonnées
+    du schéma : la matrice relue est identique, colonnes vides comprises.
+
+    Args:
+        chemin_pickle (str): DataFrame dense d'origine (NaN = note inconnue)
+        chemin_feather (str): Fichier de sortie (défaut : même nom en .feather)
+        compression (str): 'uncompressed', 'lz4' ou 'zstd'
+
+    Returns:
+        str: Chemin du fichier écrit
+    """
+    chemin_feather = chemin_feather or chemin_colonnes(chemin_pickle)
+    df = pd.read_pickle(chemin_pickle)
+    valeurs = df.to_numpy(dtype=np.float32)
+    lignes, colonnes = np.nonzero(~np.isnan(valeurs))
+    table = pa.table({
+        'ligne': lignes.astype(np.int32),
+        'colonne': colonnes.astype(np.int32),
+        'note': valeurs[lignes, colonnes]
+    })
+    axes = json.dumps({'user_ids': df.index.tolist(), 'item_ids': df.columns.tolist()})
+    _ecrire(table, chemin_feather, chemin_pickle, compression, {CLE_AXES: axes.encode()})
+    print(f"✅ {chemin_pickle} exporté vers {chemin_feather} ({len(lignes):,} notes "
+          f"sur {valeurs.size:,} cases)")
+    return chemin_feather
+
+
+def lire_triplets_utilisateur_item(chemin_pickle='user_item_matrix.pkl'):
+    """
+    Relit l'export en triplets de la matrice utilisateur-item
+
+    Args:
+        chemin_pickle (str): Pickle d'origine (l'export est à côté)
+
+    Returns:
+        tuple: (lignes, colonnes, notes, user_ids, item_ids)
+    """
+    table = feather.read_table(chemin_colonnes(chemin_pickle), memory_map=True)
+    axes = json.loads(table.schema.metadata[CLE_AXES])
+    return (table.column('ligne').to_numpy(), table.column('colonne').to_numpy(),
+            table.column('note').to_numpy(), np.asarray(axes['user_ids']),
+            np.asarray(axes['item_ids']))
+
+
+def exporter_artefacts(metadata_file='metadata.pkl', reviews_file='df_grouped.pkl',
+                       user_item_file='user_item_matrix.pkl', compression='uncompressed'):
+    """Exporte au format Arrow IPC les pickles présents dans le dossier courant"""
+    if not PYARROW_AVAILABLE:
+        raise ImportError("pyarrow n'est pas installé : pip install pyarrow")
+    for chemin in (metadata_file, reviews_file):
+        if os.path.exists(chemin):
+            exporter_table(chemin, compression=compression)
+    if os.path.exists(user_item_file):
+        exporter_matrice_utilisateur_item(user_item_file, compression=compression)
+
+
+def _memoire_residente():
+    """Mémoire résidente actuelle du processus en Mo (pic si /proc est absent)"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _mesurer_chargement(fonction, resultats):
+    """Exécuté dans un processus séparé : durée et mémoire résidente ajoutée par le chargement"""
+    import time
+
+    avant = _memoire_residente()
+    debut = time.perf_counter()
+    donnees = fonction()
+    duree = time.perf_counter() - debut
+    resultats.put((duree, _memoire_residente() - avant))
+    del donnees
+
+
+def _charger_pickles(metadata_file, reviews_file, user_item_file):
+    return [pd.read_pickle(chemin) for chemin in (metadata_file, reviews_file, user_item_file)
+            if os.path.exists(chemin)]
+
+
+def _charger_colonnes(metadata_file, reviews_file, user_item_file):
+    donnees = [lire_table(metadata_file, COLONNES_METADATA),
+               lire_table(reviews_file, COLONNES_DF_GROUPED)]
+    if export_utilisable(user_item_file):
+        donnees.append(lire_triplets_utilisateur_item(user_item_file))
+    return donnees
+
+
+def comparer_formats(metadata_file='metadata.pkl', reviews_file='df_grouped.pkl',
+                     user_item_file='user_item_matrix.pkl', repetitions=3):
+    """
+    Compare le chargement des pickles complets et des exports colonnaires projetés
+
+    Chaque mesure tourne dans un nouveau processus (mémoire résidente isolée).
+
+    Returns:
+        dict: format -> (durée médiane en s, mémoire résidente ajoutée en Mo)
+    """
+    import functools
+    import multiprocessing
+
+    contexte = multiprocessing.get_context('spawn')
+    rapport = {}
+    for nom, fonction in (('pickle', _charger_pickles), ('arrow', _charger_colonnes)):
+        mesures = []
+        for _ in range(repetitions):
+            resultats = contexte.Queue()
+            processus = contexte.Process(target=_mesurer_chargement, args=(
+                functools.partial(fonction, metadata_file, reviews_file, user_item_file), resultats))
+            processus.start()
+            mesures.append(resultats.get())
+            processus.join()
+        durees, memoires = zip(*mesures)
+        rapport[nom] = (float(np.median(durees)), float(np.median(memoires)))
+    return rapport
+
+
+def main():
+    """Export des pickles au format Arrow IPC, ou comparaison des formats avec --benchmark"""
+    import sys
+
+    if '--benchmark' in sys.argv:
+        rapport = comparer_formats()
+        print("📊 Chargement des artefacts (médiane) :")
+        for nom, (duree, memoire) in rapport.items():
+            print(f"   {nom:<8} {duree:7.3f}s  {memoire:8.1f} Mo résidents")
+        return
+
+    compression = 'uncompressed'
+    if '--compression' in sys.argv:
+        compression = sys.argv[sys.argv.index('--compression') + 1]
+    exporter_artefacts(compression=compression)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de concurrence du serveur de production
+=================================================
+
+Démarre `serveur_production.py` avec 1, 2, 4... workers, attend `/ready`,
+envoie des requêtes `/recommend` depuis plusieurs processus clients pendant
+une durée fixe, puis affiche le débit (requêtes/s) et les latences p50/p95.
+
+Les clients tournent dans des processus séparés pour que le GIL du
+benchmark ne limite pas le débit mesuré. Sur une machine à N cœurs, le débit
+doit croître avec le nombre de workers jusqu'à environ N.
+
+À lancer depuis le dossier des artefacts :
+    python benchmark_concurrence.py [--workers 1,2,4] [--clients 8] [--duree 10]
+"""
+
+import argparse
+import http.client
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import time
+
+import numpy as np
+
+DOSSIER_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+TITRES_DEFAUT = [
+    "Appartement moderne avec vue sur mer",
+    "Villa avec piscine à Hammamet",
+    "Studio calme proche de la plage",
+    "Maison traditionnelle à Jerba",
+    "Chambre lumineuse centre-ville",
+]
+
+
+def _titres_catalogue(n=200):
+    """Titres tirés de df_grouped s'il est disponible, sinon une liste fixe"""
+    try:
+        sys.path.insert(0, DOSSIER_SCRIPTS)
+        from artefacts_colonnes import lire_table
+
+        titres = lire_table('df_grouped.pkl', ('title',))['title'].dropna().unique().tolist()
+        return random.Random(0).sample(titres, min(n, len(titres))) or TITRES_DEFAUT
+    except (OSError, ImportError, KeyError):
+        return TITRES_DEFAUT
+
+
+def _requete(hote, port, methode, chemin, corps=None, timeout=60):
+    connexion = http.client.HTTPConnection(hote, port, timeout=timeout)
+    try:
+        entetes = {'Content-Type': 'application/json'} if corps is not None else {}
+        connexion.request(methode, chemin, body=json.dumps(corps) if corps is not None else None,
+                          headers=entetes)
+        reponse = connexion.getresponse()
+        reponse.read()
+        return reponse.status
+    finally:
+        connexion.close()
+
+
+def attendre_pret(hote, port, timeout=600):
+    """Attend que /ready réponde 200"""
+    limite = time.monotonic() + timeout
+    while time.monotonic() < limite:
+        try:
+            if _requete(hote, port, 'GET', '/ready', timeout=5) == 200:
+                return
+        except OSError:
+            pass
+        time.sleep(0.5)
+    raise TimeoutError(f"Le serveur {hote}:{port} n'est pas prêt après {timeout}s")
+
+
+def _client(hote, port, titres, duree, graine):
+    """Boucle d'un processus client : latences (s) des requêtes réussies et nombre d'erreurs"""
+    aleatoire = random.Random(graine)
+    latences, erreurs = [], 0
+    fin = time.monotonic() + duree
+    while time.monotonic() < fin:
+        debut = time.perf_counter()
+        try:
+            statut = _requete(hote, port, 'POST', '/recommend', {'title': aleatoire.choice(titres)})
+        except OSError:
+            statut = None
+        if statut == 200:
+            latences.append(time.perf_counter() - debut)
+        else:
+            erreurs += 1
+    return latences, erreurs
+
+
+def mesurer(hote, port, titres, clients=8, duree=10.0):
+    """
+    Charge le serveur avec `clients` processus pendant `duree` secondes
+
+    Returns:
+        dict: requetes_par_s, p50_ms, p95_ms, erreurs
+    """
+    with multiprocessing.get_context('spawn').Pool(clients) as pool:
+        resultats = pool.starmap(_client, [(hote, port, titres, duree, i) for i in range(clients)])
+    latences = np.array([l for lat, _ in resultats for l in lat])
+    return {
+        'requetes_par_s': len(latences) / duree,
+        'p50_ms': float(np.percentile(latences, 50) * 1000) if len(latences) else float('nan'),
+        'p95_ms': float(np.percentile(latences, 95) * 1000) if len(latences) else float('nan'),
+        'erreurs': sum(e for _, e in resultats),
+    }
+
+
+def benchmark(liste_workers, clients=8, duree=10.0, port=5099):
+    """
+    Mesure le débit pour chaque nombre de workers
+
+    Returns:
+        dict: nombre de workers -> résultat de `mesurer`
+    """
+    titres = _titres_catalogue()
+    rapport = {}
+    for workers in liste_workers:
+        serveur = subprocess.Popen(
+            [sys.executable, os.path.join(DOSSIER_SCRIPTS, 'serveur_production.py'),
+             '--workers', str(workers), '--bind', f'127.0.0.1:{port}',
+             '--pid', f'benchmark_{port}.pid'],
+            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+        )
+        try:
+            attendre_pret('127.0.0.1', port)
+            # Préchauffage : premières requêtes de chaque worker
+            mesurer('127.0.0.1', port, titres, clients, min(2.0, duree))
+            rapport[workers] = mesurer('127.0.0.1', port, titres, clients, duree)
+        finally:
+            serveur.terminate()
+            serveur.wait()
+        r = rapport[workers]
+        print(f"   {workers:>2} worker(s) : {r['requetes_par_s']:8.1f} req/s  "
+              f"p50 {r['p50_ms']:7.1f} ms  p95 {r['p95_ms']:7.1f} ms  erreurs {r['erreurs']}")
+    return rapport
+
+
+def main():
+    """Benchmark du débit selon le nombre de workers"""
+    parser = argparse.ArgumentParser(description="Débit du serveur selon le nombre de workers")
+    parser.add_argument('--workers', default=None,
+                        help="Nombres de workers séparés par des virgules (défaut : 1, 2, 4... jusqu'au nombre de cœurs)")
+    parser.add_argument('--clients', type=int, default=8, help="Processus clients simultanés")
+    parser.add_argument('--duree', type=float, default=10.0, help="Durée de chaque mesure (s)")
+    parser.add_argument('--port', type=int, default=5099)
+    args = parser.parse_args()
+
+    if args.workers:
+        liste_workers = [int(w) for w in args.workers.split(',')]
+    else:
+        coeurs = multiprocessing.cpu_count()
+        liste_workers = sorted({min(2 ** i, coeurs) for i in range(coeurs.bit_length() + 1)})
+
+    print(f"📊 Débit de /recommend ({args.clients} clients, {args.duree:.0f}s par mesure, "
+          f"{multiprocessing.cpu_count()} cœurs) :")
+    benchmark(liste_workers, args.clients, args.duree, args.port)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache des embeddings de requêtes
+================================
+
+Le recommandeur (`all-MiniLM-L6-v2`) et le chatbot LangChain
+(`paraphrase-multilingual-MiniLM-L12-v2`) ré-encodent sans cesse les mêmes
+textes. `CacheEmbeddings` place devant la fonction d'encodage :
+- un cache en mémoire, LRU, borné en octets (`taille_memoire_mo`)
+- un cache disque optionnel (`dossier`) qui survit aux redémarrages : par
+  modèle, un fichier de vecteurs float32 mappé en mémoire et un index des
+  textes (JSON, une ligne par texte) ; les deux fichiers ne font que grandir,
+  et les vecteurs écrits par un autre processus sont relus à la demande
+- les clés sont (nom du modèle, texte normalisé) ; c'est le texte normalisé
+  qui est encodé, la valeur en cache ne dépend donc que de la clé
+
+La normalisation par défaut (Unicode NFKC, espaces réduits) garde la casse :
+le modèle multilingue y est sensible.
+
+Les compteurs (hits mémoire / disque, misses) et le temps d'encodage mesuré
+sur les misses donnent le taux de succès et le temps économisé.
+"""
+
+import json
+import os
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+import numpy as np
+
+try:
+    import fcntl
+    FCNTL_AVAILABLE = True
+except ImportError:
+    FCNTL_AVAILABLE = False
+
+DEFAULT_TAILLE_MEMOIRE_MO = 64
+
+_ESPACES = re.compile(r'\s+')
+_CARACTERES_NOM = re.compile(r'[^A-Za-z0-9._-]+')
+
+
+def normaliser_texte(texte):
+    """Forme canonique d'un texte : Unicode NFKC, espaces réduits (casse conservée)"""
+    return _ESPACES.sub(' ', unicodedata.normalize('NFKC', str(texte))).strip()
+
+
+class StockageDisque:
+    """
+    Vecteurs d'un modèle sur disque : `<modele>.f32` (float32 brut, mappé en
+    mémoire) et `<modele>.cles.jsonl` (en-tête puis une ligne [texte, rang])
+    """
+
+    def __init__(self, dossier, modele):
+        """
+        Args:
+            dossier (str): Dossier du cache (créé si besoin)
+            modele (str): Nom du modèle, utilisé pour nommer les fichiers
+        """
+        os.makedirs(dossier, exist_ok=True)
+        base = os.path.join(dossier, _CARACTERES_NOM.sub('_', modele))
+        self.modele = modele
+        self.chemin_vecteurs = base + '.f32'
+        self.chemin_cles = base + '.cles.jsonl'
+        self.dim = None
+        self._rangs = {}
+        self._position = 0
+        self._vecteurs = None
+
+    def __len__(self):
+        return len(self._rangs)
+
+    def _relire_index(self):
+        """Lit les lignes ajoutées à l'index depuis la dernière lecture"""
+        if not os.path.exists(self.chemin_cles) or os.path.getsize(self.chemin_cles) <= self._position:
+            return
+        with open(self.chemin_cles, 'rb') as f:
+            f.seek(self._position)
+            for ligne in f:
+                # Ligne en cours d'écriture par un autre processus : relue plus tard
+                if not ligne.endswith(b'\n'):
+                    break
+                self._position += len(ligne)
+                contenu = json.loads(ligne)
+                if isinstance(contenu, dict):
+                    if contenu.get('modele') != self.modele:
+                        raise ValueError(f"{self.chemin_cles} contient les vecteurs de {contenu.get('modele')}")
+                    self.dim = int(contenu['dim'])
+                else:
+                    self._rangs[contenu[0]] = int(contenu[1])
+
+    def _vue(self, rang_max):
+        """Mappe les vecteurs (de nouveau si le fichier a grandi)"""
+        if self._vecteurs is None or self._vecteurs.shape[0] <= rang_max:
+            n = os.path.getsize(self.chemin_vecteurs) // (4 * self.dim)
+            self._vecteurs = np.memmap(self.chemin_vecteurs, dtype='<f4', mode='r', shape=(n, self.dim))
+        return self._vecteurs
+
+    def lire(self, textes):
+        """
+        Args:
+            textes (list): Textes normalisés
+
+        Returns:
+            dict: texte -> vecteur (copie) pour les textes présents
+        """
+        if any(t not in self._rangs for t in textes):
+            self._relire_index()
+        trouves = {t: self._rangs[t] for t in textes if t in self._rangs}
+        if not trouves:
+            return {}
+        vecteurs = self._vue(max(trouves.values()))
+        return {t: np.array(vecteurs[rang]) for t, rang in trouves.items()}
+
+    def ecrire(self, textes, vecteurs):
+        """
+        Ajoute des vecteurs (les textes déjà présents sont ignorés)
+
+        Les vecteurs sont écrits avant leurs clés : une clé lue pointe toujours
+        vers un vecteur complet.
+        """
+        vecteurs = np.ascontiguousarray(vecteurs, dtype='<f4')
+        with open(self.chemin_cles, 'ab') as f_cles:
+            if FCNTL_AVAILABLE:
+                fcntl.flock(f_cles, fcntl.LOCK_EX)
+            try:
+                self._relire_index()
+                if self.dim is None:
+                    self.dim = int(vecteurs.shape[1])
+                    f_cles.write(json.dumps({'modele': self.modele, 'dim': self.dim}).encode() + b'\n')
+                elif self.dim != vecteurs.shape[1]:
+                    raise ValueError(f"Dimension {vecteurs.shape[1]} != {self.dim} pour {self.modele}")
+                nouveaux = [i for i, t in enumerate(textes) if t not in self._rangs]
+                if not nouveaux:
+                    return
+                with open(self.chemin_vecteurs, 'ab') as f_vecteurs:
+                    # Rang calculé depuis la taille : un ajout interrompu ne décale pas les suivants
+                    premier = f_vecteurs.tell() // (4 * self.dim)
+                    f_vecteurs.write(vecteurs[nouveaux].tobytes())
+                lignes = b''.join(json.dumps([textes[i], premier + j], ensure_ascii=False).encode() + b'\n'
+                                  for j, i in enumerate(nouveaux))
+                f_cles.write(lignes)
+                f_cles.flush()
+                self._position = f_cles.tell()
+                for j, i in enumerate(nouveaux):
+                    self._rangs[textes[i]] = premier + j
+            finally:
+                if FCNTL_AVAILABLE:
+                    fcntl.flock(f_cles, fcntl.LOCK_UN)
+
+
+class CacheEmbeddings:
+    """
+    Cache mémoire (LRU borné en octets) + disque des embeddings d'un modèle
+    """
+
+    def __init__(self, modele, fonction_encodage, taille_memoire_mo=DEFAULT_TAILLE_MEMOIRE_MO,
+                 dossier=None, normaliser=normaliser_texte):
+        """
+        Args:
+            modele (str): Nom du modèle (partie de la clé et du nom des fichiers)
+            fonction_encodage (callable): Liste de textes -> np.ndarray (n, d)
+            taille_memoire_mo (float): Taille maximale du cache mémoire en Mo
+            dossier (str): Dossier du cache disque, ou None (mémoire seule)
+            normaliser (callable): Texte -> forme canonique utilisée comme clé
+        """
+        self.modele = modele
+        self.fonction_encodage = fonction_encodage
+        self.taille_max = int(taille_memoire_mo * 1024 * 1024)
+        self.normaliser = normaliser
+        self.disque = StockageDisque(dossier, modele) if dossier else None
+        self._entrees = OrderedDict()
+        self._octets = 0
+        self._verrou = threading.Lock()
+        self._verrou_disque = threading.Lock()
+        self.compteurs = {'hits_memoire': 0, 'hits_disque': 0, 'misses': 0, 'evictions': 0}
+        self.temps_encodage = 0.0
+        self.textes_encodes = 0
+
+    def __len__(self):
+        return len(self._entrees)
+
+    def _ajouter_memoire(self, texte, vecteur):
+        cle = (self.modele, texte)
+        with self._verrou:
+            if cle in self._entrees:
+                self._entrees.move_to_end(cle)
+                return
+            self._entrees[cle] = vecteur
+            self._octets += vecteur.nbytes
+            while self._octets > self.taille_max and self._entrees:
+                _, ancien = self._entrees.popitem(last=False)
+                self._octets -= ancien.nbytes
+                self.compteurs['evictions'] += 1
+
+    def encoder(self, textes):
+        """
+        Embeddings des textes, encodés seulement s'ils ne sont pas en cache
+
+        Les textes absents (dédoublonnés) sont encodés en un seul appel.
+
+        Args:
+            textes (list): Textes à encoder
+
+        Returns:
+            np.ndarray: Embeddings float32 (len(textes), d), dans l'ordre des textes
+        """
+        normalises = [self.normaliser(t) for t in textes]
+        trouves = {}
+        with self._verrou:
+            for texte in set(normalises):
+                vecteur = self._entrees.get((self.modele, texte))
+                if vecteur is not None:
+                    self._entrees.move_to_end((self.modele, texte))
+                    trouves[texte] = vecteur
+        manquants = [t for t in dict.fromkeys(normalises) if t not in trouves]
+
+        depuis_disque = {}
+        if manquants and self.disque is not None:
+            with self._verrou_disque:
+                depuis_disque = self.disque.lire(manquants)
+            for texte, vecteur in depuis_disque.items():
+                self._ajouter_memoire(texte, vecteur)
+            trouves.update(depuis_disque)
+            manquants = [t for t in manquants if t not in depuis_disque]
+
+        if manquants:
+            debut = time.perf_counter()
+            vecteurs = np.asarray(self.fonction_encodage(manquants), dtype=np.float32)
+            duree = time.perf_counter() - debut
+            for texte, vecteur in zip(manquants, vecteurs):
+                trouves[texte] = vecteur
+                self._ajouter_memoire(texte, vecteur)
+            if self.disque is not None:
+                with self._verrou_disque:
+                    self.disque.ecrire(manquants, vecteurs)
+        else:
+            duree = 0.0
+
+        encodes = set(manquants)
+        n_disque = sum(1 for t in normalises if t in depuis_disque)
+        n_encodes = sum(1 for t in normalises if t in encodes)
+        with self._verrou:
+            self.compteurs['hits_disque'] += n_disque
+            self.compteurs['misses'] += n_encodes
+            self.compteurs['hits_memoire'] += len(normalises) - n_disque - n_encodes
+            self.temps_encodage += duree
+            self.textes_encodes += len(encodes)
+
+        if not normalises:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.stack([trouves[t] for t in normalises])
+
+    def vider(self):
+        """Vide le cache mémoire (le cache disque est conservé)"""
+        with self._verrou:
+            self._entrees.clear()
+            self._octets = 0
+
+    def statistiques(self):
+        """
+        Returns:
+            dict: Compteurs, taux de succès, temps d'encodage et temps économisé
+                (hits x durée moyenne d'encodage d'un texte distinct)
+        """
+        with self._verrou:
+            compteurs = dict(self.compteurs)
+            temps_encodage, textes_encodes = self.temps_encodage, self.textes_encodes
+            n_entrees, octets = len(self._entrees), self._octets
+        hits = compteurs['hits_memoire'] + compteurs['hits_disque']
+        lectures = hits + compteurs['misses']
+        cout_moyen = temps_encodage / textes_encodes if textes_encodes else None
+        return {
+            'modele': self.modele,
+            'entrees_memoire': n_entrees,
+            'octets_memoire': octets,
+            'taille_max_octets': self.taille_max,
+            'entrees_disque': len(self.disque) if self.disque is not None else None,
+            'taux_hits': hits / lectures if lectures else None,
+            'temps_encodage_s': temps_encodage,
+            'temps_economise_s': hits * cout_moyen if cout_moyen is not None else None,
+            **compteurs
+        }
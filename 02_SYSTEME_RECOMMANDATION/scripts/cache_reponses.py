@@ -0,0 +1,219 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache des réponses du recommandeur
+==================================
+
+Les mêmes titres populaires reviennent toute la journée : la réponse de
+`recommander_hybride_par_titre` est mise en cache, par clé
+(titre normalisé, top_n, alpha, beta, top_k_refs).
+
+- cache local borné : éviction LRU au-delà de `taille` entrées, expiration
+  après `ttl` secondes (`PERFORMANCE_CONFIG['cache_size']` / `['cache_ttl']`)
+- backend partagé optionnel (ex. Redis) consulté après le cache local, pour
+  partager les réponses entre workers ; `BackendMemoire` le remplace en test
+- chaque clé porte la version des artefacts : après un rechargement, les
+  réponses calculées avec les anciens artefacts ne sont plus servies
+- compteurs hits / misses / évictions / expirations exposés par le service
+
+Un backend partagé implémente `lire(cle)`, `ecrire(cle, valeur, ttl)` et
+`vider()` ; les valeurs sont des dicts sérialisables en JSON.
+"""
+
+import json
+import re
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+DEFAULT_CACHE_SIZE = 100
+DEFAULT_CACHE_TTL = 3600
+
+_ESPACES = re.compile(r'\s+')
+
+
+def normaliser_titre(titre):
+    """
+    Forme canonique d'un titre : Unicode NFKC, minuscules, espaces réduits
+
+    Le modèle BERT (all-MiniLM-L6-v2) ignore déjà la casse et les espaces
+    multiples : deux titres de même forme normalisée ont la même réponse.
+    """
+    return _ESPACES.sub(' ', unicodedata.normalize('NFKC', str(titre))).strip().lower()
+
+
+def cle_requete(requete):
+    """Clé de cache d'une requête (dict avec title, top_n, alpha, beta, top_k_refs)"""
+    return (normaliser_titre(requete['title']), int(requete['top_n']), float(requete['alpha']),
+            float(requete['beta']), int(requete.get('top_k_refs', 1)))
+
+
+class BackendMemoire:
+    """
+    Backend partagé en mémoire du processus (tests, ou service à un seul worker)
+    """
+
+    def __init__(self):
+        self._donnees = {}
+        self._verrou = threading.Lock()
+
+    def lire(self, cle):
+        with self._verrou:
+            entree = self._donnees.get(cle)
+            if entree is None:
+                return None
+            expiration, valeur = entree
+            if expiration is not None and expiration <= time.monotonic():
+                del self._donnees[cle]
+                return None
+        return json.loads(valeur)
+
+    def ecrire(self, cle, valeur, ttl=None):
+        expiration = time.monotonic() + ttl if ttl else None
+        with self._verrou:
+            self._donnees[cle] = (expiration, json.dumps(valeur))
+
+    def vider(self):
+        with self._verrou:
+            self._donnees.clear()
+
+
+class BackendRedis:
+    """
+    Backend partagé Redis (client `redis.Redis` fourni par l'appelant)
+    """
+
+    def __init__(self, client, prefixe='recommandation:'):
+        """
+        Args:
+            client (redis.Redis): Connexion Redis
+            prefixe (str): Préfixe des clés écrites
+        """
+        self.client = client
+        self.prefixe = prefixe
+
+    def lire(self, cle):
+        valeur = self.client.get(self.prefixe + cle)
+        return json.loads(valeur) if valeur is not None else None
+
+    def ecrire(self, cle, valeur, ttl=None):
+        self.client.set(self.prefixe + cle, json.dumps(valeur), ex=int(ttl) if ttl else None)
+
+    def vider(self):
+        for cle in self.client.scan_iter(match=self.prefixe + '*'):
+            self.client.delete(cle)
+
+
+class CacheReponses:
+    """
+    Cache LRU + TTL des réponses, avec backend partagé optionnel
+    """
+
+    def __init__(self, taille=DEFAULT_CACHE_SIZE, ttl=DEFAULT_CACHE_TTL, backend=None,
+                 version='', actif=True):
+        """
+        Args:
+            taille (int): Nombre maximal d'entrées du cache local
+            ttl (float): Durée de vie d'une entrée en secondes (None : pas d'expiration)
+            backend: Backend partagé (`lire`, `ecrire`, `vider`), ou None
+            version (str): Version des artefacts servis, incluse dans les clés
+            actif (bool): False pour désactiver le cache
+        """
+        self.taille = max(1, int(taille))
+        self.ttl = ttl
+        self.backend = backend
+        self.version = version
+        self.actif = actif
+        self._entrees = OrderedDict()
+        self._verrou = threading.Lock()
+        self.compteurs = {'hits': 0, 'hits_partages': 0, 'misses': 0,
+                          'evictions': 0, 'expirations': 0, 'invalidations': 0}
+
+    def __len__(self):
+        return len(self._entrees)
+
+    def _cle_backend(self, cle):
+        return json.dumps([self.version, *cle], ensure_ascii=False)
+
+    def lire(self, cle):
+        """
+        Args:
+            cle (tuple): Résultat de `cle_requete`
+
+        Returns:
+            dict: Réponse en cache, ou None
+        """
+        if not self.actif:
+            return None
+        maintenant = time.monotonic()
+        with self._verrou:
+            entree = self._entrees.get(cle)
+            if entree is not None:
+                expiration, valeur = entree
+                if expiration is None or expiration > maintenant:
+                    self._entrees.move_to_end(cle)
+                    self.compteurs['hits'] += 1
+                    return valeur
+                del self._entrees[cle]
+                self.compteurs['expirations'] += 1
+
+        valeur = self.backend.lire(self._cle_backend(cle)) if self.backend is not None else None
+        with self._verrou:
+            if valeur is None:
+                self.compteurs['misses'] += 1
+                return None
+            self.compteurs['hits_partages'] += 1
+        self._ajouter_local(cle, valeur)
+        return valeur
+
+    def _ajouter_local(self, cle, valeur):
+        expiration = time.monotonic() + self.ttl if self.ttl else None
+        with self._verrou:
+            self._entrees[cle] = (expiration, valeur)
+            self._entrees.move_to_end(cle)
+            while len(self._entrees) > self.taille:
+                self._entrees.popitem(last=False)
+                self.compteurs['evictions'] += 1
+
+    def ecrire(self, cle, valeur):
+        """Met une réponse en cache (local et backend partagé)"""
+        if not self.actif:
+            return
+        self._ajouter_local(cle, valeur)
+        if self.backend is not None:
+            self.backend.ecrire(self._cle_backend(cle), valeur, self.ttl)
+
+    def invalider(self, version=None):
+        """
+        Vide le cache local ; avec une nouvelle version, les entrées partagées
+        des anciens artefacts ne sont plus lues (elles expirent d'elles-mêmes)
+
+        Args:
+            version (str): Nouvelle version des artefacts
+        """
+        with self._verrou:
+            self._entrees.clear()
+            self.compteurs['invalidations'] += 1
+            if version is not None:
+                self.version = version
+
+    def statistiques(self):
+        """
+        Returns:
+            dict: Compteurs, taux de succès, taille et paramètres du cache
+        """
+        with self._verrou:
+            compteurs = dict(self.compteurs)
+            n_entrees = len(self._entrees)
+        lectures = compteurs['hits'] + compteurs['hits_partages'] + compteurs['misses']
+        return {
+            'actif': self.actif,
+            'taille_max': self.taille,
+            'ttl_s': self.ttl,
+            'entrees': n_entrees,
+            'version': self.version,
+            'backend': type(self.backend).__name__ if self.backend is not None else None,
+            'taux_hits': (compteurs['hits'] + compteurs['hits_partages']) / lectures if lectures else None,
+            **compteurs
+        }
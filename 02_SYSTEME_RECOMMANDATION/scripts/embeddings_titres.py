@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Embeddings pré-calculés des titres de logements
+===============================================
+
+Encode une seule fois tous les titres de `df_grouped` avec SentenceTransformer,
+normalise les vecteurs (norme L2) et les sauvegarde en float32 dans un fichier
+`.npy` à côté de `similarity_matrix_bert.npy`.
+
+Un fichier de métadonnées JSON conserve l'empreinte SHA-256 de `df_grouped.pkl`
+et le nom du modèle : la matrice n'est reconstruite que si l'un des deux change.
+
+Utilisation hors-ligne :
+    python embeddings_titres.py [df_grouped.pkl]
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+
+EMBEDDINGS_FILE = 'title_embeddings_bert.npy'
+EMBEDDINGS_META_FILE = 'title_embeddings_bert.json'
+DEFAULT_MODEL_NAME = 'all-MiniLM-L6-v2'
+
+# Empreintes déjà calculées, indexées par (chemin, taille, date de modification)
+_EMPREINTES = {}
+
+
+def empreinte_fichier(chemin, taille_bloc=1 << 20):
+    """
+    Calcule l'empreinte SHA-256 d'un fichier, bloc par bloc
+
+    Le résultat est mémorisé tant que la taille et la date de modification
+    du fichier ne changent pas (plusieurs artefacts dépendent du même pickle).
+
+    Args:
+        chemin (str): Fichier à hacher
+        taille_bloc (int): Taille des blocs lus
+
+    Returns:
+        str: Empreinte hexadécimale
+    """
+    etat = os.stat(chemin)
+    cle = (os.path.abspath(chemin), etat.st_size, etat.st_mtime_ns)
+    if cle not in _EMPREINTES:
+        sha = hashlib.sha256()
+        with open(chemin, 'rb') as f:
+            for bloc in iter(lambda: f.read(taille_bloc), b''):
+                sha.update(bloc)
+        _EMPREINTES[cle] = sha.hexdigest()
+    return _EMPREINTES[cle]
+
+
+def memoriser_empreinte(chemin, empreinte):
+    """
+    Enregistre l'empreinte déjà connue d'un fichier (ex. notée lors d'un export),
+    pour que `empreinte_fichier` ne le relise pas tant qu'il ne change pas
+    """
+    etat = os.stat(chemin)
+    _EMPREINTES[(os.path.abspath(chemin), etat.st_size, etat.st_mtime_ns)] = empreinte
+
+
+def normaliser_l2(vecteurs):
+    """
+    Normalise des vecteurs ligne par ligne (norme L2) en float32
+
+    Args:
+        vecteurs (array-like): Matrice (n, d) ou vecteur (d,)
+
+    Returns:
+        np.ndarray: Vecteurs normalisés en float32
+    """
+    vecteurs = np.asarray(vecteurs, dtype=np.float32)
+    normes = np.linalg.norm(vecteurs, axis=-1, keepdims=True)
+    normes[normes == 0] = 1.0
+    return vecteurs / normes
+
+
+def encoder_titres(bert_model, titres, batch_size=256):
+    """
+    Encode une liste de titres et renvoie des embeddings normalisés
+
+    Args:
+        bert_model: Modèle SentenceTransformer
+        titres (list): Titres à encoder
+        batch_size (int): Taille des lots envoyés au modèle
+
+    Returns:
+        np.ndarray: Matrice (n, d) float32 normalisée
+    """
+    embeddings = bert_model.encode(titres, batch_size=batch_size, convert_to_numpy=True)
+    return normaliser_l2(embeddings)
+
+
+def encoder_requete(bert_model, titre):
+    """
+    Encode un seul titre saisi par l'utilisateur
+
+    Args:
+        bert_model: Modèle SentenceTransformer
+        titre (str): Titre recherché
+
+    Returns:
+        np.ndarray: Vecteur (d,) float32 normalisé
+    """
+    return encoder_titres(bert_model, [titre])[0]
+
+
+def _lire_meta(chemin_meta):
+    """Lit le fichier de métadonnées, ou None s'il est absent ou illisible"""
+    try:
+        with open(chemin_meta, 'r', encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def charger_embeddings_titres(df_grouped, bert_model, source_file='df_grouped.pkl',
+                              embeddings_file=EMBEDDINGS_FILE,
+                              meta_file=EMBEDDINGS_META_FILE,
+                              model_name=DEFAULT_MODEL_NAME):
+    """
+    Charge la matrice d'embeddings des titres, en la reconstruisant si besoin
+
+    La matrice est reconstruite quand le fichier n'existe pas, quand l'empreinte
+    de `source_file` a changé, quand le modèle diffère ou quand le nombre de
+    titres ne correspond plus à `df_grouped`.
+
+    Args:
+        df_grouped (DataFrame): Logements avec une colonne "title"
+        bert_model: Modèle SentenceTransformer (utilisé seulement si reconstruction)
+        source_file (str): Pickle dont dépendent les embeddings
+        embeddings_file (str): Fichier .npy de sortie
+        meta_file (str): Fichier JSON des métadonnées
+        model_name (str): Nom du modèle d'encodage
+
+    Returns:
+        np.ndarray: Matrice (n_titres, d) float32 normalisée
+    """
+    empreinte = empreinte_fichier(source_file) if os.path.exists(source_file) else None
+    meta = _lire_meta(meta_file)
+
+    if (
+        empreinte is not None
+        and meta is not None
+        and os.path.exists(embeddings_file)
+        and meta.get('source_sha256') == empreinte
+        and meta.get('model') == model_name
+        and meta.get('n_titles') == len(df_grouped)
+    ):
+        embeddings = np.load(embeddings_file)
+        print(f"✅ Embeddings des titres chargés depuis {embeddings_file} {embeddings.shape}")
+        return embeddings
+
+    print("🔄 Encodage de tous les titres (construction des embeddings)...")
+    titres = df_grouped["title"].fillna("").astype(str).tolist()
+    embeddings = encoder_titres(bert_model, titres)
+
+    np.save(embeddings_file, embeddings)
+    with open(meta_file, 'w', encoding='utf-8') as f:
+        json.dump({
+            'source_file': os.path.basename(source_file),
+            'source_sha256': empreinte,
+            'model': model_name,
+            'n_titles': len(titres),
+            'dim': int(embeddings.shape[1]) if embeddings.ndim == 2 else 0
+        }, f, indent=2)
+
+    print(f"✅ Embeddings sauvegardés dans {embeddings_file} {embeddings.shape}")
+    return embeddings
+
+
+def main():
+    """Construction hors-ligne des embeddings des titres"""
+    import sys
+    import pandas as pd
+    from sentence_transformers import SentenceTransformer
+
+    source_file = sys.argv[1] if len(sys.argv) > 1 else 'df_grouped.pkl'
+    # Un titre par logement, comme dans app.py
+    logements = pd.read_pickle(source_file).drop_duplicates("id_listing").reset_index(drop=True)
+    bert_model = SentenceTransformer(DEFAULT_MODEL_NAME)
+    charger_embeddings_titres(logements, bert_model, source_file=source_file)
+
+
+if __name__ == "__main__":
+    main()
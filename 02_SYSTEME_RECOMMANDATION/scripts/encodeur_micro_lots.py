@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Encodage des titres par micro-lots
+==================================
+
+Chaque requête `/recommend` encodait son titre seule (`bert_model.encode`
+sur une liste d'un élément), alors que le modèle amortit très bien les lots.
+Ici, les titres des requêtes concurrentes sont placés dans une file asyncio :
+- une boucle d'événements dédiée (thread de fond) regroupe les titres reçus
+  jusqu'à `max_batch` titres ou `max_wait_ms` millisecondes d'attente
+- le lot est encodé en un seul passage sur un thread d'encodage
+- chaque requête reçoit ses propres vecteurs
+- avec `requetes_en_cours` (nombre de requêtes HTTP en cours dans le
+  processus), le lot part dès qu'il contient une demande par requête en
+  cours : aucune attente quand la requête est seule (worker synchrone)
+
+Les vues Flask (synchrones) appellent `encoder_sync` ; du code asyncio peut
+appeler directement la coroutine `encoder` dans la boucle de l'encodeur.
+Les latences (attente, encodage, total) et tailles de lots sont conservées
+pour calculer les percentiles exposés par le service.
+
+La boucle démarre au premier appel, et redémarre dans un processus forké
+(workers Gunicorn) : aucun thread n'est lancé dans le processus maître.
+"""
+
+import asyncio
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+from metriques import percentiles
+
+DEFAULT_MAX_BATCH = 64
+DEFAULT_MAX_WAIT_MS = 5.0
+DEFAULT_HISTORIQUE = 10000
+
+
+class EncodeurMicroLots:
+    """
+    Regroupe les demandes d'encodage concurrentes en lots
+    """
+
+    def __init__(self, fonction_encodage, max_batch=DEFAULT_MAX_BATCH,
+                 max_wait_ms=DEFAULT_MAX_WAIT_MS, historique=DEFAULT_HISTORIQUE, requetes_en_cours=None):
+        """
+        Args:
+            fonction_encodage (callable): Liste de titres -> np.ndarray (n, d)
+            max_batch (int): Nombre de titres au-delà duquel le lot part sans attendre
+            max_wait_ms (float): Attente maximale après le premier titre d'un lot
+            historique (int): Nombre de mesures conservées pour les percentiles
+            requetes_en_cours (callable): Nombre de requêtes en cours pouvant encore
+                demander un encodage ; le lot n'attend pas au-delà (None : attente complète)
+        """
+        self.fonction_encodage = fonction_encodage
+        self.max_batch = max(1, int(max_batch))
+        self.max_wait = max(0.0, float(max_wait_ms)) / 1000.0
+        self.requetes_en_cours = requetes_en_cours
+        self._verrou = threading.Lock()
+        self._pid = None
+        self._boucle = None
+        self._file = None
+        self._executeur = None
+
+        self._verrou_stats = threading.Lock()
+        self._latences = deque(maxlen=historique)
+        self._attentes = deque(maxlen=historique)
+        self._encodages = deque(maxlen=historique)
+        self._tailles = deque(maxlen=historique)
+        self.n_requetes = 0
+        self.n_lots = 0
+
+    def _demarrer(self):
+        """Lance la boucle d'événements et le thread d'encodage (une fois par processus)"""
+        with self._verrou:
+            if self._boucle is not None and self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._boucle = asyncio.new_event_loop()
+            self._executeur = ThreadPoolExecutor(max_workers=1, thread_name_prefix='encodeur')
+            pret = threading.Event()
+
+            def _executer_boucle():
+                asyncio.set_event_loop(self._boucle)
+                self._file = asyncio.Queue()
+                self._boucle.create_task(self._collecter())
+                pret.set()
+                self._boucle.run_forever()
+
+            threading.Thread(target=_executer_boucle, name='encodeur-micro-lots', daemon=True).start()
+            pret.wait()
+
+    async def encoder(self, titres):
+        """
+        Encode des titres avec ceux des autres requêtes en attente
+
+        À appeler dans la boucle de l'encodeur (voir `encoder_sync`).
+
+        Args:
+            titres (list): Titres à encoder
+
+        Returns:
+            np.ndarray: Embeddings (len(titres), d), dans l'ordre des titres
+        """
+        future = self._boucle.create_future()
+        await self._file.put((list(titres), future, time.perf_counter()))
+        return await future
+
+    def encoder_sync(self, titres, timeout=None):
+        """
+        Version bloquante de `encoder`, utilisable depuis n'importe quel thread
+
+        Args:
+            titres (list): Titres à encoder
+            timeout (float): Attente maximale en secondes
+
+        Returns:
+            np.ndarray: Embeddings (len(titres), d)
+        """
+        self._demarrer()
+        return asyncio.run_coroutine_threadsafe(self.encoder(titres), self._boucle).result(timeout)
+
+    async def _collecter(self):
+        """Forme les lots : premier titre reçu, puis attente d'autres jusqu'à max_batch / max_wait"""
+        boucle = asyncio.get_running_loop()
+        while True:
+            lot = [await self._file.get()]
+            taille = len(lot[0][0])
+            limite = boucle.time() + self.max_wait
+            while taille < self.max_batch:
+                # Toutes les requêtes en cours sont déjà dans le lot : personne d'autre à attendre
+                if self.requetes_en_cours is not None and len(lot) >= self.requetes_en_cours():
+                    break
+                restant = limite - boucle.time()
+                if restant <= 0 and self._file.empty():
+                    break
+                try:
+                    element = (self._file.get_nowait() if restant <= 0
+                               else await asyncio.wait_for(self._file.get(), restant))
+                except (asyncio.TimeoutError, asyncio.QueueEmpty):
+                    break
+                lot.append(element)
+                taille += len(element[0])
+            await self._encoder_lot(lot)
+
+    async def _encoder_lot(self, lot):
+        """Encode un lot sur le thread d'encodage et répartit les vecteurs entre les requêtes"""
+        titres = [titre for titres_requete, _, _ in lot for titre in titres_requete]
+        debut = time.perf_counter()
+        try:
+            embeddings = await asyncio.get_running_loop().run_in_executor(
+                self._executeur, self.fonction_encodage, titres)
+        except Exception as e:
+            for _, future, _ in lot:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        fin = time.perf_counter()
+
+        position = 0
+        for titres_requete, future, arrivee in lot:
+            if not future.done():
+                future.set_result(embeddings[position:position + len(titres_requete)])
+            position += len(titres_requete)
+
+        with self._verrou_stats:
+            self.n_lots += 1
+            self.n_requetes += len(lot)
+            self._tailles.append(len(titres))
+            self._encodages.append(fin - debut)
+            for _, _, arrivee in lot:
+                self._attentes.append(debut - arrivee)
+                self._latences.append(fin - arrivee)
+
+    def statistiques(self):
+        """
+        Returns:
+            dict: Compteurs, taille moyenne des lots et percentiles (ms) des
+                latences d'attente, d'encodage et totales
+        """
+        with self._verrou_stats:
+            latences, attentes = list(self._latences), list(self._attentes)
+            encodages, tailles = list(self._encodages), list(self._tailles)
+            n_requetes, n_lots = self.n_requetes, self.n_lots
+        return {
+            'max_batch': self.max_batch,
+            'max_wait_ms': self.max_wait * 1000,
+            'requetes': n_requetes,
+            'lots': n_lots,
+            'taille_lot_moyenne': float(np.mean(tailles)) if tailles else None,
+            'latence_ms': percentiles(latences, 1000),
+            'attente_ms': percentiles(attentes, 1000),
+            'encodage_ms': percentiles(encodages, 1000),
+        }
@@ -0,0 +1,393 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Backend ONNX (quantifié int8) pour les embeddings de phrases
+===========================================================
+
+Sur des serveurs sans GPU, l'encodage SentenceTransformer (PyTorch) est le
+coût principal au démarrage et par requête. Ce module :
+- exporte le transformeur d'un modèle SentenceTransformer en ONNX, puis le
+  quantifie dynamiquement en int8 (`onnxruntime.quantization`)
+- l'exécute avec ONNX Runtime (optimisations de graphe, N threads par
+  processus) ; le pooling (moyenne, CLS ou max) et la normalisation L2 du
+  modèle d'origine sont refaits en NumPy
+- expose `encode` (même signature que SentenceTransformer) et
+  `embed_documents` / `embed_query` (interface Embeddings de LangChain)
+
+`charger_modele_embeddings` choisit le backend (`EMBEDDING_BACKEND=onnx`, ou
+`torch` par défaut) et revient automatiquement au modèle PyTorch si ONNX
+Runtime manque ou si l'export échoue. L'export est fait une fois et conservé
+dans `RECO_ONNX_DIR` (défaut : modeles_onnx/).
+
+Sous Gunicorn, la session est créée dans le maître avant le fork : garder
+`RECO_ONNX_THREADS=1` (défaut), un pool de threads ne survit pas au fork.
+
+Vérification et mesure hors-ligne (PyTorch et ONNX Runtime requis) :
+    python encodeur_onnx.py --modele all-MiniLM-L6-v2 --parite --benchmark
+"""
+
+import argparse
+import inspect
+import json
+import os
+import re
+import time
+
+import numpy as np
+
+from embeddings_titres import normaliser_l2
+
+try:
+    import onnxruntime as ort
+    ONNX_AVAILABLE = True
+except ImportError:
+    ONNX_AVAILABLE = False
+
+DOSSIER_ONNX = 'modeles_onnx'
+FICHIER_CONFIG = 'config_onnx.json'
+FICHIER_FP32 = 'modele.onnx'
+FICHIER_INT8 = 'modele_int8.onnx'
+POOLINGS = ('mean', 'cls', 'max')
+
+_CARACTERES_NOM = re.compile(r'[^A-Za-z0-9._-]+')
+
+TEXTES_PARITE = [
+    "Appartement moderne avec vue sur mer",
+    "Villa avec piscine à Hammamet",
+    "Studio calme proche de la plage",
+    "Maison traditionnelle à Jerba avec jardin",
+    "Chambre lumineuse au centre-ville",
+    "Riad authentique dans la médina, terrasse privée",
+    "Cozy apartment close to the beach",
+    "Grande maison familiale, cuisine équipée, parking",
+]
+
+
+def dossier_modele(nom_modele, dossier=None):
+    """Dossier de l'export ONNX d'un modèle"""
+    racine = dossier or os.environ.get('RECO_ONNX_DIR', DOSSIER_ONNX)
+    return os.path.join(racine, _CARACTERES_NOM.sub('_', nom_modele))
+
+
+def identifiant_modele(nom_modele, backend=None, quantifie=True):
+    """
+    Nom du modèle complété par le backend : les embeddings pré-calculés et en
+    cache d'un backend ne sont pas relus avec un autre
+
+    Args:
+        nom_modele (str): Nom du modèle SentenceTransformer
+        backend (str): 'onnx' ou 'torch' (défaut : variable EMBEDDING_BACKEND)
+        quantifie (bool): Modèle ONNX quantifié int8
+
+    Returns:
+        str: Identifiant du modèle servi
+    """
+    backend = backend or os.environ.get('EMBEDDING_BACKEND', 'torch')
+    if backend != 'onnx' or not ONNX_AVAILABLE:
+        return nom_modele
+    return f"{nom_modele}@onnx-{'int8' if quantifie else 'fp32'}"
+
+
+def identifiant_modele_charge(modele, nom_modele):
+    """
+    Identifiant du modèle renvoyé par `charger_modele_embeddings` : celui de
+    l'encodeur ONNX, ou le nom du modèle PyTorch (repli compris). À préférer à
+    `identifiant_modele`, qui ne sait pas si le chargement ONNX a réussi
+
+    Args:
+        modele: Modèle chargé
+        nom_modele (str): Nom du modèle SentenceTransformer
+
+    Returns:
+        str: Identifiant des embeddings produits par `modele`
+    """
+    return getattr(modele, 'identifiant', nom_modele)
+
+
+def exporter_onnx(nom_modele, dossier=None, quantifier=True, opset=14):
+    """
+    Exporte le transformeur d'un modèle SentenceTransformer en ONNX (et int8)
+
+    Args:
+        nom_modele (str): Nom ou chemin du modèle SentenceTransformer
+        dossier (str): Dossier de sortie (défaut : `dossier_modele(nom_modele)`)
+        quantifier (bool): Produire aussi la version quantifiée int8
+        opset (int): Version de l'opset ONNX
+
+    Returns:
+        str: Dossier de l'export
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    dossier = dossier or dossier_modele(nom_modele)
+    os.makedirs(dossier, exist_ok=True)
+    modele = SentenceTransformer(nom_modele, device='cpu')
+    transformeur = modele[0].auto_model.eval()
+    tokenizer = modele.tokenizer
+
+    pooling, normaliser = None, False
+    for module in modele:
+        nom_classe = type(module).__name__
+        if nom_classe == 'Pooling':
+            # `pooling_mode` depuis sentence-transformers 6, `get_pooling_mode_str()` avant
+            pooling = getattr(module, 'pooling_mode', None) or module.get_pooling_mode_str()
+        elif nom_classe == 'Normalize':
+            normaliser = True
+        elif module is not modele[0]:
+            raise ValueError(f"Module {nom_classe} non pris en charge par l'export ONNX")
+    if pooling not in POOLINGS:
+        raise ValueError(f"Pooling '{pooling}' non pris en charge (attendu : {POOLINGS})")
+
+    entrees = [nom for nom in ('input_ids', 'attention_mask', 'token_type_ids')
+               if nom in tokenizer.model_input_names]
+    exemple = tokenizer(["exemple d'export"], return_tensors='pt')
+
+    class _EtatsCaches(torch.nn.Module):
+        """Dernière couche cachée du transformeur, entrées positionnelles"""
+
+        def __init__(self, modele_hf):
+            super().__init__()
+            self.modele_hf = modele_hf
+
+        def forward(self, *tenseurs):
+            return self.modele_hf(**dict(zip(entrees, tenseurs)))[0]
+
+    chemin_fp32 = os.path.join(dossier, FICHIER_FP32)
+    options = {}
+    if 'dynamo' in inspect.signature(torch.onnx.export).parameters:
+        options['dynamo'] = False  # exporteur TorchScript : axes dynamiques
+    print(f"🔄 Export ONNX de {nom_modele}...")
+    with torch.no_grad():
+        torch.onnx.export(
+            _EtatsCaches(transformeur), tuple(exemple[nom] for nom in entrees), chemin_fp32,
+            input_names=entrees, output_names=['last_hidden_state'],
+            dynamic_axes={**{nom: {0: 'lot', 1: 'sequence'} for nom in entrees},
+                          'last_hidden_state': {0: 'lot', 1: 'sequence'}},
+            opset_version=opset, **options
+        )
+
+    if quantifier:
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+        quantize_dynamic(chemin_fp32, os.path.join(dossier, FICHIER_INT8), weight_type=QuantType.QInt8)
+
+    tokenizer.save_pretrained(dossier)
+    with open(os.path.join(dossier, FICHIER_CONFIG), 'w', encoding='utf-8') as f:
+        json.dump({
+            'modele': nom_modele,
+            'entrees': entrees,
+            'pooling': pooling,
+            'normaliser': normaliser,
+            'max_seq_length': int(modele.max_seq_length),
+            'dim': int(modele.get_sentence_embedding_dimension()),
+            'quantifie': bool(quantifier),
+        }, f, indent=2)
+    print(f"✅ Modèle exporté dans {dossier}")
+    return dossier
+
+
+class EncodeurOnnx:
+    """
+    Encodeur de phrases exécuté par ONNX Runtime
+    """
+
+    def __init__(self, dossier, quantifie=True, threads=None):
+        """
+        Args:
+            dossier (str): Dossier produit par `exporter_onnx`
+            quantifie (bool): Utiliser le modèle int8 (sinon float32)
+            threads (int): Threads ONNX Runtime (défaut : RECO_ONNX_THREADS, 1)
+        """
+        from transformers import AutoTokenizer
+
+        with open(os.path.join(dossier, FICHIER_CONFIG), encoding='utf-8') as f:
+            config = json.load(f)
+        if quantifie and not config.get('quantifie'):
+            raise FileNotFoundError(f"Pas de modèle int8 dans {dossier}")
+        self.nom_modele = config['modele']
+        self.entrees = config['entrees']
+        self.pooling = config['pooling']
+        self.normaliser = config['normaliser']
+        self.max_seq_length = config['max_seq_length']
+        self.dim = config['dim']
+        self.identifiant = f"{self.nom_modele}@onnx-{'int8' if quantifie else 'fp32'}"
+        self.tokenizer = AutoTokenizer.from_pretrained(dossier)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # Un thread par worker par défaut : le parallélisme vient du nombre de workers
+        options.intra_op_num_threads = int(threads or os.environ.get('RECO_ONNX_THREADS', 1))
+        options.inter_op_num_threads = 1
+        self.session = ort.InferenceSession(
+            os.path.join(dossier, FICHIER_INT8 if quantifie else FICHIER_FP32),
+            sess_options=options, providers=['CPUExecutionProvider']
+        )
+
+    def _pooler(self, etats, masque):
+        if self.pooling == 'cls':
+            return etats[:, 0]
+        masque = masque[:, :, None].astype(np.float32)
+        if self.pooling == 'max':
+            return np.where(masque > 0, etats, -1e9).max(axis=1)
+        return (etats * masque).sum(axis=1) / np.clip(masque.sum(axis=1), 1e-9, None)
+
+    def encode(self, textes, batch_size=32, convert_to_numpy=True, normalize_embeddings=False,
+               **kwargs):
+        """
+        Encode des textes, comme `SentenceTransformer.encode`
+
+        Les textes sont triés par longueur pour limiter le remplissage des lots.
+
+        Args:
+            textes (str | list): Texte ou liste de textes
+            batch_size (int): Taille des lots envoyés au modèle
+            normalize_embeddings (bool): Normaliser (déjà fait si le modèle le prévoit)
+
+        Returns:
+            np.ndarray: (d,) pour un texte, (n, d) float32 pour une liste
+        """
+        unique = isinstance(textes, str)
+        textes = [textes] if unique else list(textes)
+        sorties = np.zeros((len(textes), self.dim), dtype=np.float32)
+        ordre = np.argsort([-len(t) for t in textes], kind='stable')
+        for debut in range(0, len(textes), batch_size):
+            positions = ordre[debut:debut + batch_size]
+            jetons = self.tokenizer([textes[i] for i in positions], padding=True, truncation=True,
+                                    max_length=self.max_seq_length, return_tensors='np')
+            etats = self.session.run(None, {nom: jetons[nom].astype(np.int64) for nom in self.entrees})[0]
+            sorties[positions] = self._pooler(etats, jetons['attention_mask'])
+        if self.normaliser or normalize_embeddings:
+            sorties = normaliser_l2(sorties)
+        return sorties[0] if unique else sorties
+
+    def embed_documents(self, textes):
+        """Interface Embeddings de LangChain"""
+        return self.encode(textes).tolist()
+
+    def embed_query(self, texte):
+        """Interface Embeddings de LangChain"""
+        return self.encode([texte])[0].tolist()
+
+
+def charger_encodeur_onnx(nom_modele, dossier=None, quantifie=True):
+    """
+    Charge l'export ONNX d'un modèle, en le produisant s'il n'existe pas
+
+    Returns:
+        EncodeurOnnx: Encodeur prêt
+    """
+    if not ONNX_AVAILABLE:
+        raise ImportError("onnxruntime n'est pas installé : pip install onnxruntime onnx")
+    dossier = dossier or dossier_modele(nom_modele)
+    fichier = os.path.join(dossier, FICHIER_INT8 if quantifie else FICHIER_FP32)
+    if not (os.path.exists(fichier) and os.path.exists(os.path.join(dossier, FICHIER_CONFIG))):
+        exporter_onnx(nom_modele, dossier)
+    return EncodeurOnnx(dossier, quantifie)
+
+
+def charger_modele_embeddings(nom_modele, backend=None, dossier=None, quantifie=True, repli=None):
+    """
+    Modèle d'embeddings selon le backend demandé, avec repli sur PyTorch
+
+    Args:
+        nom_modele (str): Nom du modèle SentenceTransformer
+        backend (str): 'onnx' ou 'torch' (défaut : variable EMBEDDING_BACKEND, sinon 'torch')
+        dossier (str): Dossier de l'export ONNX
+        quantifie (bool): Modèle ONNX quantifié int8
+        repli (callable): Construit le modèle PyTorch (défaut : SentenceTransformer(nom_modele))
+
+    Returns:
+        EncodeurOnnx, ou le modèle PyTorch
+    """
+    backend = backend or os.environ.get('EMBEDDING_BACKEND', 'torch')
+    if backend == 'onnx':
+        try:
+            encodeur = charger_encodeur_onnx(nom_modele, dossier, quantifie)
+            print(f"✅ Embeddings {nom_modele} servis par ONNX Runtime "
+                  f"({'int8' if quantifie else 'float32'})")
+            return encodeur
+        except Exception as e:
+            print(f"⚠️ Backend ONNX indisponible pour {nom_modele} ({e}) : repli sur PyTorch")
+    if repli is not None:
+        return repli()
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(nom_modele)
+
+
+def _cosinus(a, b):
+    return np.sum(normaliser_l2(a) * normaliser_l2(b), axis=1)
+
+
+def verifier_parite(nom_modele, textes=TEXTES_PARITE, dossier=None, quantifie=True):
+    """
+    Écart entre les embeddings ONNX et ceux du modèle PyTorch d'origine
+
+    Args:
+        nom_modele (str): Nom ou chemin du modèle SentenceTransformer
+        textes (list): Textes de référence
+        dossier (str): Dossier de l'export ONNX (produit si absent)
+        quantifie (bool): Comparer le modèle int8 (sinon float32)
+
+    Returns:
+        dict: Cosinus minimal et moyen entre les deux backends
+    """
+    from sentence_transformers import SentenceTransformer
+
+    reference = SentenceTransformer(nom_modele, device='cpu').encode(textes, convert_to_numpy=True)
+    onnx = charger_encodeur_onnx(nom_modele, dossier, quantifie).encode(textes)
+    cosinus = _cosinus(reference, onnx)
+    return {'cosinus_min': float(cosinus.min()), 'cosinus_moyen': float(cosinus.mean())}
+
+
+def benchmark_backends(nom_modele, textes=TEXTES_PARITE, repetitions=20, batch_size=32, dossier=None):
+    """
+    Débit d'encodage sur un cœur : PyTorch, ONNX float32 et ONNX int8
+
+    Returns:
+        dict: backend -> textes encodés par seconde et par cœur
+    """
+    import torch
+    from sentence_transformers import SentenceTransformer
+
+    torch.set_num_threads(1)
+    modeles = {'pytorch': SentenceTransformer(nom_modele, device='cpu')}
+    dossier = dossier or dossier_modele(nom_modele)
+    charger_encodeur_onnx(nom_modele, dossier, quantifie=True)
+    modeles['onnx_fp32'] = EncodeurOnnx(dossier, quantifie=False, threads=1)
+    modeles['onnx_int8'] = EncodeurOnnx(dossier, quantifie=True, threads=1)
+
+    lot = list(textes) * max(1, batch_size // len(textes))
+    rapport = {}
+    for nom, modele in modeles.items():
+        modele.encode(lot, batch_size=batch_size)  # préchauffage
+        debut = time.perf_counter()
+        for _ in range(repetitions):
+            modele.encode(lot, batch_size=batch_size)
+        rapport[nom] = len(lot) * repetitions / (time.perf_counter() - debut)
+    return rapport
+
+
+def main():
+    """Export, vérification de parité et benchmark d'un modèle"""
+    parser = argparse.ArgumentParser(description="Backend ONNX des embeddings de phrases")
+    parser.add_argument('--modele', default='all-MiniLM-L6-v2')
+    parser.add_argument('--dossier', default=None, help="Dossier de l'export (défaut : RECO_ONNX_DIR)")
+    parser.add_argument('--parite', action='store_true', help="Écart cosinus avec le modèle PyTorch")
+    parser.add_argument('--benchmark', action='store_true', help="Débit par cœur de chaque backend")
+    args = parser.parse_args()
+
+    dossier = args.dossier or dossier_modele(args.modele)
+    exporter_onnx(args.modele, dossier)
+    if args.parite:
+        for quantifie in (False, True):
+            r = verifier_parite(args.modele, dossier=dossier, quantifie=quantifie)
+            print(f"📏 Parité {'int8' if quantifie else 'fp32'} : cosinus min {r['cosinus_min']:.4f}, "
+                  f"moyen {r['cosinus_moyen']:.4f}")
+    if args.benchmark:
+        print("📊 Débit d'encodage (1 thread) :")
+        for nom, debit in benchmark_backends(args.modele, dossier=dossier).items():
+            print(f"   {nom:<10} : {debit:8.1f} textes/s/cœur")
+
+
+if __name__ == "__main__":
+    main()
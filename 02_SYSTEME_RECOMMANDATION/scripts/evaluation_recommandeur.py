@@ -0,0 +1,557 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Évaluation hors-ligne et benchmark du recommandeur hybride
+==========================================================
+
+Génère un catalogue et des avis synthétiques de taille choisie, au format de
+`df_grouped`, `metadata` et `user_item_matrix` : chaque logement appartient
+à un thème (type + atouts, repris dans son titre) et chaque utilisateur note
+surtout, et bien, les logements de ses thèmes préférés.
+
+Une partie des bonnes notes de chaque utilisateur est mise de côté ; les
+artefacts (embeddings, matrice de similarité, matrice creuse, KNN, index des
+logements) sont construits sur le reste. Puis, pour chaque utilisateur de
+test, le titre d'un logement qu'il a aimé sert de requête :
+- chaque étape du pipeline de `recommander_hybride_par_titre` est chronométrée
+  (encodage, références, utilisateurs, KNN, scoring, enrichissement) avec les
+  mêmes fonctions que `_calculer_lot` (hors caches) : latences p50 / p95 / p99
+  et mémoire du processus
+- les recommandations sont comparées aux logements mis de côté :
+  précision@k, rappel@k, NDCG@k et couverture du catalogue
+
+Le modèle par défaut est un encodeur par hachage des mots (sans dépendance) ;
+`--modele all-MiniLM-L6-v2` mesure le vrai coût de l'encodage BERT.
+
+Les variantes servies par app.py s'évaluent aussi :
+- `--similarite float16|topk` (comme SIMILARITY_FORMAT, `--top-k-similarite`
+  pour K) : forme compressée de la matrice de similarité
+- `--precalcul voisins recommandations` : tables `voisins_precalcules` et
+  `recommandations_precalculees` construites sur les notes d'entraînement
+
+Utilisation :
+    python evaluation_recommandeur.py [--logements 2000] [--utilisateurs 5000] [--requetes 500]
+    python evaluation_recommandeur.py --json avant.json
+    python evaluation_recommandeur.py --similarite topk --precalcul voisins recommandations
+    python evaluation_recommandeur.py --reference avant.json   # code 1 si la qualité baisse
+    python evaluation_recommandeur.py --sauvegarder jeu_synthetique/   # pickles pour app.py
+"""
+
+import argparse
+import json
+import os
+import pickle
+import re
+import time
+import zlib
+
+import numpy as np
+import pandas as pd
+
+from embeddings_titres import encoder_titres
+from index_logements import IndexLogements, enrichir_logement
+from index_titres import creer_index_titres
+from matrice_utilisateur_item import MatriceUtilisateurItem, ajuster_knn_creux, candidats_collaboratifs_lot
+from metriques import Chronometre, percentiles
+from recommandations_precalculees import DEFAULT_N_MAX, precalculer_recommandations
+from scoring_hybride import classer_vecteurs, construire_table_index, vecteurs_candidats
+from stockage_similarite import DEFAULT_TOP_K, SIMILARITY_FORMATS, MatriceSimilariteTopK
+from voisins_precalcules import precalculer_voisins
+
+ETAPES = ('encodage', 'references', 'utilisateurs', 'knn', 'scoring', 'enrichissement')
+PRECALCULS = ('voisins', 'recommandations')
+
+TYPES = ['Appartement', 'Villa', 'Studio', 'Maison', 'Riad', 'Chambre', 'Duplex', 'Bungalow']
+ATOUTS = ['vue mer', 'piscine', 'jardin', 'terrasse', 'proche plage', 'médina', 'centre-ville',
+          'calme', 'familial', 'luxe', 'rénové', 'climatisé', 'parking', 'cuisine équipée']
+VILLES = ['Hammamet', 'Jerba', 'Sousse', 'Tunis', 'Monastir', 'Nabeul']
+
+_MOTS = re.compile(r'\w+')
+
+
+class EncodeurHachage:
+    """
+    Encodeur sans dépendance : sac de mots haché (signe et position par crc32)
+
+    Deux titres partageant des mots sont proches, ce qui suffit à évaluer le
+    pipeline ; même interface `encode` que SentenceTransformer.
+    """
+
+    def __init__(self, dim=256):
+        self.dim = dim
+
+    @property
+    def identifiant(self):
+        """Clé des embeddings en cache (voir `identifiant_modele_charge`)"""
+        return f"hachage-{self.dim}"
+
+    def encode(self, textes, batch_size=32, convert_to_numpy=True, **kwargs):
+        vecteurs = np.zeros((len(textes), self.dim), dtype=np.float32)
+        for i, texte in enumerate(textes):
+            for mot in _MOTS.findall(str(texte).lower()):
+                h = zlib.crc32(mot.encode('utf-8'))
+                vecteurs[i, h % self.dim] += 1.0 if (h >> 16) & 1 else -1.0
+        return vecteurs
+
+
+def generer_jeu_synthetique(n_logements=2000, n_utilisateurs=5000, notes_par_utilisateur=20,
+                            n_themes=24, graine=0):
+    """
+    Catalogue, avis et notes synthétiques
+
+    Args:
+        n_logements (int): Nombre de logements
+        n_utilisateurs (int): Nombre d'utilisateurs
+        notes_par_utilisateur (int): Notes moyennes par utilisateur
+        n_themes (int): Nombre de thèmes (type + atouts) du catalogue
+        graine (int): Graine aléatoire
+
+    Returns:
+        dict: "df_grouped" (une ligne par avis), "metadata" (une ligne par
+            logement) et "notes" (triplets user_id, id_listing, note)
+    """
+    rng = np.random.default_rng(graine)
+    themes = [(TYPES[t % len(TYPES)], *rng.choice(ATOUTS, 2, replace=False)) for t in range(n_themes)]
+    ids = np.arange(100000, 100000 + n_logements, dtype=np.int64)
+    theme_logement = rng.integers(0, n_themes, n_logements)
+    villes = rng.choice(VILLES, n_logements)
+    titres = []
+    for i, t in enumerate(theme_logement):
+        type_logement, atout_1, atout_2 = themes[t]
+        extra = f" {rng.choice(ATOUTS)}" if rng.random() < 0.5 else ""
+        titres.append(f"{type_logement} {atout_1} {atout_2}{extra} à {villes[i]}")
+
+    # Chaque utilisateur préfère 1 ou 2 thèmes : bonnes notes dessus, notes aléatoires ailleurs
+    logements_par_theme = [np.flatnonzero(theme_logement == t) for t in range(n_themes)]
+    lignes = []
+    for u in range(n_utilisateurs):
+        preferes = rng.choice(n_themes, rng.integers(1, 3), replace=False)
+        n_notes = max(2, int(rng.poisson(notes_par_utilisateur)))
+        candidats_preferes = np.concatenate([logements_par_theme[t] for t in preferes])
+        n_preferes = min(len(candidats_preferes), int(round(0.8 * n_notes)))
+        choisis = set(rng.choice(candidats_preferes, n_preferes, replace=False).tolist()) if n_preferes else set()
+        choisis.update(rng.choice(n_logements, n_notes - n_preferes, replace=False).tolist())
+        for j in choisis:
+            aime = theme_logement[j] in preferes
+            note = float(np.clip(np.round(rng.normal(4.5 if aime else 2.5, 0.7)), 1, 5))
+            lignes.append((f"u{u}", int(ids[j]), note))
+    notes = pd.DataFrame(lignes, columns=['user_id', 'id_listing', 'note'])
+
+    # Au moins un avis par logement, pour qu'il figure dans df_grouped
+    sans_avis = np.setdiff1d(ids, notes['id_listing'].to_numpy())
+    avis = pd.concat([notes, pd.DataFrame({'user_id': 'anonyme', 'id_listing': sans_avis,
+                                           'note': rng.integers(3, 6, len(sans_avis)).astype(float)})],
+                     ignore_index=True)
+    position = pd.Series(np.arange(n_logements), index=ids)[avis['id_listing']].to_numpy()
+    sentiments = np.where(avis['note'] >= 4, 'positive', np.where(avis['note'] >= 3, 'neutral', 'negative'))
+    df_grouped = pd.DataFrame({
+        'id_listing': avis['id_listing'].to_numpy(),
+        'title': np.asarray(titres, dtype=object)[position],
+        'city_listing': villes[position],
+        'description': [f"{titres[p]}. Logement idéal pour un séjour à {villes[p]}." for p in position],
+        'sentiment_bert': sentiments,
+        'localizedText': [f"Séjour noté {n:.0f}/5 : {'très bien' if s == 'positive' else 'moyen'}"
+                          for n, s in zip(avis['note'], sentiments)],
+    }).sort_values('id_listing', kind='stable').reset_index(drop=True)
+    par_logement = avis.groupby('id_listing')['note']
+    df_grouped['sentiment_moyen'] = (df_grouped['id_listing'].map(par_logement.mean()) / 5.0).round(3)
+
+    metadata = pd.DataFrame({'id_listing': ids})
+    metadata['rating_review_moyen'] = metadata['id_listing'].map(par_logement.mean()).round(2)
+    metadata['accuracy_moyen'] = np.clip(metadata['rating_review_moyen']
+                                         + rng.normal(0, 0.2, n_logements), 1, 5).round(2)
+    return {'df_grouped': df_grouped, 'metadata': metadata, 'notes': notes}
+
+
+def separer_notes(notes, part_test=0.2, note_min=4.0, graine=0):
+    """
+    Met de côté une partie des bonnes notes de chaque utilisateur
+
+    Args:
+        notes (DataFrame): Triplets user_id, id_listing, note
+        part_test (float): Part des bonnes notes mises de côté (au moins une)
+        note_min (float): Note à partir de laquelle un logement est « aimé »
+        graine (int): Graine aléatoire
+
+    Returns:
+        tuple: (notes d'entraînement, notes de test) ; seuls les utilisateurs
+            ayant au moins deux bonnes notes ont des notes de test
+    """
+    rng = np.random.default_rng(graine)
+    bonnes = notes[notes['note'] >= note_min]
+    test = []
+    for _, groupe in bonnes.groupby('user_id', sort=False):
+        if len(groupe) >= 2:
+            n_test = min(len(groupe) - 1, max(1, int(round(part_test * len(groupe)))))
+            test.extend(rng.choice(groupe.index.to_numpy(), n_test, replace=False).tolist())
+    masque = notes.index.isin(test)
+    return notes[~masque], notes[masque]
+
+
+def matrice_dense(notes):
+    """user_item_matrix au format d'origine : utilisateurs x id_listing, NaN = pas de note"""
+    return notes.pivot_table(index='user_id', columns='id_listing', values='note', aggfunc='mean')
+
+
+def sauvegarder_jeu(jeu, dossier, encodeur=None):
+    """
+    Écrit le jeu synthétique sous les noms de fichiers lus par app.py
+
+    Args:
+        jeu (dict): Résultat de `generer_jeu_synthetique`
+        dossier (str): Dossier de sortie
+        encodeur: Modèle pour la matrice de similarité (défaut : EncodeurHachage)
+    """
+    from sklearn.neighbors import NearestNeighbors
+
+    os.makedirs(dossier, exist_ok=True)
+    jeu['df_grouped'].to_pickle(os.path.join(dossier, 'df_grouped.pkl'))
+    jeu['metadata'].to_pickle(os.path.join(dossier, 'metadata.pkl'))
+    user_item_matrix = matrice_dense(jeu['notes'])
+    user_item_matrix.to_pickle(os.path.join(dossier, 'user_item_matrix.pkl'))
+    with open(os.path.join(dossier, 'knn_model.pkl'), 'wb') as f:
+        pickle.dump(NearestNeighbors(n_neighbors=10, metric='cosine'), f)
+
+    logements = jeu['df_grouped'].drop_duplicates('id_listing').reset_index(drop=True)
+    embeddings = encoder_titres(encodeur or EncodeurHachage(), logements['title'].tolist())
+    np.save(os.path.join(dossier, 'similarity_matrix_bert.npy'), embeddings @ embeddings.T)
+    with open(os.path.join(dossier, 'id_to_index.pkl'), 'wb') as f:
+        pickle.dump({int(i): p for p, i in enumerate(logements['id_listing'].tolist())}, f)
+    print(f"✅ Jeu synthétique écrit dans {dossier}")
+
+
+def memoire_processus():
+    """
+    Returns:
+        tuple: (mémoire résidente actuelle, pic) du processus en Mo
+    """
+    try:
+        import resource
+        pic = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    except ImportError:
+        pic = float('nan')
+    try:
+        with open('/proc/self/statm') as f:
+            actuelle = int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2 ** 20
+    except OSError:
+        actuelle = pic
+    return actuelle, pic
+
+
+def convertir_similarite(matrice, format_stockage='dense', k=DEFAULT_TOP_K):
+    """
+    Forme de la matrice de similarité servie avec SIMILARITY_FORMAT=format_stockage
+
+    Même conversion que `construire_formes_compressees`, sans passer par des fichiers.
+
+    Args:
+        matrice (np.ndarray): Matrice dense float32
+        format_stockage (str): 'dense', 'float16' ou 'topk'
+        k (int): Nombre de voisins de la forme 'topk'
+
+    Returns:
+        Matrice indexable par `[i, j]`
+    """
+    if format_stockage == 'dense':
+        return matrice
+    if format_stockage == 'float16':
+        return matrice.astype(np.float16)
+    if format_stockage == 'topk':
+        return MatriceSimilariteTopK.depuis_dense(matrice, k)
+    raise ValueError(f"Format inconnu : {format_stockage} (attendu : {', '.join(SIMILARITY_FORMATS)})")
+
+
+def preparer_artefacts(jeu, notes_train, encodeur, format_similarite='dense', k_similarite=DEFAULT_TOP_K,
+                       precalcul=(), alpha=0.5, beta=0.5, n_max=DEFAULT_N_MAX):
+    """
+    Construit les artefacts servis par app.py à partir des notes d'entraînement
+
+    Args:
+        jeu (dict): Résultat de `generer_jeu_synthetique`
+        notes_train (DataFrame): Notes d'entraînement
+        encodeur: Modèle d'encodage des titres
+        format_similarite (str): Forme de la matrice de similarité (SIMILARITY_FORMAT)
+        k_similarite (int): K de la forme 'topk'
+        precalcul (iterable): Tables pré-calculées à construire, parmi PRECALCULS
+        alpha, beta (float): Poids figés dans la table des recommandations
+        n_max (int): Recommandations conservées par référence dans cette table
+
+    Returns:
+        dict: Artefacts ("durees_s" : temps de construction de chacun ;
+            "table_voisins" et "table_precalculee" valent None si non construites)
+    """
+    durees = {}
+
+    def _mesurer(nom, fonction):
+        debut = time.perf_counter()
+        valeur = fonction()
+        durees[nom] = time.perf_counter() - debut
+        return valeur
+
+    logements = jeu['df_grouped'].drop_duplicates('id_listing').reset_index(drop=True)
+    embeddings = _mesurer('titres_embeddings', lambda: encoder_titres(encodeur, logements['title'].tolist()))
+    index_titres = _mesurer('index_titres', lambda: creer_index_titres(embeddings, 'exact'))
+    similarite = _mesurer('similarity_matrix_bert', lambda: convertir_similarite(
+        embeddings @ embeddings.T, format_similarite, k_similarite))
+    table_index = construire_table_index({int(i): p for p, i in enumerate(logements['id_listing'].tolist())})
+
+    def _matrice():
+        user_ids, lignes = np.unique(notes_train['user_id'].to_numpy(), return_inverse=True)
+        item_ids = logements['id_listing'].to_numpy()
+        colonnes = pd.Series(np.arange(len(item_ids)), index=item_ids)[notes_train['id_listing']].to_numpy()
+        return MatriceUtilisateurItem.depuis_triplets(lignes, colonnes, notes_train['note'].to_numpy(),
+                                                      user_ids, item_ids)
+
+    matrice = _mesurer('user_item_matrix', _matrice)
+    knn = _mesurer('knn_model', lambda: ajuster_knn_creux(matrice))
+    index_logements = _mesurer('index_logements',
+                               lambda: IndexLogements.construire(jeu['metadata'], jeu['df_grouped']))
+
+    ids_listing = logements['id_listing'].tolist()
+    table_voisins = table_precalculee = None
+    if 'voisins' in precalcul:
+        table_voisins, _ = _mesurer('table_voisins', lambda: precalculer_voisins(ids_listing, matrice, knn))
+    if 'recommandations' in precalcul:
+        table_precalculee, _ = _mesurer('table_precalculee', lambda: precalculer_recommandations(
+            ids_listing, matrice, knn, similarite, table_index, alpha, beta, n_max,
+            table_voisins=table_voisins))
+    return {'encodeur': encodeur, 'logements_titres': logements, 'index_titres': index_titres,
+            'similarity_matrix_bert': similarite, 'table_index': table_index,
+            'user_item_matrix': matrice, 'knn_model': knn, 'index_logements': index_logements,
+            'table_voisins': table_voisins, 'table_precalculee': table_precalculee,
+            'durees_s': durees}
+
+
+def recommander_chronometre(artefacts, titre, top_n=10, alpha=0.5, beta=0.5, top_k_refs=1):
+    """
+    Pipeline de `_calculer_lot` (app.py) pour un titre, sans les caches
+
+    Mêmes fonctions et même ordre que le service : ligne pré-calculée pour
+    une référence unique, sinon candidats de la table des voisins ou de
+    `candidats_collaboratifs_lot`, puis `vecteurs_candidats` et `classer_vecteurs`.
+
+    Returns:
+        tuple: (recommandations, durée de chaque étape en s)
+    """
+    chrono = Chronometre()
+
+    embedding = encoder_titres(artefacts['encodeur'], [titre])
+    chrono.marquer('encodage')
+
+    _, indices_refs = artefacts['index_titres'].rechercher(embedding, k=top_k_refs)
+    matrice = artefacts['user_item_matrix']
+    positions = [int(i) for i in indices_refs[0] if i >= 0]
+    ids_refs = [i for i in artefacts['logements_titres']['id_listing'].iloc[positions].tolist()
+                if matrice.contient_item(i)]
+
+    top = None
+    table_precalculee = artefacts.get('table_precalculee')
+    if table_precalculee is not None and len(ids_refs) == 1:
+        top = table_precalculee.servir(ids_refs[0], alpha, beta, top_n)
+    chrono.marquer('references')
+
+    if top is None:
+        table_voisins = artefacts.get('table_voisins')
+        if table_voisins is not None and len(ids_refs) == 1 and ids_refs[0] in table_voisins:
+            candidats = table_voisins.candidats(ids_refs[0])
+        else:
+            candidats, = candidats_collaboratifs_lot(matrice, artefacts['knn_model'], [ids_refs], chrono=chrono)
+        if candidats is None:
+            return [], chrono.durees
+        vecteurs = vecteurs_candidats(artefacts['similarity_matrix_bert'], artefacts['table_index'],
+                                      ids_refs, *candidats)
+        top = classer_vecteurs(*vecteurs, alpha, beta, top_n)
+        chrono.marquer('scoring')
+
+    recommandations = [enrichir_logement(artefacts['index_logements'], *l) for l in zip(*top)]
+    chrono.marquer('enrichissement')
+    return recommandations, chrono.durees
+
+
+def metriques_qualite(listes, pertinents, k, n_logements):
+    """
+    Précision@k, rappel@k, NDCG@k (pertinence binaire) et couverture
+
+    Args:
+        listes (list): Par requête, id_listing recommandés dans l'ordre
+        pertinents (list): Par requête, ensemble des id_listing mis de côté
+        k (int): Longueur des listes évaluées
+        n_logements (int): Taille du catalogue
+
+    Returns:
+        dict: Moyennes sur les requêtes et couverture du catalogue
+    """
+    remises = 1.0 / np.log2(np.arange(2, k + 2))
+    precisions, rappels, ndcgs, recommandes = [], [], [], set()
+    for liste, attendus in zip(listes, pertinents):
+        liste = list(liste)[:k]
+        recommandes.update(liste)
+        gains = np.array([1.0 if i in attendus else 0.0 for i in liste])
+        precisions.append(gains.sum() / k)
+        rappels.append(gains.sum() / len(attendus) if attendus else 0.0)
+        ideal = remises[:min(len(attendus), k)].sum()
+        ndcgs.append(float(gains @ remises[:len(gains)]) / ideal if ideal else 0.0)
+    return {
+        f'precision@{k}': float(np.mean(precisions)) if precisions else None,
+        f'rappel@{k}': float(np.mean(rappels)) if rappels else None,
+        f'ndcg@{k}': float(np.mean(ndcgs)) if ndcgs else None,
+        'couverture': len(recommandes) / n_logements if n_logements else None,
+    }
+
+
+def evaluer(n_logements=2000, n_utilisateurs=5000, notes_par_utilisateur=20, n_requetes=500, k=10,
+            alpha=0.5, beta=0.5, top_k_refs=1, encodeur=None, graine=0, format_similarite='dense',
+            k_similarite=DEFAULT_TOP_K, precalcul=()):
+    """
+    Génère un jeu synthétique, construit les artefacts et évalue le pipeline
+
+    Args:
+        n_logements, n_utilisateurs, notes_par_utilisateur: Taille du jeu synthétique
+        n_requetes (int): Nombre d'utilisateurs de test interrogés
+        k (int): Longueur des listes de recommandations évaluées
+        alpha, beta (float): Poids du score hybride
+        top_k_refs (int): Logements de référence par titre
+        encodeur: Modèle d'encodage (défaut : EncodeurHachage)
+        graine (int): Graine aléatoire
+        format_similarite (str): Forme de la matrice de similarité (SIMILARITY_FORMAT)
+        k_similarite (int): K de la forme 'topk'
+        precalcul (iterable): Tables pré-calculées servies, parmi PRECALCULS
+
+    Returns:
+        dict: Latences par étape (ms), mémoire (Mo), métriques de qualité et
+            temps de construction des artefacts
+    """
+    memoire_depart, _ = memoire_processus()
+    jeu = generer_jeu_synthetique(n_logements, n_utilisateurs, notes_par_utilisateur, graine=graine)
+    notes_train, notes_test = separer_notes(jeu['notes'], graine=graine)
+    artefacts = preparer_artefacts(jeu, notes_train, encodeur or EncodeurHachage(), format_similarite,
+                                   k_similarite, precalcul, alpha, beta, max(k, DEFAULT_N_MAX))
+    memoire_artefacts, _ = memoire_processus()
+
+    # Requête : titre d'un logement aimé et gardé à l'entraînement ; attendus : ceux mis de côté
+    titres = artefacts['logements_titres'].set_index('id_listing')['title']
+    aimes = notes_train[notes_train['note'] >= 4].groupby('user_id')['id_listing'].first()
+    attendus = notes_test.groupby('user_id')['id_listing'].agg(set)
+    utilisateurs = [u for u in attendus.index if u in aimes.index]
+    utilisateurs = list(np.random.default_rng(graine).permutation(utilisateurs)[:n_requetes])
+
+    mesures = {etape: [] for etape in ETAPES}
+    totaux, listes, pertinents = [], [], []
+    for u in utilisateurs:
+        recommandations, durees = recommander_chronometre(artefacts, titres[aimes[u]], k, alpha, beta, top_k_refs)
+        for etape, duree in durees.items():
+            mesures[etape].append(duree)
+        totaux.append(sum(durees.values()))
+        listes.append([r['id_listing'] for r in recommandations])
+        pertinents.append(attendus[u])
+
+    memoire_fin, pic = memoire_processus()
+    return {
+        'parametres': {'logements': n_logements, 'utilisateurs': n_utilisateurs,
+                       'notes': len(jeu['notes']), 'requetes': len(utilisateurs), 'k': k,
+                       'alpha': alpha, 'beta': beta, 'top_k_refs': top_k_refs,
+                       'similarite': format_similarite, 'k_similarite': k_similarite,
+                       'precalcul': [nom for nom in PRECALCULS if nom in precalcul]},
+        'latences_ms': {**{etape: percentiles(mesures[etape], 1000) for etape in ETAPES},
+                        'total': percentiles(totaux, 1000)},
+        'memoire_mo': {'artefacts': memoire_artefacts - memoire_depart,
+                       'residente': memoire_fin, 'pic': pic,
+                       'similarite': artefacts['similarity_matrix_bert'].nbytes / 2 ** 20,
+                       'user_item_matrix': artefacts['user_item_matrix'].nbytes / 2 ** 20},
+        'construction_s': artefacts['durees_s'],
+        'qualite': metriques_qualite(listes, pertinents, k, n_logements),
+    }
+
+
+def regressions_qualite(rapport, reference, tolerance=0.005):
+    """
+    Métriques de qualité en baisse de plus de `tolerance` par rapport à un rapport de référence
+
+    Returns:
+        dict: métrique -> (référence, valeur actuelle)
+    """
+    regressions = {}
+    for nom, valeur_reference in reference.get('qualite', {}).items():
+        valeur = rapport['qualite'].get(nom)
+        if valeur_reference is not None and valeur is not None and valeur < valeur_reference - tolerance:
+            regressions[nom] = (valeur_reference, valeur)
+    return regressions
+
+
+def afficher_rapport(rapport):
+    """Affiche latences, mémoire et qualité"""
+    p = rapport['parametres']
+    print(f"📊 Recommandeur hybride : {p['logements']} logements, {p['utilisateurs']} utilisateurs, "
+          f"{p['notes']} notes, {p['requetes']} requêtes")
+    similarite = p['similarite'] + (f" (K={p['k_similarite']})" if p['similarite'] == 'topk' else '')
+    print(f"🔧 Similarité {similarite}, pré-calcul : {', '.join(p['precalcul']) or 'aucun'}")
+    print("⏱️ Latences par étape (ms) :")
+    for etape, valeurs in rapport['latences_ms'].items():
+        if valeurs['p50'] is not None:
+            print(f"   {etape:<15} p50 {valeurs['p50']:8.3f}  p95 {valeurs['p95']:8.3f}  p99 {valeurs['p99']:8.3f}")
+    m = rapport['memoire_mo']
+    print(f"💾 Mémoire : artefacts +{m['artefacts']:.1f} Mo, résidente {m['residente']:.1f} Mo, "
+          f"pic {m['pic']:.1f} Mo (similarité {m['similarite']:.1f} Mo, "
+          f"matrice creuse {m['user_item_matrix']:.1f} Mo)")
+    print("🎯 Qualité (notes mises de côté) :")
+    for nom, valeur in rapport['qualite'].items():
+        print(f"   {nom:<15} {valeur:.4f}" if valeur is not None else f"   {nom:<15} -")
+
+
+def main():
+    """Benchmark et évaluation sur un jeu synthétique"""
+    parser = argparse.ArgumentParser(description="Évaluation hors-ligne du recommandeur hybride")
+    parser.add_argument('--logements', type=int, default=2000)
+    parser.add_argument('--utilisateurs', type=int, default=5000)
+    parser.add_argument('--notes-par-utilisateur', type=int, default=20)
+    parser.add_argument('--requetes', type=int, default=500)
+    parser.add_argument('--k', type=int, default=10)
+    parser.add_argument('--alpha', type=float, default=0.5)
+    parser.add_argument('--beta', type=float, default=0.5)
+    parser.add_argument('--top-k-refs', type=int, default=1)
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--similarite', choices=SIMILARITY_FORMATS, default='dense',
+                        help="Forme de la matrice de similarité, comme SIMILARITY_FORMAT")
+    parser.add_argument('--top-k-similarite', type=int, default=DEFAULT_TOP_K)
+    parser.add_argument('--precalcul', nargs='+', choices=PRECALCULS, default=[],
+                        help="Tables pré-calculées servies (voisins, recommandations)")
+    parser.add_argument('--modele', default=None,
+                        help="Modèle SentenceTransformer (défaut : encodeur par hachage des mots)")
+    parser.add_argument('--json', default=None, help="Fichier où écrire le rapport")
+    parser.add_argument('--reference', default=None,
+                        help="Rapport JSON de référence : code de sortie 1 si la qualité baisse")
+    parser.add_argument('--sauvegarder', default=None,
+                        help="Écrit seulement le jeu synthétique (pickles lus par app.py) dans ce dossier")
+    args = parser.parse_args()
+
+    encodeur = None
+    if args.modele:
+        from encodeur_onnx import charger_modele_embeddings
+        encodeur = charger_modele_embeddings(args.modele)
+
+    if args.sauvegarder:
+        jeu = generer_jeu_synthetique(args.logements, args.utilisateurs, args.notes_par_utilisateur,
+                                      graine=args.graine)
+        sauvegarder_jeu(jeu, args.sauvegarder, encodeur)
+        return
+
+    rapport = evaluer(args.logements, args.utilisateurs, args.notes_par_utilisateur, args.requetes,
+                      args.k, args.alpha, args.beta, args.top_k_refs, encodeur, args.graine,
+                      args.similarite, args.top_k_similarite, args.precalcul)
+    afficher_rapport(rapport)
+    if args.json:
+        with open(args.json, 'w', encoding='utf-8') as f:
+            json.dump(rapport, f, indent=2)
+        print(f"✅ Rapport écrit dans {args.json}")
+    if args.reference:
+        with open(args.reference, encoding='utf-8') as f:
+            regressions = regressions_qualite(rapport, json.load(f))
+        for nom, (avant, apres) in regressions.items():
+            print(f"❌ Régression {nom} : {avant:.4f} -> {apres:.4f}")
+        if regressions:
+            raise SystemExit(1)
+        print("✅ Pas de régression de qualité par rapport à la référence")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Index des logements par id_listing
+==================================
+
+Remplace les filtres `metadata[metadata["id_listing"] == id]` et
+`all_reviews2[(all_reviews2["id_listing"] == id) & ...]` (parcours complets
+des DataFrames) par des dictionnaires de tuples construits une seule fois :
+- notes (rating_review_moyen, accuracy_moyen) issues de `metadata`
+- informations d'affichage (première ligne du logement dans `df_grouped`)
+- N premiers avis positifs (`localizedText`) de chaque logement
+
+L'index est sauvegardé dans `listing_index.pkl` avec les empreintes des
+pickles sources ; il n'est reconstruit que si l'un d'eux change.
+
+Construction hors-ligne :
+    python index_logements.py [metadata.pkl] [df_grouped.pkl]
+"""
+
+import os
+import pickle
+
+import pandas as pd
+
+from embeddings_titres import empreinte_fichier
+
+INDEX_FILE = 'listing_index.pkl'
+INDEX_VERSION = 1
+DEFAULT_N_AVIS = 3
+COLONNES_INFOS = ('title', 'city_listing', 'description', 'sentiment_moyen')
+
+
+def _valeurs_natives(valeurs):
+    """Convertit les scalaires NumPy en objets Python (pickle plus compact et portable)"""
+    return tuple(v.item() if hasattr(v, 'item') else v for v in valeurs)
+
+
+class IndexLogements:
+    """
+    Tables de correspondance id_listing -> données d'un logement (accès O(1))
+    """
+
+    def __init__(self, notes, infos, avis_positifs, colonnes_infos, n_avis=DEFAULT_N_AVIS):
+        """
+        Args:
+            notes (dict): id_listing -> (rating, accuracy)
+            infos (dict): id_listing -> tuple des valeurs de `colonnes_infos`
+            avis_positifs (dict): id_listing -> tuple des premiers avis positifs
+            colonnes_infos (tuple): Colonnes présentes dans `infos`
+            n_avis (int): Nombre d'avis positifs conservés par logement
+        """
+        self.notes = notes
+        self.infos = infos
+        self.avis_positifs = avis_positifs
+        self.colonnes_infos = tuple(colonnes_infos)
+        self.n_avis = n_avis
+
+    def __len__(self):
+        return len(self.infos)
+
+    def note(self, id_listing):
+        """Renvoie (rating, accuracy), ou (None, None) si le logement est absent de metadata"""
+        return self.notes.get(id_listing, (None, None))
+
+    def info(self, id_listing):
+        """Renvoie les informations d'affichage du logement sous forme de dict ({} si absent)"""
+        valeurs = self.infos.get(id_listing)
+        return dict(zip(self.colonnes_infos, valeurs)) if valeurs is not None else {}
+
+    def avis(self, id_listing):
+        """Renvoie la liste des premiers avis positifs du logement"""
+        return list(self.avis_positifs.get(id_listing, ()))
+
+    @classmethod
+    def construire(cls, metadata, all_reviews, n_avis=DEFAULT_N_AVIS):
+        """
+        Construit l'index à partir des DataFrames chargés
+
+        Args:
+            metadata (DataFrame): Métadonnées (id_listing, rating_review_moyen, accuracy_moyen)
+            all_reviews (DataFrame): Avis (une ligne par avis, df_grouped)
+            n_avis (int): Nombre d'avis positifs conservés par logement
+
+        Returns:
+            IndexLogements: Index construit
+        """
+        # Première occurrence de chaque logement, comme `.values[0]` / `.iloc[0]`
+        meta = metadata.drop_duplicates('id_listing')
+        notes = {
+            id_listing: _valeurs_natives(valeurs)
+            for id_listing, *valeurs in zip(meta['id_listing'].tolist(),
+                                            meta['rating_review_moyen'].to_numpy(),
+                                            meta['accuracy_moyen'].to_numpy())
+        }
+
+        colonnes_infos = [c for c in COLONNES_INFOS if c in all_reviews.columns]
+        premieres = all_reviews.drop_duplicates('id_listing')
+        infos = {
+            id_listing: _valeurs_natives(valeurs)
+            for id_listing, *valeurs in zip(premieres['id_listing'].tolist(),
+                                            *(premieres[c].to_numpy() for c in colonnes_infos))
+        }
+
+        positifs = all_reviews.loc[
+            (all_reviews['sentiment_bert'] == 'positive') & all_reviews['localizedText'].notna(),
+            ['id_listing', 'localizedText']
+        ]
+        positifs = positifs.groupby('id_listing', sort=False).head(n_avis)
+        avis_positifs = {
+            id_listing: tuple(textes)
+            for id_listing, textes in positifs.groupby('id_listing', sort=False)['localizedText']
+        }
+
+        return cls(notes, infos, avis_positifs, colonnes_infos, n_avis)
+
+    def sauvegarder(self, chemin, sources=None):
+        """
+        Args:
+            chemin (str): Fichier pickle de sortie
+            sources (dict): Empreintes des fichiers sources
+        """
+        with open(chemin, 'wb') as f:
+            pickle.dump({
+                'version': INDEX_VERSION,
+                'sources': sources or {},
+                'n_avis': self.n_avis,
+                'colonnes_infos': self.colonnes_infos,
+                'notes': self.notes,
+                'infos': self.infos,
+                'avis_positifs': self.avis_positifs
+            }, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+
+def enrichir_logement(index_logements, id_logement, score_final, sim_bert, note_estimee):
+    """
+    Recommandation d'un logement avec ses métadonnées et avis positifs (format de l'API)
+
+    Args:
+        index_logements (IndexLogements): Index des logements
+        id_logement (int): id_listing recommandé
+        score_final (float): Score hybride
+        sim_bert (float): Similarité BERT
+        note_estimee (float): Note estimée par le KNN
+
+    Returns:
+        dict: Recommandation sérialisable en JSON
+    """
+    rating, accuracy = index_logements.note(id_logement)
+    infos = index_logements.info(id_logement)
+    reviews_pos = index_logements.avis(id_logement)
+
+    return {
+        "id_listing": int(id_logement),
+        "score": float(score_final),
+        "similarity_bert": float(sim_bert),
+        "note_estimée_knn": float(note_estimee),
+        "rating": float(rating) if rating is not None else None,
+        "accuracy": float(accuracy) if accuracy is not None else None,
+        "title": infos.get("title", None),
+        "city_listing": infos.get("city_listing", None),
+        "description": (infos.get("description", "")[:300] + "...") if infos.get("description") else None,
+        "sentiment_moyen": float(infos.get("sentiment_moyen", 0)) if "sentiment_moyen" in infos else None,
+        "reviews_positives": reviews_pos[:3]
+    }
+
+
+def charger_index_logements(metadata, all_reviews, metadata_file='metadata.pkl',
+                            reviews_file='df_grouped.pkl', index_file=INDEX_FILE,
+                            n_avis=DEFAULT_N_AVIS):
+    """
+    Charge l'index des logements, en le reconstruisant si les sources ont changé
+
+    Args:
+        metadata (DataFrame ou callable): Métadonnées, ou fonction qui les charge
+            (appelée seulement si reconstruction)
+        all_reviews (DataFrame ou callable): Avis, ou fonction qui les charge
+            (appelée seulement si reconstruction)
+        metadata_file (str): Pickle source de `metadata`
+        reviews_file (str): Pickle source de `all_reviews`
+        index_file (str): Fichier de l'index sauvegardé
+        n_avis (int): Nombre d'avis positifs conservés par logement
+
+    Returns:
+        IndexLogements: Index prêt à l'emploi
+    """
+    sources = {
+        os.path.basename(chemin): empreinte_fichier(chemin)
+        for chemin in (metadata_file, reviews_file) if os.path.exists(chemin)
+    }
+
+    try:
+        with open(index_file, 'rb') as f:
+            contenu = pickle.load(f)
+        if (contenu.get('version') == INDEX_VERSION and contenu.get('n_avis') == n_avis
+                and sources and contenu.get('sources') == sources):
+            index = IndexLogements(contenu['notes'], contenu['infos'], contenu['avis_positifs'],
+                                   contenu['colonnes_infos'], contenu['n_avis'])
+            print(f"✅ Index des logements chargé depuis {index_file} ({len(index)} logements)")
+            return index
+    except (OSError, pickle.UnpicklingError, EOFError, AttributeError, KeyError):
+        pass
+
+    print("🔄 Construction de l'index des logements...")
+    if callable(metadata):
+        metadata = metadata()
+    if callable(all_reviews):
+        all_reviews = all_reviews()
+    index = IndexLogements.construire(metadata, all_reviews, n_avis)
+    index.sauvegarder(index_file, sources)
+    print(f"✅ Index des logements sauvegardé dans {index_file} ({len(index)} logements)")
+    return index
+
+
+def main():
+    """Construction hors-ligne de l'index des logements"""
+    import sys
+
+    metadata_file = sys.argv[1] if len(sys.argv) > 1 else 'metadata.pkl'
+    reviews_file = sys.argv[2] if len(sys.argv) > 2 else 'df_grouped.pkl'
+    charger_index_logements(pd.read_pickle(metadata_file), pd.read_pickle(reviews_file),
+                            metadata_file, reviews_file)
+
+
+if __name__ == "__main__":
+    main()
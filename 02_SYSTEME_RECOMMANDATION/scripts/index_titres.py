@@ -0,0 +1,285 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Index des titres pour retrouver les logements de référence
+==========================================================
+
+Recherche par produit scalaire sur les embeddings normalisés des titres
+(équivalent à la similarité cosinus). Trois implémentations interchangeables :
+- `exact` : recherche exhaustive (flat), résultat de référence
+- `ivf`   : index approximatif à listes inversées (k-means NumPy)
+- `faiss` : HNSW via FAISS (déjà utilisé par le chatbot LangChain), optionnel
+
+Toutes exposent `rechercher(requetes, k)` qui renvoie `(scores, indices)`
+de forme (n_requetes, k), triés par score décroissant. Les cases non
+remplies valent -1 (indice) et -inf (score).
+
+Évaluation du mode approximatif face au mode exact :
+    python index_titres.py [title_embeddings_bert.npy] [ivf|faiss]
+"""
+
+import time
+
+import numpy as np
+
+try:
+    import faiss
+    FAISS_AVAILABLE = True
+except ImportError:
+    FAISS_AVAILABLE = False
+
+INDEX_MODES = ('exact', 'ivf', 'faiss')
+
+
+def _preparer_requetes(requetes):
+    """Convertit une requête (d,) ou un lot (q, d) en matrice float32 (q, d)"""
+    requetes = np.asarray(requetes, dtype=np.float32)
+    return requetes.reshape(1, -1) if requetes.ndim == 1 else requetes
+
+
+def _top_k(scores, k):
+    """
+    Sélectionne les k meilleurs scores de chaque ligne sans tri complet
+
+    Args:
+        scores (np.ndarray): Matrice (q, n) de scores
+        k (int): Nombre de résultats par ligne
+
+    Returns:
+        tuple: (scores, indices) de forme (q, k) triés par score décroissant
+    """
+    n = scores.shape[1]
+    k_eff = min(k, n)
+    if k_eff < n:
+        indices = np.argpartition(-scores, k_eff - 1, axis=1)[:, :k_eff]
+    else:
+        indices = np.tile(np.arange(n), (scores.shape[0], 1))
+    top = np.take_along_axis(scores, indices, axis=1)
+    ordre = np.argsort(-top, axis=1, kind='stable')
+    indices = np.take_along_axis(indices, ordre, axis=1)
+    top = np.take_along_axis(top, ordre, axis=1)
+
+    if k_eff < k:
+        pad = k - k_eff
+        indices = np.pad(indices, ((0, 0), (0, pad)), constant_values=-1)
+        top = np.pad(top, ((0, 0), (0, pad)), constant_values=-np.inf)
+    return top, indices
+
+
+class IndexTitresExact:
+    """Recherche exhaustive par produit scalaire (une multiplication matricielle)"""
+
+    mode = 'exact'
+
+    def __init__(self, embeddings):
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def rechercher(self, requetes, k=1):
+        """
+        Args:
+            requetes (np.ndarray): Requête (d,) ou lot (q, d) normalisés
+            k (int): Nombre de voisins à retourner
+
+        Returns:
+            tuple: (scores, indices) de forme (q, k)
+        """
+        scores = _preparer_requetes(requetes) @ self.embeddings.T
+        return _top_k(scores, k)
+
+
+class IndexTitresIVF:
+    """
+    Index approximatif à listes inversées (IVF) construit avec NumPy
+
+    Les titres sont répartis en `n_listes` groupes par k-means sphérique ;
+    une requête ne compare que les titres des `n_sondes` groupes les plus
+    proches. Les listes sont stockées à plat (ordre + offsets, style CSR).
+    """
+
+    mode = 'ivf'
+
+    def __init__(self, embeddings, n_listes=None, n_sondes=8, n_iter=10, seed=0):
+        """
+        Args:
+            embeddings (np.ndarray): Matrice (n, d) normalisée
+            n_listes (int): Nombre de groupes (défaut : racine de n)
+            n_sondes (int): Nombre de groupes explorés par requête
+            n_iter (int): Itérations de k-means
+            seed (int): Graine pour l'initialisation
+        """
+        self.embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        n = len(self.embeddings)
+        self.n_listes = max(1, min(n_listes or int(np.sqrt(n)), n))
+        self.n_sondes = max(1, min(n_sondes, self.n_listes))
+
+        rng = np.random.default_rng(seed)
+        self.centroides = self.embeddings[rng.choice(n, self.n_listes, replace=False)].copy()
+        affectations = np.zeros(n, dtype=np.int64)
+        for _ in range(n_iter):
+            affectations = (self.embeddings @ self.centroides.T).argmax(axis=1)
+            sommes = np.zeros_like(self.centroides)
+            np.add.at(sommes, affectations, self.embeddings)
+            normes = np.linalg.norm(sommes, axis=1, keepdims=True)
+            non_vides = normes[:, 0] > 0
+            self.centroides[non_vides] = sommes[non_vides] / normes[non_vides]
+        affectations = (self.embeddings @ self.centroides.T).argmax(axis=1)
+
+        self.ordre = np.argsort(affectations, kind='stable')
+        self.offsets = np.searchsorted(affectations[self.ordre], np.arange(self.n_listes + 1))
+
+    def __len__(self):
+        return len(self.embeddings)
+
+    def rechercher(self, requetes, k=1):
+        """
+        Args:
+            requetes (np.ndarray): Requête (d,) ou lot (q, d) normalisés
+            k (int): Nombre de voisins à retourner
+
+        Returns:
+            tuple: (scores, indices) de forme (q, k)
+        """
+        requetes = _preparer_requetes(requetes)
+        _, sondes = _top_k(requetes @ self.centroides.T, self.n_sondes)
+
+        scores_sortie = np.full((len(requetes), k), -np.inf, dtype=np.float32)
+        indices_sortie = np.full((len(requetes), k), -1, dtype=np.int64)
+        for i, requete in enumerate(requetes):
+            lignes = np.concatenate([
+                self.ordre[self.offsets[c]:self.offsets[c + 1]] for c in sondes[i]
+            ])
+            if len(lignes) == 0:
+                continue
+            scores, positions = _top_k((self.embeddings[lignes] @ requete)[None, :], k)
+            valides = positions[0] >= 0
+            scores_sortie[i, valides] = scores[0, valides]
+            indices_sortie[i, valides] = lignes[positions[0, valides]]
+        return scores_sortie, indices_sortie
+
+
+class IndexTitresFAISS:
+    """Index HNSW FAISS en produit scalaire (nécessite faiss-cpu)"""
+
+    mode = 'faiss'
+
+    def __init__(self, embeddings, m=32, ef_search=64):
+        """
+        Args:
+            embeddings (np.ndarray): Matrice (n, d) normalisée
+            m (int): Nombre de liens par nœud du graphe HNSW
+            ef_search (int): Largeur de la recherche
+        """
+        if not FAISS_AVAILABLE:
+            raise ImportError("faiss n'est pas installé : pip install faiss-cpu")
+        embeddings = np.ascontiguousarray(embeddings, dtype=np.float32)
+        self._n = len(embeddings)
+        self.index = faiss.IndexHNSWFlat(embeddings.shape[1], m, faiss.METRIC_INNER_PRODUCT)
+        self.index.hnsw.efSearch = ef_search
+        self.index.add(embeddings)
+
+    def __len__(self):
+        return self._n
+
+    def rechercher(self, requetes, k=1):
+        """
+        Args:
+            requetes (np.ndarray): Requête (d,) ou lot (q, d) normalisés
+            k (int): Nombre de voisins à retourner
+
+        Returns:
+            tuple: (scores, indices) de forme (q, k)
+        """
+        scores, indices = self.index.search(np.ascontiguousarray(_preparer_requetes(requetes)), k)
+        scores[indices < 0] = -np.inf
+        return scores, indices.astype(np.int64)
+
+
+def creer_index_titres(embeddings, mode='exact', **params):
+    """
+    Construit l'index des titres demandé
+
+    Args:
+        embeddings (np.ndarray): Matrice (n, d) normalisée
+        mode (str): 'exact', 'ivf' ou 'faiss'
+        **params: Paramètres propres à l'index
+
+    Returns:
+        Index exposant `rechercher(requetes, k)`
+    """
+    if mode == 'exact':
+        return IndexTitresExact(embeddings)
+    if mode == 'ivf':
+        return IndexTitresIVF(embeddings, **params)
+    if mode == 'faiss':
+        return IndexTitresFAISS(embeddings, **params)
+    raise ValueError(f"Mode d'index inconnu : {mode} (attendu : {', '.join(INDEX_MODES)})")
+
+
+def evaluer_index(index_approx, index_exact, requetes, k=10):
+    """
+    Mesure le rappel@k et la latence d'un index approximatif face à l'index exact
+
+    Args:
+        index_approx: Index à évaluer
+        index_exact: Index de référence (IndexTitresExact)
+        requetes (np.ndarray): Lot (q, d) de requêtes normalisées
+        k (int): Nombre de voisins comparés
+
+    Returns:
+        dict: Rappel@k et latences moyennes par requête (ms)
+    """
+    requetes = _preparer_requetes(requetes)
+
+    def _chronometrer(index):
+        debut = time.perf_counter()
+        resultats = [index.rechercher(q, k)[1][0] for q in requetes]
+        return resultats, (time.perf_counter() - debut) * 1000 / len(requetes)
+
+    exacts, latence_exacte = _chronometrer(index_exact)
+    approx, latence_approx = _chronometrer(index_approx)
+
+    rappels = [
+        len(set(a[a >= 0].tolist()) & set(e[e >= 0].tolist())) / max(1, int((e >= 0).sum()))
+        for a, e in zip(approx, exacts)
+    ]
+    return {
+        'mode': index_approx.mode,
+        'k': k,
+        'n_requetes': len(requetes),
+        'rappel_at_k': float(np.mean(rappels)),
+        'latence_exacte_ms': latence_exacte,
+        'latence_approx_ms': latence_approx,
+        'acceleration': latence_exacte / latence_approx if latence_approx > 0 else float('inf')
+    }
+
+
+def main():
+    """Compare le mode approximatif au mode exact sur les embeddings sauvegardés"""
+    import sys
+    from embeddings_titres import EMBEDDINGS_FILE, normaliser_l2
+
+    chemin = sys.argv[1] if len(sys.argv) > 1 else EMBEDDINGS_FILE
+    mode = sys.argv[2] if len(sys.argv) > 2 else 'ivf'
+
+    embeddings = np.load(chemin)
+    rng = np.random.default_rng(0)
+    echantillon = rng.choice(len(embeddings), min(200, len(embeddings)), replace=False)
+    requetes = normaliser_l2(
+        embeddings[echantillon] + 0.05 * rng.standard_normal((len(echantillon), embeddings.shape[1]))
+    )
+
+    rapport = evaluer_index(creer_index_titres(embeddings, mode),
+                            IndexTitresExact(embeddings), requetes, k=10)
+    print(f"📊 Index '{rapport['mode']}' sur {len(embeddings):,} titres "
+          f"({rapport['n_requetes']} requêtes)")
+    print(f"   🎯 Rappel@{rapport['k']} : {rapport['rappel_at_k']:.3f}")
+    print(f"   ⏱️ Latence exacte : {rapport['latence_exacte_ms']:.3f} ms")
+    print(f"   ⏱️ Latence approx : {rapport['latence_approx_ms']:.3f} ms "
+          f"(x{rapport['acceleration']:.1f})")
+
+
+if __name__ == "__main__":
+    main()
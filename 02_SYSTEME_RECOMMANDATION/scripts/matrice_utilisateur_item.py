@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Matrice utilisateur-item creuse pour le filtrage collaboratif
+=============================================================
+
+`user_item_matrix.pkl` est un DataFrame dense presque entièrement NaN.
+Ce module le convertit en matrice creuse SciPy (CSR pour les lignes,
+CSC pour les colonnes) accompagnée des correspondances id <-> indice :
+- "utilisateurs ayant noté le logement X" = tranche de colonne CSC
+- moyenne des notes de plusieurs utilisateurs = somme creuse / nombre de notes
+  (mêmes valeurs que `DataFrame.mean()` qui ignore les NaN)
+- KNN ajusté directement sur la matrice creuse (cases vides = 0, comme `fillna(0)`)
+
+La forme creuse est sauvegardée dans `user_item_sparse.pkl` avec l'empreinte
+de `user_item_matrix.pkl` ; le DataFrame dense n'est relu que s'il change
+(depuis son export en triplets `user_item_matrix.feather` s'il est à jour).
+"""
+
+import hashlib
+import os
+import pickle
+
+import numpy as np
+from scipy import sparse
+
+from artefacts_colonnes import export_utilisable, fichier_source, lire_triplets_utilisateur_item
+from embeddings_titres import empreinte_fichier
+
+SPARSE_FILE = 'user_item_sparse.pkl'
+
+
+class MatriceUtilisateurItem:
+    """
+    Notes utilisateur x logement au format creux, avec les id d'origine
+    """
+
+    def __init__(self, csr, user_ids, item_ids):
+        """
+        Args:
+            csr (sparse.csr_matrix): Notes (n_utilisateurs, n_logements), cases stockées = notes connues
+            user_ids (np.ndarray): Identifiants des utilisateurs (lignes)
+            item_ids (np.ndarray): id_listing des logements (colonnes)
+        """
+        self.csr = sparse.csr_matrix(csr, dtype=np.float32)
+        self.csc = self.csr.tocsc()
+        self.user_ids = np.asarray(user_ids)
+        self.item_ids = np.asarray(item_ids)
+        self.item_pos = {item: j for j, item in enumerate(self.item_ids.tolist())}
+
+    @property
+    def shape(self):
+        return self.csr.shape
+
+    @property
+    def nbytes(self):
+        return self.csr.data.nbytes + self.csr.indices.nbytes + self.csr.indptr.nbytes
+
+    def contient_item(self, id_listing):
+        return id_listing in self.item_pos
+
+    @classmethod
+    def depuis_dataframe(cls, df):
+        """
+        Convertit le DataFrame dense (NaN = note inconnue)
+
+        Args:
+            df (DataFrame): user_item_matrix (index = utilisateurs, colonnes = id_listing)
+
+        Returns:
+            MatriceUtilisateurItem: Forme creuse
+        """
+        valeurs = df.to_numpy(dtype=np.float32)
+        lignes, colonnes = np.nonzero(~np.isnan(valeurs))
+        csr = sparse.csr_matrix((valeurs[lignes, colonnes], (lignes, colonnes)), shape=valeurs.shape)
+        return cls(csr, df.index.to_numpy(), df.columns.to_numpy())
+
+    @classmethod
+    def depuis_triplets(cls, lignes, colonnes, notes, user_ids, item_ids):
+        """
+        Construit la matrice depuis les notes connues (export Arrow en triplets)
+
+        Args:
+            lignes (np.ndarray): Position de l'utilisateur de chaque note
+            colonnes (np.ndarray): Position du logement de chaque note
+            notes (np.ndarray): Notes
+            user_ids (np.ndarray): Identifiants des utilisateurs (lignes)
+            item_ids (np.ndarray): id_listing des logements (colonnes)
+
+        Returns:
+            MatriceUtilisateurItem: Forme creuse
+        """
+        csr = sparse.csr_matrix((notes, (lignes, colonnes)), shape=(len(user_ids), len(item_ids)))
+        return cls(csr, user_ids, item_ids)
+
+    def utilisateurs_ayant_note(self, ids_listing):
+        """
+        Lignes des utilisateurs ayant noté au moins un des logements
+
+        Args:
+            ids_listing (list): id_listing des logements
+
+        Returns:
+            np.ndarray: Indices de lignes triés
+        """
+        tranches = [
+            self.csc.indices[self.csc.indptr[j]:self.csc.indptr[j + 1]]
+            for j in (self.item_pos[i] for i in ids_listing if i in self.item_pos)
+        ]
+        if not tranches:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(np.concatenate(tranches)).astype(np.int64)
+
+    def moyennes_colonnes(self, lignes):
+        """
+        Moyenne par logement des notes des utilisateurs donnés (NaN ignorés)
+
+        Args:
+            lignes (array-like): Indices des utilisateurs
+
+        Returns:
+            tuple: (colonnes ayant au moins une note, moyennes correspondantes)
+        """
+        sous_matrice = self.csr[np.asarray(lignes, dtype=np.int64)]
+        sommes = np.asarray(sous_matrice.sum(axis=0), dtype=np.float64).ravel()
+        nombres = sous_matrice.getnnz(axis=0)
+        colonnes = np.flatnonzero(nombres)
+        return colonnes, sommes[colonnes] / nombres[colonnes]
+
+    def vecteur_moyen(self, lignes):
+        """
+        Vecteur utilisateur moyen au format creux (équivalent de `.mean().fillna(0)`)
+
+        Args:
+            lignes (array-like): Indices des utilisateurs
+
+        Returns:
+            sparse.csr_matrix: Vecteur (1, n_logements)
+        """
+        colonnes, moyennes = self.moyennes_colonnes(lignes)
+        return sparse.csr_matrix(
+            (moyennes.astype(np.float32), (np.zeros(len(colonnes), dtype=np.int64), colonnes)),
+            shape=(1, self.shape[1])
+        )
+
+    def notes_moyennes(self, lignes):
+        """
+        Notes moyennes des logements notés par ces utilisateurs (équivalent de `.mean().dropna()`)
+
+        Args:
+            lignes (array-like): Indices des utilisateurs
+
+        Returns:
+            tuple: (id_listing, notes moyennes) dans l'ordre des colonnes
+        """
+        colonnes, moyennes = self.moyennes_colonnes(lignes)
+        return self.item_ids[colonnes], moyennes
+
+    def signatures_colonnes(self):
+        """
+        Empreinte des notes de chaque logement (utilisateurs et valeurs)
+
+        Returns:
+            dict: id_listing -> empreinte hexadécimale de sa colonne
+        """
+        indptr, indices, data = self.csc.indptr, self.csc.indices, self.csc.data
+        return {
+            item: hashlib.blake2b(indices[indptr[j]:indptr[j + 1]].tobytes()
+                                  + data[indptr[j]:indptr[j + 1]].tobytes(), digest_size=8).hexdigest()
+            for j, item in enumerate(self.item_ids.tolist())
+        }
+
+    def signatures_lignes(self):
+        """
+        Empreinte des notes de chaque utilisateur (logements et valeurs)
+
+        Returns:
+            dict: identifiant utilisateur -> empreinte hexadécimale de sa ligne
+        """
+        indptr, data = self.csr.indptr, self.csr.data
+        # id_listing plutôt que positions : l'ajout d'un logement ne change pas les autres lignes
+        colonnes = self.item_ids[self.csr.indices].astype(np.int64)
+        return {
+            user: hashlib.blake2b(colonnes[indptr[i]:indptr[i + 1]].tobytes()
+                                  + data[indptr[i]:indptr[i + 1]].tobytes(), digest_size=8).hexdigest()
+            for i, user in enumerate(self.user_ids.tolist())
+        }
+
+    def empreinte(self):
+        """Empreinte globale de la matrice (détecte toute modification des notes)"""
+        h = hashlib.blake2b(digest_size=16)
+        for tableau in (self.csr.indptr, self.csr.indices, self.csr.data, self.item_ids):
+            h.update(np.ascontiguousarray(tableau).tobytes())
+        return h.hexdigest()
+
+
+def candidats_collaboratifs_lot(matrice, knn_model, listes_refs, n_voisins=10, chrono=None):
+    """
+    Étape collaborative pour plusieurs requêtes, avec un seul appel à `kneighbors`
+
+    Pour chaque liste de références : utilisateurs les ayant notées, vecteur
+    moyen, voisins KNN puis notes moyennes des logements notés par ces voisins.
+
+    Args:
+        matrice (MatriceUtilisateurItem): Matrice creuse
+        knn_model (NearestNeighbors): KNN ajusté sur `matrice.csr`
+        listes_refs (list): Une liste d'id_listing de référence par requête
+        n_voisins (int): Voisins demandés au KNN (le premier est ignoré)
+        chrono (Chronometre): Si fourni, marque les étapes "utilisateurs" et "knn"
+
+    Returns:
+        list: Par requête, (id_listing candidats, notes estimées), ou None si
+            personne n'a noté ses références
+    """
+    resultats = [None] * len(listes_refs)
+    positions, vecteurs = [], []
+    for i, ids_listing_ref in enumerate(listes_refs):
+        users_ayant_note = matrice.utilisateurs_ayant_note(ids_listing_ref)
+        if len(users_ayant_note):
+            positions.append(i)
+            vecteurs.append(matrice.vecteur_moyen(users_ayant_note))
+    if chrono is not None:
+        chrono.marquer('utilisateurs')
+    if not vecteurs:
+        return resultats
+
+    _, indices = knn_model.kneighbors(sparse.vstack(vecteurs, format='csr'), n_neighbors=n_voisins)
+    if chrono is not None:
+        chrono.marquer('knn')
+    for i, voisins in zip(positions, indices):
+        ids_candidats, notes_estimees = matrice.notes_moyennes(voisins[1:])
+        hors_refs = ~np.isin(ids_candidats, listes_refs[i])
+        resultats[i] = (ids_candidats[hors_refs].astype(np.int64), notes_estimees[hors_refs])
+    return resultats
+
+
+def candidats_collaboratifs(matrice, knn_model, ids_listing_ref, n_voisins=10):
+    """
+    Étape collaborative pour une seule liste de références
+
+    Args:
+        matrice (MatriceUtilisateurItem): Matrice creuse
+        knn_model (NearestNeighbors): KNN ajusté sur `matrice.csr`
+        ids_listing_ref (list): id_listing des logements de référence
+        n_voisins (int): Voisins demandés au KNN (le premier est ignoré)
+
+    Returns:
+        tuple: (id_listing candidats, notes estimées), ou None si personne
+            n'a noté les références
+    """
+    return candidats_collaboratifs_lot(matrice, knn_model, [ids_listing_ref], n_voisins)[0]
+
+
+def ajuster_knn_creux(matrice, knn_model=None, n_neighbors=10):
+    """
+    Ajuste un KNN sur la matrice creuse
+
+    Les paramètres (métrique, nombre de voisins...) du modèle existant sont
+    repris ; seule la recherche passe en force brute, compatible avec SciPy.
+
+    Args:
+        matrice (MatriceUtilisateurItem): Matrice creuse
+        knn_model (NearestNeighbors): Modèle dont reprendre les paramètres
+        n_neighbors (int): Nombre de voisins si aucun modèle n'est fourni
+
+    Returns:
+        NearestNeighbors: Modèle ajusté sur la matrice CSR
+    """
+    from sklearn.base import clone
+    from sklearn.neighbors import NearestNeighbors
+
+    if knn_model is not None:
+        knn = clone(knn_model).set_params(algorithm='brute')
+    else:
+        knn = NearestNeighbors(n_neighbors=n_neighbors, metric='cosine', algorithm='brute')
+    return knn.fit(matrice.csr)
+
+
+def charger_matrice_utilisateur_item(source_file='user_item_matrix.pkl', sparse_file=SPARSE_FILE):
+    """
+    Charge la matrice creuse, en la reconstruisant depuis le pickle dense si besoin
+
+    Args:
+        source_file (str): DataFrame dense d'origine
+        sparse_file (str): Forme creuse sauvegardée
+
+    Returns:
+        MatriceUtilisateurItem: Matrice creuse
+    """
+    import pandas as pd
+
+    source = fichier_source(source_file)
+    empreinte = empreinte_fichier(source) if os.path.exists(source) else None
+
+    try:
+        with open(sparse_file, 'rb') as f:
+            contenu = pickle.load(f)
+        if empreinte is None or contenu.get('source_sha256') == empreinte:
+            matrice = MatriceUtilisateurItem(contenu['csr'], contenu['user_ids'], contenu['item_ids'])
+            print(f"✅ Matrice utilisateur-item creuse chargée {matrice.shape} "
+                  f"({matrice.csr.nnz:,} notes)")
+            return matrice
+    except (OSError, pickle.UnpicklingError, EOFError, KeyError):
+        pass
+
+    print("🔄 Conversion de la matrice utilisateur-item au format creux...")
+    if export_utilisable(source_file):
+        matrice = MatriceUtilisateurItem.depuis_triplets(*lire_triplets_utilisateur_item(source_file))
+    else:
+        matrice = MatriceUtilisateurItem.depuis_dataframe(pd.read_pickle(source_file))
+    with open(sparse_file, 'wb') as f:
+        pickle.dump({
+            'source_sha256': empreinte,
+            'csr': matrice.csr,
+            'user_ids': matrice.user_ids,
+            'item_ids': matrice.item_ids
+        }, f, protocol=pickle.HIGHEST_PROTOCOL)
+    print(f"✅ Matrice creuse sauvegardée dans {sparse_file} {matrice.shape} "
+          f"({matrice.csr.nnz:,} notes)")
+    return matrice
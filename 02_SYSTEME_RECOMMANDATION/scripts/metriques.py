@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Métriques du service au format Prometheus
+=========================================
+
+Instrumentation légère, sans dépendance :
+- `Chronometre` mesure les étapes d'un calcul (`marquer(etape)` à la fin de
+  chacune : un appel à `time.perf_counter` par étape)
+- `Histogramme` et `Compteur` accumulent les observations sous un verrou
+  (recherche du seau par dichotomie)
+- `RegistreMetriques.exposer()` produit le format texte lu par Prometheus
+  (`/metrics`)
+- `percentiles` résume une série de mesures (p50 / p95 / p99), pour les
+  statistiques JSON du service et les rapports de benchmark
+
+Les valeurs sont propres à chaque processus : sous Gunicorn, chaque worker
+expose les siennes (étiquette `worker` = pid) ; Prometheus les agrège avec
+`sum by (...)`.
+"""
+
+import bisect
+import math
+import os
+import threading
+import time
+
+SEAUX_SECONDES = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SEAUX_TAILLES = (0, 1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000)
+
+
+class Chronometre:
+    """
+    Durées des étapes successives d'un calcul
+    """
+
+    def __init__(self):
+        self.durees = {}
+        self._debut = time.perf_counter()
+
+    def marquer(self, etape):
+        """Termine l'étape en cours : sa durée (depuis la marque précédente) est ajoutée à `etape`"""
+        fin = time.perf_counter()
+        self.durees[etape] = self.durees.get(etape, 0.0) + fin - self._debut
+        self._debut = fin
+
+    def reprendre(self):
+        """Ignore le temps écoulé depuis la dernière marque"""
+        self._debut = time.perf_counter()
+
+
+def percentiles(valeurs, facteur=1.0):
+    """
+    p50 / p95 / p99 d'une série (interpolation linéaire, comme `np.percentile`)
+
+    Args:
+        valeurs (iterable): Mesures
+        facteur (float): Multiplicateur appliqué aux mesures (1000 : secondes -> ms)
+
+    Returns:
+        dict: {'p50', 'p95', 'p99'}, valeurs None si la série est vide
+    """
+    tries = sorted(float(v) * facteur for v in valeurs)
+    if not tries:
+        return {'p50': None, 'p95': None, 'p99': None}
+    resultat = {}
+    for rang in (50, 95, 99):
+        position = (len(tries) - 1) * rang / 100
+        bas = math.floor(position)
+        haut = min(bas + 1, len(tries) - 1)
+        resultat[f'p{rang}'] = tries[bas] + (tries[haut] - tries[bas]) * (position - bas)
+    return resultat
+
+
+def _format_etiquettes(noms, valeurs, supplementaires=()):
+    paires = list(zip(noms, valeurs)) + list(supplementaires)
+    if not paires:
+        return ''
+    echapper = lambda v: str(v).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+    return '{' + ','.join(f'{nom}="{echapper(valeur)}"' for nom, valeur in paires) + '}'
+
+
+def _format_nombre(valeur):
+    if valeur == float('inf'):
+        return '+Inf'
+    return repr(float(valeur)) if isinstance(valeur, float) else str(valeur)
+
+
+class Compteur:
+    """
+    Compteur croissant, avec étiquettes optionnelles
+    """
+
+    type_prometheus = 'counter'
+
+    def __init__(self, nom, aide, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.etiquettes = tuple(etiquettes)
+        self._valeurs = {}
+        self._verrou = threading.Lock()
+
+    def incrementer(self, valeur=1, **etiquettes):
+        cle = tuple(str(etiquettes[e]) for e in self.etiquettes)
+        with self._verrou:
+            self._valeurs[cle] = self._valeurs.get(cle, 0) + valeur
+
+    def lignes(self, communes=()):
+        with self._verrou:
+            valeurs = dict(self._valeurs)
+        for cle, valeur in sorted(valeurs.items()):
+            yield f"{self.nom}{_format_etiquettes(self.etiquettes, cle, communes)} {_format_nombre(valeur)}"
+
+
+class Histogramme:
+    """
+    Histogramme à seaux fixes (cumulés à l'exposition), avec étiquettes optionnelles
+    """
+
+    type_prometheus = 'histogram'
+
+    def __init__(self, nom, aide, seaux=SEAUX_SECONDES, etiquettes=()):
+        self.nom = nom
+        self.aide = aide
+        self.seaux = tuple(sorted(seaux))
+        self.etiquettes = tuple(etiquettes)
+        self._series = {}
+        self._verrou = threading.Lock()
+
+    def observer(self, valeur, **etiquettes):
+        cle = tuple(str(etiquettes[e]) for e in self.etiquettes)
+        position = bisect.bisect_left(self.seaux, valeur)
+        with self._verrou:
+            serie = self._series.get(cle)
+            if serie is None:
+                serie = self._series[cle] = [[0] * (len(self.seaux) + 1), 0.0, 0]
+            serie[0][position] += 1
+            serie[1] += valeur
+            serie[2] += 1
+
+    def lignes(self, communes=()):
+        with self._verrou:
+            series = {cle: (list(c), s, n) for cle, (c, s, n) in self._series.items()}
+        for cle, (comptes, somme, nombre) in sorted(series.items()):
+            cumul = 0
+            for borne, compte in zip(self.seaux + (float('inf'),), comptes):
+                cumul += compte
+                etiquettes = _format_etiquettes(self.etiquettes, cle, [*communes, ('le', _format_nombre(borne))])
+                yield f"{self.nom}_bucket{etiquettes} {cumul}"
+            etiquettes = _format_etiquettes(self.etiquettes, cle, communes)
+            yield f"{self.nom}_sum{etiquettes} {_format_nombre(somme)}"
+            yield f"{self.nom}_count{etiquettes} {nombre}"
+
+
+class RegistreMetriques:
+    """
+    Ensemble des métriques exposées par un processus
+    """
+
+    def __init__(self):
+        self._metriques = []
+
+    def compteur(self, nom, aide, etiquettes=()):
+        metrique = Compteur(nom, aide, etiquettes)
+        self._metriques.append(metrique)
+        return metrique
+
+    def histogramme(self, nom, aide, seaux=SEAUX_SECONDES, etiquettes=()):
+        metrique = Histogramme(nom, aide, seaux, etiquettes)
+        self._metriques.append(metrique)
+        return metrique
+
+    def exposer(self):
+        """
+        Returns:
+            str: Métriques au format texte Prometheus (version 0.0.4)
+        """
+        communes = (('worker', os.getpid()),)
+        lignes = []
+        for metrique in self._metriques:
+            lignes.append(f"# HELP {metrique.nom} {metrique.aide}")
+            lignes.append(f"# TYPE {metrique.nom} {metrique.type_prometheus}")
+            lignes.extend(metrique.lignes(communes))
+        return '\n'.join(lignes) + '\n'
@@ -0,0 +1,385 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Recommandations item-à-item pré-calculées
+=========================================
+
+Tâche hors-ligne qui calcule, pour chaque id_listing de `df_grouped`, les
+`n_max` meilleures recommandations hybrides (même scoring `alpha`/`beta` que
+`recommander_hybride_par_titre`) et les range dans une table compacte
+`recommandations_precalculees.npz` (format CSR : offsets + tableaux plats).
+
+L'endpoint n'a plus qu'à retrouver le logement de référence et lire sa ligne ;
+le calcul complet n'est relancé que pour d'autres valeurs de alpha/beta.
+
+La table est construite sur la forme de la matrice de similarité servie
+(SIMILARITY_FORMAT / SIMILARITY_TOP_K, comme app.py) ; ses sources gardent
+cette forme, l'empreinte de la matrice creuse et celle du modèle KNN, et le
+service refuse une table qui ne correspond pas à ce qu'il a chargé.
+
+Rafraîchissement incrémental : chaque ligne garde l'empreinte de ses
+candidats collaboratifs (id_listing et notes estimées par les voisins KNN) ;
+seules les lignes dont les candidats ont changé, ou nouvelles, sont
+reclassées. Une nouvelle note d'un voisin, ou un nouveau voisin, modifie
+donc aussi les lignes des logements qui n'ont pas reçu d'avis. Les
+candidats sont relus dans la table des voisins (voisins_precalcules.py)
+si elle est à jour ; sinon, si elle date des mêmes notes que la table
+rafraîchie, elle indique les logements affectés (`logements_affectes`) et
+seuls ceux-ci repassent par le KNN. Sans table des voisins, les candidats
+de tous les logements sont recalculés (un `kneighbors` par lot) : le
+rafraîchissement n'est alors incrémental que pour le classement.
+
+Utilisation :
+    [SIMILARITY_FORMAT=topk] python recommandations_precalculees.py [--complet]
+"""
+
+import hashlib
+import json
+import math
+import os
+
+import numpy as np
+
+from matrice_utilisateur_item import candidats_collaboratifs_lot
+from scoring_hybride import classer_candidats, scores_hybrides
+from stockage_similarite import DEFAULT_TOP_K, SIMILARITY_FILE
+
+PRECALC_FILE = 'recommandations_precalculees.npz'
+DEFAULT_N_MAX = 50
+TAILLE_LOT = 512
+
+# Sources qui doivent être identiques pour réutiliser les lignes d'une table
+SOURCES_LIGNES = ('similarite', 'format_similarite', 'k_similarite', 'knn')
+
+
+class TableRecommandations:
+    """
+    Top-n_max des recommandations de chaque logement de référence
+    """
+
+    def __init__(self, ids_ref, offsets, ids_candidats, sims, notes, signatures,
+                 alpha, beta, n_max, sources):
+        """
+        Args:
+            ids_ref (np.ndarray): id_listing des références (une ligne chacune)
+            offsets (np.ndarray): Début de chaque ligne dans les tableaux plats (n_ref + 1)
+            ids_candidats (np.ndarray): id_listing recommandés
+            sims (np.ndarray): Similarités BERT (float32)
+            notes (np.ndarray): Notes estimées par le KNN (float64)
+            signatures (np.ndarray): Empreinte des candidats de chaque référence
+            alpha (float): Poids de la similarité utilisé pour le classement
+            beta (float): Poids de la note utilisé pour le classement
+            n_max (int): Recommandations conservées par référence
+            sources (dict): Empreintes des artefacts utilisés
+        """
+        self.ids_ref = np.asarray(ids_ref, dtype=np.int64)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.ids_candidats = np.asarray(ids_candidats, dtype=np.int64)
+        self.sims = np.asarray(sims, dtype=np.float32)
+        self.notes = np.asarray(notes, dtype=np.float64)
+        self.signatures = np.asarray(signatures, dtype='U16')
+        self.alpha = float(alpha)
+        self.beta = float(beta)
+        self.n_max = int(n_max)
+        self.sources = dict(sources)
+        self.position = {id_ref: i for i, id_ref in enumerate(self.ids_ref.tolist())}
+
+    def __len__(self):
+        return len(self.ids_ref)
+
+    def __contains__(self, id_listing):
+        return id_listing in self.position
+
+    def couvre(self, alpha, beta, top_n):
+        """Indique si la table peut répondre pour ces poids et ce nombre de résultats"""
+        return (math.isclose(alpha, self.alpha) and math.isclose(beta, self.beta)
+                and top_n <= self.n_max)
+
+    def ligne(self, id_listing):
+        """
+        Args:
+            id_listing (int): Logement de référence
+
+        Returns:
+            tuple: (ids, similarités, notes) de ses recommandations
+        """
+        i = self.position[id_listing]
+        debut, fin = self.offsets[i], self.offsets[i + 1]
+        return self.ids_candidats[debut:fin], self.sims[debut:fin], self.notes[debut:fin]
+
+    def servir(self, id_listing, alpha, beta, top_n):
+        """
+        Recommandations pré-calculées d'un logement, au même format que `classer_candidats`
+
+        Args:
+            id_listing (int): Logement de référence
+            alpha (float): Poids de la similarité
+            beta (float): Poids de la note
+            top_n (int): Nombre de résultats
+
+        Returns:
+            tuple: (ids, scores, similarités, notes), ou None si la table ne couvre pas la demande
+        """
+        if id_listing not in self.position or not self.couvre(alpha, beta, top_n):
+            return None
+        ids, sims, notes = self.ligne(id_listing)
+        ids, sims, notes = ids[:top_n], sims[:top_n], notes[:top_n]
+        return ids, scores_hybrides(sims, notes, alpha, beta), sims, notes
+
+    def sauvegarder(self, chemin=PRECALC_FILE):
+        np.savez(chemin, ids_ref=self.ids_ref, offsets=self.offsets,
+                 ids_candidats=self.ids_candidats, sims=self.sims, notes=self.notes,
+                 signatures=self.signatures,
+                 parametres=np.asarray(json.dumps({
+                     'alpha': self.alpha, 'beta': self.beta,
+                     'n_max': self.n_max, 'sources': self.sources
+                 })))
+
+    @classmethod
+    def charger(cls, chemin=PRECALC_FILE):
+        with np.load(chemin) as f:
+            parametres = json.loads(str(f['parametres']))
+            return cls(f['ids_ref'], f['offsets'], f['ids_candidats'], f['sims'], f['notes'],
+                       f['signatures'], parametres['alpha'], parametres['beta'],
+                       parametres['n_max'], parametres['sources'])
+
+
+def empreinte_knn(knn_model):
+    """Empreinte des paramètres du modèle KNN (métrique effective comprise)"""
+    parametres = {'parametres': knn_model.get_params(),
+                  'metrique': str(getattr(knn_model, 'effective_metric_', knn_model.metric)),
+                  'parametres_metrique': getattr(knn_model, 'effective_metric_params_', None) or {}}
+    return hashlib.blake2b(json.dumps(parametres, sort_keys=True, default=str).encode(),
+                           digest_size=8).hexdigest()
+
+
+def sources_table(user_item_matrix, knn_model, similarity_file=SIMILARITY_FILE, format_stockage='dense',
+                  k=DEFAULT_TOP_K):
+    """
+    Empreintes des artefacts dont dépend la table
+
+    Args:
+        user_item_matrix (MatriceUtilisateurItem): Matrice creuse
+        knn_model (NearestNeighbors): KNN ajusté sur la matrice creuse
+        similarity_file (str): Matrice de similarité dense de référence
+        format_stockage (str): Forme de la matrice servie ('dense', 'float16' ou 'topk')
+        k (int): Nombre de voisins de la forme 'topk'
+
+    Returns:
+        dict: Empreintes et forme de la similarité
+    """
+    from embeddings_titres import empreinte_fichier
+
+    return {
+        'user_item': user_item_matrix.empreinte(),
+        'knn': empreinte_knn(knn_model),
+        'similarite': empreinte_fichier(similarity_file) if os.path.exists(similarity_file) else None,
+        'format_similarite': format_stockage,
+        'k_similarite': int(k) if format_stockage == 'topk' else None
+    }
+
+
+def signature_candidats(ids_candidats, notes):
+    """Empreinte des candidats collaboratifs d'une référence (id_listing et notes estimées)"""
+    return hashlib.blake2b(np.asarray(ids_candidats, dtype=np.int64).tobytes()
+                           + np.asarray(notes, dtype=np.float64).tobytes(), digest_size=8).hexdigest()
+
+
+def _calculer_candidats(ids_listing, user_item_matrix, knn_model, table_voisins=None, taille_lot=TAILLE_LOT):
+    """
+    Candidats collaboratifs de chaque logement : {id_listing: (ids, notes)}
+
+    Depuis la table des voisins si possible, sinon un `kneighbors` par lot ;
+    les logements sans note n'ont pas de candidats (pas de ligne, l'endpoint
+    renverra l'erreur habituelle).
+    """
+    candidats, sans_table = {}, []
+    for id_listing in ids_listing:
+        if table_voisins is not None and id_listing in table_voisins:
+            candidats[id_listing] = table_voisins.candidats(id_listing)
+        elif user_item_matrix.contient_item(id_listing):
+            sans_table.append(id_listing)
+    for debut in range(0, len(sans_table), taille_lot):
+        lot = sans_table[debut:debut + taille_lot]
+        for id_listing, candidats_lot in zip(lot, candidats_collaboratifs_lot(
+                user_item_matrix, knn_model, [[i] for i in lot])):
+            if candidats_lot is not None:
+                candidats[id_listing] = candidats_lot
+    return candidats
+
+
+def _calculer_lignes(candidats, similarity_matrix, table_index, alpha, beta, n_max):
+    """Classe les candidats de chaque logement : {id_listing: (ids, sims, notes)}"""
+    lignes = {}
+    for id_listing, (ids_candidats, notes) in candidats.items():
+        ids, _, sims, notes = classer_candidats(similarity_matrix, table_index, [id_listing],
+                                                ids_candidats, notes, alpha, beta, n_max)
+        lignes[id_listing] = (ids, sims, notes)
+    return lignes
+
+
+def _assembler(lignes, signatures, alpha, beta, n_max, sources):
+    """Range les lignes calculées dans une TableRecommandations"""
+    ids_ref = sorted(lignes)
+    longueurs = [len(lignes[i][0]) for i in ids_ref]
+    offsets = np.concatenate([[0], np.cumsum(longueurs)]).astype(np.int64)
+
+    def _plat(k, dtype):
+        morceaux = [lignes[i][k] for i in ids_ref]
+        return np.concatenate(morceaux).astype(dtype) if morceaux else np.empty(0, dtype=dtype)
+
+    return TableRecommandations(
+        ids_ref, offsets, _plat(0, np.int64), _plat(1, np.float32), _plat(2, np.float64),
+        [signatures.get(i, '') for i in ids_ref], alpha, beta, n_max, sources
+    )
+
+
+def precalculer_recommandations(ids_listing, user_item_matrix, knn_model, similarity_matrix,
+                                table_index, alpha=0.5, beta=0.5, n_max=DEFAULT_N_MAX,
+                                sources=None, table_existante=None, table_voisins=None, affectes=None):
+    """
+    Construit (ou rafraîchit) la table des recommandations pré-calculées
+
+    Avec `table_existante` de mêmes paramètres, même matrice de similarité
+    (fichier et forme) et même KNN, seuls les logements dont les candidats
+    collaboratifs ont changé, ou absents de la table, sont reclassés. Avec
+    `affectes` en plus, les candidats des autres logements de la table ne
+    sont pas recalculés : leur ligne est gardée telle quelle.
+
+    Args:
+        ids_listing (list): Logements de référence (id_listing de df_grouped)
+        user_item_matrix (MatriceUtilisateurItem): Matrice creuse
+        knn_model (NearestNeighbors): KNN ajusté sur la matrice creuse
+        similarity_matrix: Matrice de similarité BERT
+        table_index (tuple): Résultat de `construire_table_index`
+        alpha (float): Poids de la similarité
+        beta (float): Poids de la note
+        n_max (int): Recommandations conservées par référence
+        sources (dict): Empreintes des artefacts utilisés (`sources_table`)
+        table_existante (TableRecommandations): Table à rafraîchir
+        table_voisins (TableVoisins): Candidats pré-calculés (voisins_precalcules.py),
+            à jour pour `user_item_matrix` ; évite le KNN
+        affectes (set): Logements dont les candidats peuvent avoir changé depuis
+            `table_existante` (`voisins_precalcules.logements_affectes`)
+
+    Returns:
+        tuple: (TableRecommandations, nombre de logements reclassés)
+    """
+    sources = sources or {}
+    ids_listing = [int(i) for i in dict.fromkeys(ids_listing)]
+    reutilisable = (table_existante is not None
+                    and table_existante.couvre(alpha, beta, n_max) and table_existante.n_max == n_max
+                    and all(table_existante.sources.get(k) == sources.get(k) for k in SOURCES_LIGNES))
+    a_verifier = ids_listing
+    if reutilisable and affectes is not None:
+        a_verifier = [i for i in ids_listing if i in affectes or i not in table_existante]
+    candidats = _calculer_candidats(a_verifier, user_item_matrix, knn_model, table_voisins)
+    signatures = {i: signature_candidats(*c) for i, c in candidats.items()}
+
+    lignes_gardees = {}
+    a_calculer = candidats
+    if reutilisable:
+        anciennes = dict(zip(table_existante.ids_ref.tolist(), table_existante.signatures.tolist()))
+        a_calculer = {i: c for i, c in candidats.items() if anciennes.get(i) != signatures[i]}
+        # Lignes aux candidats inchangés, ou non vérifiés car hors des logements affectés
+        verifies = set(a_verifier)
+        gardes = [i for i in ids_listing if i in table_existante and i not in a_calculer
+                  and (i in candidats or i not in verifies)]
+        lignes_gardees = {i: table_existante.ligne(i) for i in gardes}
+        signatures.update({i: anciennes[i] for i in gardes})
+
+    lignes = _calculer_lignes(a_calculer, similarity_matrix, table_index, alpha, beta, n_max)
+    lignes.update(lignes_gardees)
+    return _assembler(lignes, signatures, alpha, beta, n_max, sources), len(a_calculer)
+
+
+def charger_table_recommandations(user_item_matrix, knn_model, similarity_file=SIMILARITY_FILE,
+                                  format_stockage='dense', k=DEFAULT_TOP_K, chemin=PRECALC_FILE):
+    """
+    Charge la table pré-calculée si elle correspond aux artefacts en service
+
+    Args:
+        user_item_matrix (MatriceUtilisateurItem): Matrice creuse chargée
+        knn_model (NearestNeighbors): KNN en service
+        similarity_file (str): Matrice de similarité dense de référence
+        format_stockage (str): Forme de la matrice servie (SIMILARITY_FORMAT)
+        k (int): Nombre de voisins de la forme 'topk'
+        chemin (str): Fichier de la table
+
+    Returns:
+        TableRecommandations: Table, ou None si absente ou périmée
+    """
+    if not os.path.exists(chemin):
+        return None
+    table = TableRecommandations.charger(chemin)
+    attendues = sources_table(user_item_matrix, knn_model, similarity_file, format_stockage, k)
+    forme = (table.sources.get('format_similarite'), table.sources.get('k_similarite'))
+    if forme != (attendues['format_similarite'], attendues['k_similarite']):
+        print(f"⚠️ {chemin} construite pour la similarité {forme[0]} (K={forme[1]}), servie en "
+              f"{format_stockage} : calcul en direct")
+        return None
+    if table.sources != attendues:
+        print(f"⚠️ {chemin} ne correspond plus aux artefacts chargés : calcul en direct")
+        return None
+    print(f"✅ Recommandations pré-calculées chargées ({len(table)} logements, "
+          f"alpha={table.alpha}, beta={table.beta}, n_max={table.n_max})")
+    return table
+
+
+def main():
+    """Construit ou rafraîchit la table des recommandations pré-calculées"""
+    import pickle
+    import sys
+    import time
+
+    import pandas as pd
+
+    from matrice_utilisateur_item import ajuster_knn_creux, charger_matrice_utilisateur_item
+    from scoring_hybride import construire_table_index
+    from stockage_similarite import charger_matrice_similarite
+    from voisins_precalcules import (DEFAULT_N_VOISINS, VOISINS_FILE, TableVoisins, charger_table_voisins,
+                                     logements_affectes)
+    from voisins_precalcules import sources_table as sources_voisins
+
+    complet = '--complet' in sys.argv
+    format_stockage = os.environ.get('SIMILARITY_FORMAT', 'dense')
+    k = int(os.environ.get('SIMILARITY_TOP_K', DEFAULT_TOP_K))
+
+    with open('knn_model.pkl', 'rb') as f:
+        knn_model = pickle.load(f)
+    with open('id_to_index.pkl', 'rb') as f:
+        table_index = construire_table_index(pickle.load(f))
+    user_item_matrix = charger_matrice_utilisateur_item('user_item_matrix.pkl')
+    knn_model = ajuster_knn_creux(user_item_matrix, knn_model)
+    similarity_matrix = charger_matrice_similarite(SIMILARITY_FILE, format_stockage, k)
+    ids_listing = pd.read_pickle('df_grouped.pkl')['id_listing'].unique().tolist()
+
+    table_existante = None
+    if not complet and os.path.exists(PRECALC_FILE):
+        table_existante = TableRecommandations.charger(PRECALC_FILE)
+
+    debut = time.perf_counter()
+    table_voisins = charger_table_voisins(user_item_matrix, knn_model)
+    affectes = None
+    if table_existante is not None and table_voisins is None and os.path.exists(VOISINS_FILE):
+        # Table des voisins périmée mais calculée sur les mêmes notes que la table
+        # à rafraîchir : elle indique les seuls logements à repasser par le KNN
+        ancienne = TableVoisins.charger(VOISINS_FILE)
+        attendues = sources_voisins(user_item_matrix, knn_model)
+        if (ancienne.sources.get('user_item') == table_existante.sources.get('user_item')
+                and ancienne.n_voisins == DEFAULT_N_VOISINS
+                and all(ancienne.sources.get(c) == v for c, v in attendues.items() if c != 'user_item')):
+            affectes = logements_affectes(ancienne, user_item_matrix, knn_model, ids_listing)
+            print(f"🔄 {len(affectes)}/{len(ids_listing)} logements affectés depuis {VOISINS_FILE}")
+    table, n_calcules = precalculer_recommandations(
+        ids_listing, user_item_matrix, knn_model, similarity_matrix, table_index,
+        sources=sources_table(user_item_matrix, knn_model, SIMILARITY_FILE, format_stockage, k),
+        table_existante=table_existante, table_voisins=table_voisins, affectes=affectes
+    )
+    table.sauvegarder(PRECALC_FILE)
+    print(f"✅ {n_calcules}/{len(ids_listing)} logements reclassés en "
+          f"{time.perf_counter() - debut:.1f}s -> {PRECALC_FILE} ({len(table)} lignes)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,223 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Registre des artefacts du service de recommandation
+===================================================
+
+Chargement des modèles et fichiers au démarrage :
+- les artefacts indépendants sont chargés en parallèle dans un pool de threads
+  (la désérialisation pickle/NumPy et l'E/S libèrent en grande partie le GIL)
+- un artefact n'est lancé qu'une fois ses dépendances chargées
+- un même fichier déclaré sous deux noms n'est lu qu'une seule fois
+- les artefacts optionnels ne sont chargés qu'à leur première utilisation
+- la durée de chargement de chaque artefact est affichée
+
+Un chargeur ne doit appeler `obtenir` que sur des artefacts optionnels
+(chargés sur place) ou sans dépendances déclarés avant lui (déjà soumis au
+pool) : les autres dépendances se déclarent avec `depend_de`, ce qui évite
+de bloquer tous les threads du pool en attente.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import Future, ThreadPoolExecutor
+
+
+class RegistreArtefacts:
+    """
+    Chargement concurrent, dédupliqué et paresseux d'artefacts nommés
+    """
+
+    def __init__(self, max_workers=4):
+        """
+        Args:
+            max_workers (int): Nombre de threads de chargement
+        """
+        self._declarations = {}
+        self._alias = {}
+        self._fichiers = {}
+        self._futures = {}
+        self.durees = {}
+        self._verrou = threading.RLock()
+        self._pool = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='artefacts')
+        self._debut = None
+
+    def declarer(self, nom, chargeur, depend_de=(), optionnel=False):
+        """
+        Déclare un artefact
+
+        Args:
+            nom (str): Nom de l'artefact
+            chargeur (callable): Fonction appelée avec les valeurs des dépendances
+            depend_de (tuple): Noms des artefacts requis par le chargeur
+            optionnel (bool): Chargé seulement à la première utilisation
+        """
+        self._declarations[nom] = (chargeur, tuple(depend_de), optionnel)
+
+    def declarer_fichier(self, nom, chemin, lecteur, optionnel=False):
+        """
+        Déclare un artefact lu depuis un fichier ; un fichier déjà déclaré
+        avec le même lecteur devient un alias (désérialisé une seule fois)
+
+        Args:
+            nom (str): Nom de l'artefact
+            chemin (str): Fichier à lire
+            lecteur (callable): Fonction de lecture, ex. `pd.read_pickle`
+            optionnel (bool): Chargé seulement à la première utilisation
+        """
+        cle = (os.path.realpath(chemin), lecteur)
+        if cle in self._fichiers:
+            cible = self._fichiers[cle]
+            self._alias[nom] = cible
+            if not optionnel:
+                chargeur, depend_de, _ = self._declarations[cible]
+                self._declarations[cible] = (chargeur, depend_de, False)
+            return
+        self._fichiers[cle] = nom
+        self.declarer(nom, lambda: lecteur(chemin), optionnel=optionnel)
+
+    def _nom(self, nom):
+        return self._alias.get(nom, nom)
+
+    def _executer(self, nom, future, valeurs):
+        """Appelle le chargeur et publie le résultat (ou l'erreur) dans le future"""
+        chargeur = self._declarations[nom][0]
+        debut = time.perf_counter()
+        try:
+            valeur = chargeur(*valeurs)
+        except BaseException as e:
+            print(f"❌ Échec du chargement de '{nom}' : {e}")
+            future.set_exception(e)
+            return
+        self.durees[nom] = time.perf_counter() - debut
+        print(f"⏱️ Artefact '{nom}' chargé en {self.durees[nom]:.2f}s")
+        future.set_result(valeur)
+
+    def _planifier(self, nom):
+        """Crée le future de l'artefact et le soumet au pool dès que ses dépendances sont prêtes"""
+        with self._verrou:
+            if nom in self._futures:
+                return self._futures[nom]
+            future = Future()
+            self._futures[nom] = future
+
+        depend_de = self._declarations[nom][1]
+        futures_deps = [self._planifier(self._nom(d)) for d in depend_de]
+        restantes = [len(futures_deps)]
+
+        def _lancer():
+            erreurs = [f.exception() for f in futures_deps if f.exception() is not None]
+            if erreurs:
+                future.set_exception(erreurs[0])
+            else:
+                self._pool.submit(self._executer, nom, future, [f.result() for f in futures_deps])
+
+        def _dependance_prete(_):
+            with self._verrou:
+                restantes[0] -= 1
+                derniere = restantes[0] == 0
+            if derniere:
+                _lancer()
+
+        if not futures_deps:
+            _lancer()
+        for f in futures_deps:
+            f.add_done_callback(_dependance_prete)
+        return future
+
+    def _charger_sur_place(self, nom):
+        """Charge un artefact optionnel dans le thread appelant"""
+        with self._verrou:
+            if nom in self._futures:
+                return self._futures[nom]
+            future = Future()
+            self._futures[nom] = future
+        try:
+            valeurs = [self.obtenir(d) for d in self._declarations[nom][1]]
+        except BaseException as e:
+            future.set_exception(e)
+            return future
+        self._executer(nom, future, valeurs)
+        return future
+
+    def demarrer(self):
+        """Lance le chargement de tous les artefacts obligatoires (non bloquant)"""
+        self._debut = time.perf_counter()
+        for nom, (_, _, optionnel) in list(self._declarations.items()):
+            if not optionnel:
+                self._planifier(nom)
+        return self
+
+    def obtenir(self, nom, timeout=None):
+        """
+        Renvoie la valeur d'un artefact, en attendant la fin de son chargement
+
+        Args:
+            nom (str): Nom de l'artefact
+            timeout (float): Attente maximale en secondes
+
+        Returns:
+            Valeur de l'artefact
+        """
+        nom = self._nom(nom)
+        with self._verrou:
+            future = self._futures.get(nom)
+        if future is None:
+            if self._declarations[nom][2]:
+                future = self._charger_sur_place(nom)
+            else:
+                future = self._planifier(nom)
+        return future.result(timeout)
+
+    def __getitem__(self, nom):
+        return self.obtenir(nom)
+
+    def _obligatoires(self):
+        return [nom for nom, (_, _, optionnel) in self._declarations.items()
+                if not optionnel and nom not in self._alias]
+
+    def attendre(self, timeout=None):
+        """
+        Attend la fin du chargement des artefacts obligatoires
+
+        Returns:
+            RegistreArtefacts: self
+        """
+        for nom in self._obligatoires():
+            self.obtenir(nom, timeout)
+        if self._debut is not None:
+            print(f"✅ Artefacts chargés en {time.perf_counter() - self._debut:.2f}s")
+        return self
+
+    def fermer(self):
+        """Arrête les threads de chargement (après `attendre`, par exemple avant un fork)"""
+        self._pool.shutdown(wait=True)
+
+    def pret(self):
+        """Indique si tous les artefacts obligatoires sont chargés sans erreur"""
+        with self._verrou:
+            futures = [self._futures.get(nom) for nom in self._obligatoires()]
+        return all(f is not None and f.done() and f.exception() is None for f in futures)
+
+    def etat(self):
+        """
+        Returns:
+            dict: Pour chaque artefact, état ('en_attente', 'charge', 'erreur',
+                'differe') et durée de chargement
+        """
+        etats = {}
+        with self._verrou:
+            futures = dict(self._futures)
+        for nom, (_, _, optionnel) in self._declarations.items():
+            future = futures.get(nom)
+            if future is None:
+                statut = 'differe' if optionnel else 'en_attente'
+            elif not future.done():
+                statut = 'en_attente'
+            elif future.exception() is not None:
+                statut = 'erreur'
+            else:
+                statut = 'charge'
+            etats[nom] = {'statut': statut, 'duree_s': self.durees.get(nom)}
+        return etats
@@ -0,0 +1,183 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Scoring vectorisé des candidats du recommandeur hybride
+=======================================================
+
+Toutes les opérations portent sur des tableaux NumPy : conversion des
+id_listing en indices de la matrice de similarité, lecture groupée des
+similarités BERT, score `alpha * sim + beta * note / 5` et sélection du
+top-n par `np.argpartition`.
+
+Les vecteurs (candidats, similarités, notes) ne dépendent pas des poids :
+`vecteurs_candidats` les calcule une fois, `classer_vecteurs` les re-pondère.
+"""
+
+import numpy as np
+
+
+def construire_table_index(id_to_index):
+    """
+    Transforme le dictionnaire id_listing -> indice en deux tableaux triés
+
+    Args:
+        id_to_index (dict): Correspondance id_listing -> ligne de la matrice BERT
+
+    Returns:
+        tuple: (ids triés, indices correspondants) en int64
+    """
+    ids = np.fromiter(id_to_index.keys(), dtype=np.int64, count=len(id_to_index))
+    indices = np.fromiter(id_to_index.values(), dtype=np.int64, count=len(id_to_index))
+    ordre = np.argsort(ids, kind='stable')
+    return ids[ordre], indices[ordre]
+
+
+def mapper_ids(table_index, ids):
+    """
+    Convertit des id_listing en indices de matrice en une seule opération
+
+    Args:
+        table_index (tuple): Résultat de `construire_table_index`
+        ids (array-like): id_listing à convertir
+
+    Returns:
+        np.ndarray: Indices (int64), -1 pour les id absents
+    """
+    ids_tries, indices_tries = table_index
+    ids = np.asarray(ids, dtype=np.int64)
+    if len(ids_tries) == 0:
+        return np.full(ids.shape, -1, dtype=np.int64)
+    positions = np.minimum(np.searchsorted(ids_tries, ids), len(ids_tries) - 1)
+    return np.where(ids_tries[positions] == ids, indices_tries[positions], -1)
+
+
+def similarites_candidats(similarity_matrix, idx_refs, idx_cands):
+    """
+    Lit les similarités BERT entre les références et tous les candidats
+
+    Avec plusieurs références, chaque candidat garde sa plus forte similarité.
+
+    Args:
+        similarity_matrix: Matrice indexable par `[i, tableau_j]`
+        idx_refs (list): Indices des logements de référence
+        idx_cands (np.ndarray): Indices des candidats
+
+    Returns:
+        np.ndarray: Similarités (float32) par candidat
+    """
+    idx_cands = np.asarray(idx_cands, dtype=np.int64)
+    if len(idx_cands) == 0 or not len(idx_refs):
+        return np.zeros(len(idx_cands), dtype=np.float32)
+    sims = np.asarray(similarity_matrix[int(idx_refs[0]), idx_cands], dtype=np.float32)
+    for idx_ref in idx_refs[1:]:
+        sims = np.maximum(sims, np.asarray(similarity_matrix[int(idx_ref), idx_cands], dtype=np.float32))
+    return sims
+
+
+def scores_hybrides(sims, notes, alpha=0.5, beta=0.5):
+    """
+    Score final `alpha * similarité + beta * note / 5`
+
+    Args:
+        sims (np.ndarray): Similarités BERT
+        notes (np.ndarray): Notes estimées par le KNN (sur 5)
+        alpha (float): Poids de la similarité de contenu
+        beta (float): Poids de la note collaborative
+
+    Returns:
+        np.ndarray: Scores (float64)
+    """
+    return alpha * np.asarray(sims, dtype=np.float64) + beta * (np.asarray(notes, dtype=np.float64) / 5.0)
+
+
+def top_n_indices(scores, top_n):
+    """
+    Positions des top_n meilleurs scores, sans trier tout le tableau
+
+    À score égal, l'ordre d'origine est conservé.
+
+    Args:
+        scores (np.ndarray): Scores des candidats
+        top_n (int): Nombre de positions à retourner
+
+    Returns:
+        np.ndarray: Positions triées par score décroissant
+    """
+    scores = np.asarray(scores)
+    n = min(int(top_n), len(scores))
+    if n <= 0:
+        return np.empty(0, dtype=np.int64)
+    positions = np.argpartition(-scores, n - 1)[:n] if n < len(scores) else np.arange(len(scores))
+    return positions[np.lexsort((positions, -scores[positions]))]
+
+
+def vecteurs_candidats(similarity_matrix, table_index, ids_listing_ref, ids_candidats, notes):
+    """
+    Vecteurs intermédiaires du score hybride, indépendants de alpha et beta
+
+    Les candidats absents de la matrice de similarité sont écartés. Le
+    résultat peut être gardé en cache par jeu de références : changer les
+    poids ne demande plus que `classer_vecteurs`.
+
+    Args:
+        similarity_matrix: Matrice indexable par `[i, tableau_j]`
+        table_index (tuple): Résultat de `construire_table_index`
+        ids_listing_ref (list): id_listing des logements de référence
+        ids_candidats (np.ndarray): id_listing des candidats
+        notes (np.ndarray): Notes estimées des candidats
+
+    Returns:
+        tuple: (ids, similarités BERT, notes estimées) des candidats retenus
+    """
+    ids_candidats = np.asarray(ids_candidats, dtype=np.int64)
+    notes = np.asarray(notes, dtype=np.float64)
+    idx_candidats = mapper_ids(table_index, ids_candidats)
+    idx_refs = [int(i) for i in mapper_ids(table_index, ids_listing_ref) if i >= 0]
+
+    valides = idx_candidats >= 0 if idx_refs else np.zeros(len(idx_candidats), dtype=bool)
+    sims = similarites_candidats(similarity_matrix, idx_refs, idx_candidats[valides])
+    return ids_candidats[valides], sims, notes[valides]
+
+
+def classer_vecteurs(ids, sims, notes, alpha=0.5, beta=0.5, top_n=5):
+    """
+    Score hybride et top_n à partir des vecteurs de `vecteurs_candidats`
+
+    Args:
+        ids (np.ndarray): id_listing des candidats
+        sims (np.ndarray): Similarités BERT
+        notes (np.ndarray): Notes estimées
+        alpha (float): Poids de la similarité de contenu
+        beta (float): Poids de la note collaborative
+        top_n (int): Nombre de candidats retenus
+
+    Returns:
+        tuple: (ids, scores, similarités, notes) des top_n, triés par score décroissant
+    """
+    scores = scores_hybrides(sims, notes, alpha, beta)
+    top = top_n_indices(scores, top_n)
+    return ids[top], scores[top], sims[top], notes[top]
+
+
+def classer_candidats(similarity_matrix, table_index, ids_listing_ref, ids_candidats, notes,
+                      alpha=0.5, beta=0.5, top_n=5):
+    """
+    Score hybride de tous les candidats et sélection des top_n
+
+    Les candidats absents de la matrice de similarité sont écartés.
+
+    Args:
+        similarity_matrix: Matrice indexable par `[i, tableau_j]`
+        table_index (tuple): Résultat de `construire_table_index`
+        ids_listing_ref (list): id_listing des logements de référence
+        ids_candidats (np.ndarray): id_listing des candidats
+        notes (np.ndarray): Notes estimées des candidats
+        alpha (float): Poids de la similarité de contenu
+        beta (float): Poids de la note collaborative
+        top_n (int): Nombre de candidats retenus
+
+    Returns:
+        tuple: (ids, scores, similarités, notes) des top_n, triés par score décroissant
+    """
+    vecteurs = vecteurs_candidats(similarity_matrix, table_index, ids_listing_ref, ids_candidats, notes)
+    return classer_vecteurs(*vecteurs, alpha, beta, top_n)
@@ -0,0 +1,163 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Serveur de production du système de recommandation
+===================================================
+
+Lance `app.py` sous Gunicorn avec plusieurs workers pré-forkés, à la place du
+serveur de développement Flask (`app.run(debug=True)`, un seul processus).
+
+- les artefacts sont chargés une seule fois dans le processus maître, avant le
+  fork : les workers partagent leurs pages en copie sur écriture (la matrice de
+  similarité et les exports Arrow sont en plus mappés en mémoire) ; `gc.freeze()`
+  évite que le ramasse-miettes ne recopie ces pages dans chaque worker
+- rechargement sans coupure : `kill -HUP <pid du maître>` (ou `--recharger`)
+  relit les artefacts dans le maître, démarre de nouveaux workers puis arrête
+  les anciens une fois leurs requêtes terminées ; en cas d'échec du
+  rechargement, les artefacts précédents restent servis
+
+Gunicorn ne fonctionne que sous Linux/macOS.
+
+À lancer depuis le dossier des artefacts :
+    python serveur_production.py [--workers 4] [--threads 1] [--bind 0.0.0.0:5000]
+    python serveur_production.py --recharger
+"""
+
+import argparse
+import gc
+import importlib.util
+import multiprocessing
+import os
+import signal
+import sys
+
+DOSSIER_SCRIPTS = os.path.dirname(os.path.abspath(__file__))
+PID_FILE = 'recommandation.pid'
+
+try:
+    from gunicorn.app.base import BaseApplication
+    GUNICORN_AVAILABLE = True
+except ImportError:
+    BaseApplication = object
+    GUNICORN_AVAILABLE = False
+
+
+def _charger_module_app():
+    """Exécute app.py dans un nouveau module (l'ancien reste intact si le chargement échoue)"""
+    if DOSSIER_SCRIPTS not in sys.path:
+        sys.path.insert(0, DOSSIER_SCRIPTS)
+    spec = importlib.util.spec_from_file_location('app', os.path.join(DOSSIER_SCRIPTS, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    module.precharger_artefacts()
+    sys.modules['app'] = module
+    return module
+
+
+def _post_fork(server, worker):
+    """Un thread PyTorch par worker : le parallélisme vient du nombre de workers"""
+    torch = sys.modules.get('torch')
+    if torch is not None:
+        torch.set_num_threads(int(os.environ.get('RECO_TORCH_THREADS', 1)))
+
+
+class ServeurRecommandation(BaseApplication):
+    """
+    Application Gunicorn qui précharge app.py dans le maître
+    """
+
+    def __init__(self, options):
+        """
+        Args:
+            options (dict): Paramètres Gunicorn (workers, threads, bind, ...)
+        """
+        self.options = options
+        self.module = None
+        super().__init__()
+
+    def load_config(self):
+        for cle, valeur in self.options.items():
+            self.cfg.set(cle, valeur)
+        self.cfg.set('preload_app', True)
+        self.cfg.set('post_fork', _post_fork)
+
+    def load(self):
+        ancien = self.module
+        if ancien is not None:
+            print("🔄 Rechargement des artefacts...")
+            gc.unfreeze()
+        try:
+            self.module = _charger_module_app()
+        except Exception as e:
+            if ancien is None:
+                raise
+            print(f"❌ Rechargement impossible ({e}) : les artefacts précédents restent servis")
+            self.module = ancien
+        # Objets chargés hors du suivi du ramasse-miettes : pas de copie des pages après le fork
+        gc.freeze()
+        return self.module.app
+
+    def reload(self):
+        super().reload()
+        # Relance `load` au prochain `wsgi()` : les nouveaux workers servent les nouveaux artefacts
+        self.callable = None
+
+
+def options_depuis_arguments(argv=None):
+    """
+    Lit les options en ligne de commande (valeurs par défaut depuis l'environnement)
+
+    Returns:
+        argparse.Namespace: Options
+    """
+    parser = argparse.ArgumentParser(description="Serveur de production du recommandeur")
+    parser.add_argument('--workers', type=int,
+                        default=int(os.environ.get('RECO_WORKERS', multiprocessing.cpu_count())),
+                        help="Nombre de workers pré-forkés (défaut : nombre de cœurs)")
+    parser.add_argument('--threads', type=int, default=int(os.environ.get('RECO_THREADS', 1)),
+                        help="Threads par worker (> 1 : workers gthread)")
+    parser.add_argument('--bind', default=os.environ.get('RECO_BIND', '0.0.0.0:5000'))
+    parser.add_argument('--timeout', type=int, default=int(os.environ.get('RECO_TIMEOUT', 60)),
+                        help="Durée maximale d'une requête en secondes")
+    parser.add_argument('--pid', default=os.environ.get('RECO_PID_FILE', PID_FILE),
+                        help="Fichier contenant le pid du maître")
+    parser.add_argument('--recharger', action='store_true',
+                        help="Demande au serveur en cours de recharger ses artefacts")
+    return parser.parse_args(argv)
+
+
+def recharger(pid_file=PID_FILE):
+    """Envoie SIGHUP au maître Gunicorn : rechargement sans coupure"""
+    with open(pid_file) as f:
+        pid = int(f.read().strip())
+    os.kill(pid, signal.SIGHUP)
+    print(f"✅ Rechargement demandé au serveur (pid {pid})")
+
+
+def main(argv=None):
+    """Lance le serveur de production, ou demande un rechargement avec --recharger"""
+    args = options_depuis_arguments(argv)
+    if args.recharger:
+        recharger(args.pid)
+        return
+
+    if not GUNICORN_AVAILABLE:
+        raise ImportError("gunicorn n'est pas installé : pip install gunicorn (Linux/macOS)")
+
+    print(f"🚀 Serveur de recommandation : {args.workers} worker(s) x {args.threads} thread(s) "
+          f"sur {args.bind}")
+    # Lu par app.py : attente des micro-lots d'encodage seulement si plusieurs threads
+    os.environ['RECO_THREADS'] = str(args.threads)
+    ServeurRecommandation({
+        'bind': args.bind,
+        'workers': args.workers,
+        'threads': args.threads,
+        'worker_class': 'gthread' if args.threads > 1 else 'sync',
+        'timeout': args.timeout,
+        'graceful_timeout': args.timeout,
+        'pidfile': args.pid,
+    }).run()
+
+
+if __name__ == "__main__":
+    main()
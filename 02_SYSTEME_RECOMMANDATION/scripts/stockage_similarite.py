@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Stockage de la matrice de similarité BERT
+=========================================
+
+La matrice dense `similarity_matrix_bert.npy` (float32, ~280MB) est ouverte en
+mémoire mappée (`mmap_mode='r'`) : les pages sont partagées entre les workers
+via le cache du système au lieu d'être copiées dans chaque processus.
+
+Deux formes compressées optionnelles :
+- `float16` : même matrice, deux fois plus petite
+- `topk`    : matrice creuse CSR ne gardant que les K voisins les plus
+              similaires de chaque logement (les autres valent 0)
+
+Toutes les formes s'indexent de la même façon (`matrice[i, j]`,
+`matrice[i, tableau_j]`), le recommandeur les utilise donc sans changement.
+
+Construction des formes compressées et rapport mémoire / dérive :
+    python stockage_similarite.py [similarity_matrix_bert.npy] [K]
+"""
+
+import os
+
+import numpy as np
+
+SIMILARITY_FILE = 'similarity_matrix_bert.npy'
+SIMILARITY_FORMATS = ('dense', 'float16', 'topk')
+DEFAULT_TOP_K = 50
+
+
+def chemin_float16(chemin_dense):
+    """Fichier de la version float16 associée à la matrice dense"""
+    return os.path.splitext(chemin_dense)[0] + '_f16.npy'
+
+
+def chemin_topk(chemin_dense, k):
+    """Fichier de la version creuse top-K associée à la matrice dense"""
+    return os.path.splitext(chemin_dense)[0] + f'_top{k}.npz'
+
+
+class MatriceSimilariteTopK:
+    """
+    Matrice de similarité creuse au format CSR (K voisins par ligne)
+
+    Les colonnes de chaque ligne sont triées, ce qui permet de lire une
+    valeur par recherche dichotomique. Les cases absentes valent 0.
+    """
+
+    def __init__(self, data, indices, indptr, shape):
+        self.data = data
+        self.indices = indices
+        self.indptr = indptr
+        self.shape = tuple(int(s) for s in shape)
+        self.dtype = data.dtype
+
+    @property
+    def nbytes(self):
+        return self.data.nbytes + self.indices.nbytes + self.indptr.nbytes
+
+    def ligne(self, i):
+        """
+        Args:
+            i (int): Indice de ligne
+
+        Returns:
+            tuple: (colonnes, valeurs) non nulles de la ligne
+        """
+        debut, fin = self.indptr[i], self.indptr[i + 1]
+        return self.indices[debut:fin], self.data[debut:fin]
+
+    def __getitem__(self, cle):
+        i, j = cle
+        colonnes, valeurs = self.ligne(int(i))
+        j = np.asarray(j)
+        resultat = np.zeros(j.shape, dtype=self.dtype)
+        if len(colonnes):
+            positions = np.minimum(np.searchsorted(colonnes, j), len(colonnes) - 1)
+            trouves = colonnes[positions] == j
+            resultat[trouves] = valeurs[positions[trouves]]
+        return resultat[()] if resultat.ndim == 0 else resultat
+
+    @classmethod
+    def depuis_dense(cls, matrice, k=DEFAULT_TOP_K, taille_bloc=1024):
+        """
+        Construit la forme top-K à partir d'une matrice dense (éventuellement mappée)
+
+        Args:
+            matrice (np.ndarray): Matrice (n, n) de similarité
+            k (int): Nombre de voisins conservés par ligne
+            taille_bloc (int): Nombre de lignes traitées à la fois
+
+        Returns:
+            MatriceSimilariteTopK: Matrice creuse
+        """
+        n_lignes, n_colonnes = matrice.shape
+        k = min(k, n_colonnes)
+        indices = np.empty((n_lignes, k), dtype=np.int32)
+        data = np.empty((n_lignes, k), dtype=np.float32)
+
+        for debut in range(0, n_lignes, taille_bloc):
+            bloc = np.asarray(matrice[debut:debut + taille_bloc], dtype=np.float32)
+            top = np.argpartition(-bloc, k - 1, axis=1)[:, :k] if k < n_colonnes else \
+                np.tile(np.arange(n_colonnes), (len(bloc), 1))
+            top.sort(axis=1)
+            indices[debut:debut + len(bloc)] = top
+            data[debut:debut + len(bloc)] = np.take_along_axis(bloc, top, axis=1)
+
+        indptr = np.arange(0, n_lignes * k + 1, k, dtype=np.int64)
+        return cls(data.ravel(), indices.ravel(), indptr, (n_lignes, n_colonnes))
+
+    def sauvegarder(self, chemin):
+        np.savez(chemin, data=self.data, indices=self.indices,
+                 indptr=self.indptr, shape=np.asarray(self.shape))
+
+    @classmethod
+    def charger(cls, chemin):
+        with np.load(chemin) as f:
+            return cls(f['data'], f['indices'], f['indptr'], f['shape'])
+
+
+def charger_matrice_similarite(chemin=SIMILARITY_FILE, format_stockage='dense', k=DEFAULT_TOP_K):
+    """
+    Ouvre la matrice de similarité dans le format demandé
+
+    Args:
+        chemin (str): Matrice dense float32 de référence
+        format_stockage (str): 'dense', 'float16' ou 'topk'
+        k (int): Nombre de voisins de la forme 'topk'
+
+    Returns:
+        Matrice indexable par `[i, j]` (np.memmap ou MatriceSimilariteTopK)
+    """
+    if format_stockage == 'dense':
+        matrice = np.load(chemin, mmap_mode='r')
+    elif format_stockage == 'float16':
+        matrice = np.load(chemin_float16(chemin), mmap_mode='r')
+    elif format_stockage == 'topk':
+        matrice = MatriceSimilariteTopK.charger(chemin_topk(chemin, k))
+    else:
+        raise ValueError(
+            f"Format inconnu : {format_stockage} (attendu : {', '.join(SIMILARITY_FORMATS)})"
+        )
+    print(f"✅ Matrice de similarité '{format_stockage}' ouverte {matrice.shape}")
+    return matrice
+
+
+def construire_formes_compressees(chemin=SIMILARITY_FILE, k=DEFAULT_TOP_K, taille_bloc=1024):
+    """
+    Écrit les versions float16 et top-K de la matrice dense
+
+    Args:
+        chemin (str): Matrice dense float32
+        k (int): Nombre de voisins de la forme 'topk'
+        taille_bloc (int): Nombre de lignes converties à la fois
+    """
+    dense = np.load(chemin, mmap_mode='r')
+
+    f16 = np.lib.format.open_memmap(chemin_float16(chemin), mode='w+',
+                                    dtype=np.float16, shape=dense.shape)
+    for debut in range(0, dense.shape[0], taille_bloc):
+        f16[debut:debut + taille_bloc] = dense[debut:debut + taille_bloc]
+    f16.flush()
+    del f16
+
+    MatriceSimilariteTopK.depuis_dense(dense, k, taille_bloc).sauvegarder(chemin_topk(chemin, k))
+    print(f"✅ Formes compressées écrites : {chemin_float16(chemin)}, {chemin_topk(chemin, k)}")
+
+
+def rapport_compression(chemin=SIMILARITY_FILE, k=DEFAULT_TOP_K, taille_bloc=1024):
+    """
+    Compare la mémoire et la dérive des scores de chaque forme face à la matrice float32
+
+    Args:
+        chemin (str): Matrice dense float32
+        k (int): Nombre de voisins de la forme 'topk'
+        taille_bloc (int): Nombre de lignes comparées à la fois
+
+    Returns:
+        dict: Par format, octets occupés, gain et erreurs absolues (max, moyenne)
+    """
+    dense = np.load(chemin, mmap_mode='r')
+    formes = {
+        'float16': charger_matrice_similarite(chemin, 'float16'),
+        'topk': charger_matrice_similarite(chemin, 'topk', k)
+    }
+    rapport = {'dense': {'octets': int(dense.nbytes), 'gain': 1.0, 'erreur_max': 0.0, 'erreur_moyenne': 0.0}}
+
+    toutes_colonnes = np.arange(dense.shape[1])
+    for nom, forme in formes.items():
+        erreur_max, somme_erreurs = 0.0, 0.0
+        for debut in range(0, dense.shape[0], taille_bloc):
+            bloc = np.asarray(dense[debut:debut + taille_bloc], dtype=np.float32)
+            if nom == 'topk':
+                approx = np.stack([forme[i, toutes_colonnes] for i in range(debut, debut + len(bloc))])
+            else:
+                approx = np.asarray(forme[debut:debut + taille_bloc], dtype=np.float32)
+            ecart = np.abs(bloc - approx.astype(np.float32))
+            erreur_max = max(erreur_max, float(ecart.max()))
+            somme_erreurs += float(ecart.sum())
+        rapport[nom] = {
+            'octets': int(forme.nbytes),
+            'gain': dense.nbytes / forme.nbytes,
+            'erreur_max': erreur_max,
+            'erreur_moyenne': somme_erreurs / dense.size
+        }
+    return rapport
+
+
+def main():
+    """Construit les formes compressées et affiche le rapport mémoire / dérive"""
+    import sys
+
+    chemin = sys.argv[1] if len(sys.argv) > 1 else SIMILARITY_FILE
+    k = int(sys.argv[2]) if len(sys.argv) > 2 else DEFAULT_TOP_K
+
+    construire_formes_compressees(chemin, k)
+    rapport = rapport_compression(chemin, k)
+
+    print(f"\n📊 RAPPORT DE COMPRESSION ({chemin}, K={k})")
+    print("=" * 60)
+    for nom, stats in rapport.items():
+        print(f"   {nom:8s} : {stats['octets'] / 1024 ** 2:8.1f} MB (x{stats['gain']:.1f}) | "
+              f"erreur max {stats['erreur_max']:.4f} | moyenne {stats['erreur_moyenne']:.5f}")
+
+
+if __name__ == "__main__":
+    main()
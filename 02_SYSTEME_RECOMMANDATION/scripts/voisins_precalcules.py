@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Voisins KNN pré-calculés par logement
+=====================================
+
+Pour une référence unique, l'étape collaborative de `/recommend` ne dépend
+que du logement : vecteur moyen des utilisateurs l'ayant noté, ses K voisins
+KNN, puis notes moyennes des logements notés par ces voisins. Cette tâche
+hors-ligne la calcule pour tous les logements (un `kneighbors` par lot) et
+range le résultat dans `voisins_precalcules.npz` :
+- voisins (identifiants utilisateurs) et distances : tableaux (n, K)
+- candidats (id_listing, notes estimées) : format CSR, offsets + tableaux plats
+
+En ligne, un logement présent dans la table est servi sans appel au KNN
+(quelles que soient alpha/beta et top_n, contrairement à
+`recommandations_precalculees.py` qui fige le classement).
+
+Mise à jour incrémentale : la table garde l'empreinte des notes de chaque
+utilisateur et de chaque logement. Quand des notes arrivent, seuls sont
+recalculés les logements :
+- notés par un utilisateur dont les notes ont changé (leur vecteur moyen change)
+- dont les avis ont changé (notes ajoutées, modifiées ou supprimées)
+- dont un voisin a changé ou a disparu
+- dont un utilisateur modifié est désormais à une distance inférieure ou
+  égale à celle du K-ième voisin (il peut entrer dans les voisins)
+Pour les autres, vecteur moyen, voisins et distances sont inchangés : la
+table reste identique à une reconstruction complète (à l'ordre près des
+voisins à égale distance).
+
+Utilisation :
+    python voisins_precalcules.py [--complet]
+"""
+
+import hashlib
+import json
+import os
+
+import numpy as np
+from scipy import sparse
+
+VOISINS_FILE = 'voisins_precalcules.npz'
+DEFAULT_N_VOISINS = 10
+TAILLE_LOT = 512
+
+
+def _cles_utilisateurs(user_ids):
+    """Identifiants utilisateurs dans un type sauvegardable sans pickle"""
+    user_ids = np.asarray(user_ids)
+    return user_ids.astype(str) if user_ids.dtype == object else user_ids
+
+
+def _signatures_utilisateurs(matrice):
+    """Empreinte des notes de chaque utilisateur, en entiers 64 bits (dans l'ordre des lignes)"""
+    signatures = matrice.signatures_lignes()
+    return np.array([int(signatures[u], 16) for u in matrice.user_ids.tolist()], dtype=np.uint64)
+
+
+def signatures_logements(matrice):
+    """
+    Empreinte des avis de chaque logement (identifiants des utilisateurs et notes)
+
+    Contrairement à `signatures_colonnes`, l'ajout d'un utilisateur ne change
+    pas l'empreinte des logements qu'il n'a pas notés.
+
+    Returns:
+        dict: id_listing -> empreinte hexadécimale
+    """
+    cles = _cles_utilisateurs(matrice.user_ids)
+    indptr, indices, data = matrice.csc.indptr, matrice.csc.indices, matrice.csc.data
+    return {
+        item: hashlib.blake2b(cles[indices[indptr[j]:indptr[j + 1]]].tobytes()
+                              + data[indptr[j]:indptr[j + 1]].tobytes(), digest_size=8).hexdigest()
+        for j, item in enumerate(matrice.item_ids.tolist())
+    }
+
+
+def _parametres_knn(knn_model):
+    """Métrique effective du KNN (doit être la même pour réutiliser une table)"""
+    return {'metrique': str(knn_model.effective_metric_),
+            'parametres_metrique': dict(knn_model.effective_metric_params_ or {})}
+
+
+class TableVoisins:
+    """
+    Voisins KNN et candidats collaboratifs de chaque logement de référence
+    """
+
+    def __init__(self, ids_ref, voisins, distances, offsets, ids_candidats, notes,
+                 signatures_refs, user_ids, signatures_users, n_voisins, sources):
+        """
+        Args:
+            ids_ref (np.ndarray): id_listing des références (une ligne chacune)
+            voisins (np.ndarray): Identifiants des K voisins de chaque référence (n, K)
+            distances (np.ndarray): Distances correspondantes (n, K), croissantes
+            offsets (np.ndarray): Début de chaque ligne de candidats (n + 1)
+            ids_candidats (np.ndarray): id_listing candidats (hors référence)
+            notes (np.ndarray): Notes estimées des candidats (float64)
+            signatures_refs (np.ndarray): Empreinte des avis de chaque référence
+            user_ids (np.ndarray): Utilisateurs de la matrice utilisée
+            signatures_users (np.ndarray): Empreinte des notes de chacun (uint64)
+            n_voisins (int): Voisins demandés au KNN (le premier est ignoré)
+            sources (dict): Empreinte de la matrice et paramètres du KNN
+        """
+        self.ids_ref = np.asarray(ids_ref, dtype=np.int64)
+        self.voisins = np.asarray(voisins)
+        self.distances = np.asarray(distances, dtype=np.float32)
+        self.offsets = np.asarray(offsets, dtype=np.int64)
+        self.ids_candidats = np.asarray(ids_candidats, dtype=np.int64)
+        self.notes = np.asarray(notes, dtype=np.float64)
+        self.signatures_refs = np.asarray(signatures_refs, dtype='U16')
+        self.user_ids = np.asarray(user_ids)
+        self.signatures_users = np.asarray(signatures_users, dtype=np.uint64)
+        self.n_voisins = int(n_voisins)
+        self.sources = dict(sources)
+        self.position = {id_ref: i for i, id_ref in enumerate(self.ids_ref.tolist())}
+
+    def __len__(self):
+        return len(self.ids_ref)
+
+    def __contains__(self, id_listing):
+        return id_listing in self.position
+
+    @property
+    def nbytes(self):
+        return sum(t.nbytes for t in (self.ids_ref, self.voisins, self.distances, self.offsets,
+                                      self.ids_candidats, self.notes))
+
+    def candidats(self, id_listing):
+        """
+        Étape collaborative pré-calculée, au format de `candidats_collaboratifs`
+
+        Args:
+            id_listing (int): Logement de référence
+
+        Returns:
+            tuple: (id_listing candidats, notes estimées), ou None si absent de la table
+        """
+        i = self.position.get(id_listing)
+        if i is None:
+            return None
+        debut, fin = self.offsets[i], self.offsets[i + 1]
+        return self.ids_candidats[debut:fin], self.notes[debut:fin]
+
+    def ligne(self, id_listing):
+        """(voisins, distances, id_listing candidats, notes) d'un logement"""
+        i = self.position[id_listing]
+        return (self.voisins[i], self.distances[i]) + self.candidats(id_listing)
+
+    def sauvegarder(self, chemin=VOISINS_FILE):
+        np.savez(chemin, ids_ref=self.ids_ref, voisins=self.voisins, distances=self.distances,
+                 offsets=self.offsets, ids_candidats=self.ids_candidats, notes=self.notes,
+                 signatures_refs=self.signatures_refs, user_ids=self.user_ids,
+                 signatures_users=self.signatures_users,
+                 parametres=np.asarray(json.dumps({'n_voisins': self.n_voisins,
+                                                   'sources': self.sources})))
+
+    @classmethod
+    def charger(cls, chemin=VOISINS_FILE):
+        with np.load(chemin) as f:
+            parametres = json.loads(str(f['parametres']))
+            return cls(f['ids_ref'], f['voisins'], f['distances'], f['offsets'], f['ids_candidats'],
+                       f['notes'], f['signatures_refs'], f['user_ids'], f['signatures_users'],
+                       parametres['n_voisins'], parametres['sources'])
+
+
+def sources_table(user_item_matrix, knn_model):
+    """Empreinte de la matrice et paramètres du KNN dont dépend la table"""
+    return {'user_item': user_item_matrix.empreinte(), **_parametres_knn(knn_model)}
+
+
+def vecteurs_moyens(matrice, ids_listing):
+    """
+    Vecteurs moyens des utilisateurs ayant noté chaque logement (comme en ligne)
+
+    Args:
+        matrice (MatriceUtilisateurItem): Matrice creuse
+        ids_listing (list): Logements
+
+    Returns:
+        tuple: (logements ayant au moins une note, vecteurs (n, n_logements) CSR)
+    """
+    gardes, vecteurs = [], []
+    for id_listing in ids_listing:
+        utilisateurs = matrice.utilisateurs_ayant_note([id_listing])
+        if len(utilisateurs):
+            gardes.append(id_listing)
+            vecteurs.append(matrice.vecteur_moyen(utilisateurs))
+    if not vecteurs:
+        return [], sparse.csr_matrix((0, matrice.shape[1]), dtype=np.float32)
+    return gardes, sparse.vstack(vecteurs, format='csr')
+
+
+def _calculer_lignes(ids_listing, matrice, knn_model, n_voisins, taille_lot=TAILLE_LOT):
+    """Voisins et candidats de chaque logement : {id_listing: (voisins, distances, ids, notes)}"""
+    cles = _cles_utilisateurs(matrice.user_ids)
+    lignes = {}
+    ids_listing = [i for i in ids_listing if matrice.contient_item(i)]
+    for debut in range(0, len(ids_listing), taille_lot):
+        gardes, vecteurs = vecteurs_moyens(matrice, ids_listing[debut:debut + taille_lot])
+        if not gardes:
+            continue
+        distances, indices = knn_model.kneighbors(vecteurs, n_neighbors=n_voisins)
+        for id_listing, distances_i, voisins in zip(gardes, distances, indices):
+            # Même calcul que candidats_collaboratifs_lot
+            ids_candidats, notes_estimees = matrice.notes_moyennes(voisins[1:])
+            hors_ref = ids_candidats != id_listing
+            lignes[id_listing] = (cles[voisins], distances_i,
+                                  ids_candidats[hors_ref].astype(np.int64), notes_estimees[hors_ref])
+    return lignes
+
+
+def _assembler(lignes, signatures_refs, matrice, n_voisins, sources):
+    """Range les lignes calculées dans une TableVoisins"""
+    ids_ref = sorted(lignes)
+    cles = _cles_utilisateurs(matrice.user_ids)
+    longueurs = [len(lignes[i][2]) for i in ids_ref]
+    offsets = np.concatenate([[0], np.cumsum(longueurs)]).astype(np.int64)
+
+    def _plat(k, dtype):
+        morceaux = [lignes[i][k] for i in ids_ref]
+        return np.concatenate(morceaux).astype(dtype) if morceaux else np.empty(0, dtype=dtype)
+
+    def _dense(k, dtype):
+        if not ids_ref:
+            return np.empty((0, n_voisins), dtype=dtype)
+        return np.stack([lignes[i][k] for i in ids_ref]).astype(dtype)
+
+    return TableVoisins(
+        ids_ref, _dense(0, cles.dtype), _dense(1, np.float32), offsets,
+        _plat(2, np.int64), _plat(3, np.float64),
+        [signatures_refs.get(i, '') for i in ids_ref],
+        cles, _signatures_utilisateurs(matrice), n_voisins, sources
+    )
+
+
+def logements_affectes(table, matrice, knn_model, ids_listing):
+    """
+    Logements dont les voisins ou les candidats peuvent avoir changé depuis la table
+
+    Args:
+        table (TableVoisins): Table calculée sur une version précédente des notes
+        matrice (MatriceUtilisateurItem): Nouvelle matrice
+        knn_model (NearestNeighbors): KNN ajusté sur la nouvelle matrice
+        ids_listing (list): Logements à couvrir
+
+    Returns:
+        set: id_listing à recalculer
+    """
+    from sklearn.metrics import pairwise_distances
+
+    cles = _cles_utilisateurs(matrice.user_ids)
+    anciennes = dict(zip(table.user_ids.tolist(), table.signatures_users.tolist()))
+    lignes_modifiees = [i for i, (cle, signature) in enumerate(zip(cles.tolist(),
+                                                                   _signatures_utilisateurs(matrice).tolist()))
+                        if anciennes.get(cle) != signature]
+    changes = set(anciennes) - set(cles.tolist()) | set(cles[lignes_modifiees].tolist())
+
+    # Avis modifiés, logements nouveaux ou sans ligne dans la table
+    signatures = signatures_logements(matrice)
+    anciennes_refs = dict(zip(table.ids_ref.tolist(), table.signatures_refs.tolist()))
+    affectes = {i for i in ids_listing if anciennes_refs.get(i) != signatures.get(i)}
+
+    # Logements notés par un utilisateur modifié : leur vecteur moyen change
+    if lignes_modifiees:
+        colonnes = np.unique(matrice.csr[lignes_modifiees].indices)
+        affectes |= set(matrice.item_ids[colonnes].tolist())
+
+    # Logements dont un voisin a changé ou disparu
+    if changes and len(table):
+        voisin_change = np.isin(table.voisins, list(changes)).any(axis=1)
+        affectes |= set(table.ids_ref[voisin_change].tolist())
+
+    # Utilisateurs modifiés désormais plus proches que le K-ième voisin
+    restants = [i for i in ids_listing if i not in affectes and i in table]
+    if lignes_modifiees and restants:
+        gardes, vecteurs = vecteurs_moyens(matrice, restants)
+        if gardes:
+            distances = pairwise_distances(vecteurs, matrice.csr[lignes_modifiees],
+                                           metric=knn_model.effective_metric_,
+                                           **(knn_model.effective_metric_params_ or {}))
+            rayons = np.array([table.distances[table.position[i], -1] for i in gardes], dtype=np.float64)
+            # Marge : distances recalculées ici et dans kneighbors, rayon stocké en float32
+            proches = (distances <= rayons[:, None] + 1e-5).any(axis=1)
+            affectes |= {i for i, proche in zip(gardes, proches) if proche}
+    return affectes
+
+
+def precalculer_voisins(ids_listing, user_item_matrix, knn_model, n_voisins=DEFAULT_N_VOISINS,
+                        table_existante=None):
+    """
+    Construit (ou met à jour) la table des voisins pré-calculés
+
+    Avec `table_existante` de même métrique et même nombre de voisins, seuls
+    les logements affectés par les notes modifiées sont recalculés (voir
+    `logements_affectes`).
+
+    Args:
+        ids_listing (list): Logements de référence (id_listing de df_grouped)
+        user_item_matrix (MatriceUtilisateurItem): Matrice creuse
+        knn_model (NearestNeighbors): KNN ajusté sur la matrice creuse
+        n_voisins (int): Voisins demandés au KNN (le premier est ignoré)
+        table_existante (TableVoisins): Table à mettre à jour
+
+    Returns:
+        tuple: (TableVoisins, nombre de logements recalculés)
+    """
+    sources = sources_table(user_item_matrix, knn_model)
+    ids_listing = [int(i) for i in dict.fromkeys(ids_listing)]
+
+    lignes_gardees = {}
+    a_calculer = ids_listing
+    if (table_existante is not None and table_existante.n_voisins == n_voisins
+            and all(table_existante.sources.get(k) == v for k, v in _parametres_knn(knn_model).items())):
+        affectes = logements_affectes(table_existante, user_item_matrix, knn_model, ids_listing)
+        a_calculer = [i for i in ids_listing if i in affectes]
+        lignes_gardees = {i: table_existante.ligne(i) for i in ids_listing
+                          if i not in affectes and i in table_existante}
+
+    lignes = _calculer_lignes(a_calculer, user_item_matrix, knn_model, n_voisins)
+    lignes.update(lignes_gardees)
+    return (_assembler(lignes, signatures_logements(user_item_matrix), user_item_matrix, n_voisins,
+                       sources),
+            len(a_calculer))
+
+
+def charger_table_voisins(user_item_matrix, knn_model, chemin=VOISINS_FILE, n_voisins=DEFAULT_N_VOISINS):
+    """
+    Charge la table des voisins si elle correspond aux artefacts en service
+
+    Args:
+        user_item_matrix (MatriceUtilisateurItem): Matrice creuse chargée
+        knn_model (NearestNeighbors): KNN en service
+        chemin (str): Fichier de la table
+        n_voisins (int): Voisins demandés en ligne
+
+    Returns:
+        TableVoisins: Table, ou None si absente ou périmée
+    """
+    if not os.path.exists(chemin):
+        return None
+    table = TableVoisins.charger(chemin)
+    if table.sources != sources_table(user_item_matrix, knn_model) or table.n_voisins != n_voisins:
+        print(f"⚠️ {chemin} ne correspond plus aux artefacts chargés : KNN en direct")
+        return None
+    print(f"✅ Voisins pré-calculés chargés ({len(table)} logements, K={table.n_voisins}, "
+          f"{table.nbytes / 1024 / 1024:.1f} Mo)")
+    return table
+
+
+def main():
+    """Construit ou met à jour la table des voisins pré-calculés"""
+    import pickle
+    import sys
+    import time
+
+    import pandas as pd
+
+    from matrice_utilisateur_item import ajuster_knn_creux, charger_matrice_utilisateur_item
+
+    complet = '--complet' in sys.argv
+
+    with open('knn_model.pkl', 'rb') as f:
+        knn_model = pickle.load(f)
+    user_item_matrix = charger_matrice_utilisateur_item('user_item_matrix.pkl')
+    knn_model = ajuster_knn_creux(user_item_matrix, knn_model)
+    ids_listing = pd.read_pickle('df_grouped.pkl')['id_listing'].unique().tolist()
+
+    table_existante = None
+    if not complet and os.path.exists(VOISINS_FILE):
+        table_existante = TableVoisins.charger(VOISINS_FILE)
+
+    debut = time.perf_counter()
+    table, n_calcules = precalculer_voisins(ids_listing, user_item_matrix, knn_model,
+                                            table_existante=table_existante)
+    table.sauvegarder(VOISINS_FILE)
+    print(f"✅ {n_calcules}/{len(ids_listing)} logements calculés en "
+          f"{time.perf_counter() - debut:.1f}s -> {VOISINS_FILE} ({len(table)} lignes, "
+          f"{table.nbytes / 1024 / 1024:.1f} Mo)")
+
+
+if __name__ == "__main__":
+    main()
@@ -166,6 +166,10 @@ LOGGING_CONFIG = {
 PERFORMANCE_CONFIG = {
     'cache_results': True,
     'cache_size': 100,
+    'cache_ttl': 3600,  # secondes
+    'candidate_cache_size': 1000,  # jeux de références dont les vecteurs candidats sont gardés
+    'embedding_cache_mb': 64,  # cache mémoire des embeddings de requêtes
+    'embedding_cache_dir': None,  # dossier du cache disque des embeddings (None : mémoire seule)
     'max_processing_time': 30,  # secondes
     'batch_size': 1000,
     'memory_limit': 512 * 1024 * 1024  # 512MB
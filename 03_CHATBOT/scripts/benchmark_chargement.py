@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de l'agrégation des avis du chatbot
+=============================================
+
+Compare, sur un jeu d'avis synthétique (1 million par défaut), l'agrégation
+par logement d'origine de `ChatbotHebergement.load_data` (groupby avec une
+lambda Python pour l'échantillon d'avis) et `agreger_avis` (agrégateurs
+intégrés, échantillon construit par `cumcount` puis joint en un passage).
+Les deux tables sont comparées avant d'afficher les durées.
+
+`--csv` mesure aussi le chargement complet depuis un CSV : lecture de tout le
+fichier puis agrégation, contre la lecture par morceaux.
+
+Utilisation :
+    python benchmark_chargement.py [--avis 1000000] [--logements 10000] [--repetitions 3] [--csv]
+"""
+
+import argparse
+import contextlib
+import io
+import os
+import tempfile
+import time
+
+import numpy as np
+import pandas as pd
+
+from chatbot_hebergement import ChatbotHebergement, agreger_avis
+
+
+def generer_avis(n_avis=1_000_000, n_logements=10_000, graine=0):
+    """
+    Avis synthétiques au format de all_reviews_final.csv (valeurs manquantes comprises)
+
+    Returns:
+        DataFrame: Un avis par ligne, logements mélangés
+    """
+    rng = np.random.default_rng(graine)
+    ids = rng.integers(0, n_logements, n_avis) + 10**17
+
+    def _trous(valeurs, part=0.2):
+        return pd.Series(valeurs).where(rng.random(n_avis) >= part)
+
+    libelles = np.array([f"${p} par nuit" for p in range(20, 400)] + ["Prix sur demande"], dtype=object)
+    phrases = np.array(["Séjour parfait, appartement très propre", "Hôte réactif et disponible",
+                        "Proche de la plage, un peu bruyant", "Rapport qualité-prix correct",
+                        "Logement moderne et bien équipé"], dtype=object)
+    return pd.DataFrame({
+        'id_listing': ids,
+        'id_review': pd.Series(np.arange(n_avis)).astype(str),
+        'title': _trous(pd.Series(ids % 997).map("Appartement {} vue mer".format)),
+        'description': _trous(pd.Series(ids % 991).map("Description du logement {}".format)),
+        'city_listing': _trous(np.where(ids % 2, 'Hammamet', 'Jerba')),
+        'rating_listing': _trous(np.round(rng.uniform(3, 5, n_avis), 2)),
+        'sentiment_score': _trous(rng.random(n_avis)),
+        'rating_review': _trous(rng.integers(1, 6, n_avis).astype(float)),
+        'rating/cleanliness': _trous(rng.uniform(3, 5, n_avis)),
+        'rating/accuracy': _trous(rng.uniform(3, 5, n_avis)),
+        'rating/communication': _trous(rng.uniform(3, 5, n_avis)),
+        'rating/location': _trous(rng.uniform(3, 5, n_avis)),
+        'rating/value': _trous(rng.uniform(3, 5, n_avis)),
+        'price/label': _trous(libelles[rng.integers(0, len(libelles), n_avis)]),
+        'coordinates/latitude': _trous(rng.uniform(33, 37, n_avis)),
+        'coordinates/longitude': _trous(rng.uniform(9, 11, n_avis)),
+        'localizedText': _trous(phrases[rng.integers(0, len(phrases), n_avis)], 0.4)
+    })
+
+
+def agregation_origine(df):
+    """Préparation et agrégation d'origine de load_data (lambda Python par logement pour localizedText)"""
+    df['rating_listing'] = pd.to_numeric(df['rating_listing'], errors='coerce')
+    df['sentiment_score'] = pd.to_numeric(df['sentiment_score'], errors='coerce')
+    df['price_numeric'] = df['price/label'].str.extract(r'\$(\d+)').astype(float)
+    return df.groupby('id_listing').agg({
+        'title': 'first',
+        'description': 'first',
+        'city_listing': 'first',
+        'rating_listing': 'first',
+        'rating/cleanliness': 'first',
+        'rating/accuracy': 'first',
+        'rating/communication': 'first',
+        'rating/location': 'first',
+        'rating/value': 'first',
+        'price/label': 'first',
+        'price_numeric': 'first',
+        'coordinates/latitude': 'first',
+        'coordinates/longitude': 'first',
+        'sentiment_score': 'mean',
+        'rating_review': 'mean',
+        'localizedText': lambda x: ' '.join(x.dropna().astype(str)[:3]),
+        'id_review': 'count'
+    }).reset_index()
+
+
+def _chronometrer(fonction, repetitions):
+    """Meilleure durée sur `repetitions` appels, et le dernier résultat"""
+    meilleure, resultat = float('inf'), None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultat = fonction()
+        meilleure = min(meilleure, time.perf_counter() - debut)
+    return meilleure, resultat
+
+
+def comparer(df, repetitions=3):
+    """
+    Durées des deux agrégations sur les mêmes avis (tables vérifiées identiques)
+
+    Returns:
+        dict: Durées en secondes et accélération
+    """
+    duree_origine, origine = _chronometrer(lambda: agregation_origine(df.copy()), repetitions)
+    duree_vectorisee, vectorisee = _chronometrer(lambda: agreger_avis([df.copy()]), repetitions)
+    pd.testing.assert_frame_equal(vectorisee, origine)
+    return {'origine_s': duree_origine, 'vectorisee_s': duree_vectorisee,
+            'acceleration': duree_origine / duree_vectorisee, 'logements': len(origine)}
+
+
+def comparer_csv(df, repetitions=1):
+    """
+    Chargement complet depuis un CSV : lecture entière + agrégation d'origine,
+    contre `ChatbotHebergement` (lecture par morceaux des colonnes utiles)
+
+    Returns:
+        dict: Durées en secondes et taille du fichier
+    """
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, 'all_reviews_final.csv')
+        df.to_csv(chemin, index=False)
+        duree_origine, _ = _chronometrer(lambda: agregation_origine(pd.read_csv(chemin)), repetitions)
+        with contextlib.redirect_stdout(io.StringIO()):
+            duree_morceaux, _ = _chronometrer(lambda: ChatbotHebergement(chemin, cache_listings=False).listings, repetitions)
+        return {'origine_s': duree_origine, 'morceaux_s': duree_morceaux,
+                'taille_mo': os.path.getsize(chemin) / 1024 / 1024}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Agrégation des avis : lambda d'origine contre agrégation vectorisée")
+    parser.add_argument('--avis', type=int, default=1_000_000)
+    parser.add_argument('--logements', type=int, default=10_000)
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--graine', type=int, default=0)
+    parser.add_argument('--csv', action='store_true', help="Mesure aussi le chargement depuis un CSV")
+    args = parser.parse_args()
+
+    print(f"🔄 Génération de {args.avis:,} avis sur {args.logements:,} logements...")
+    df = generer_avis(args.avis, args.logements, args.graine)
+
+    resultats = comparer(df, args.repetitions)
+    print(f"✅ Tables identiques ({resultats['logements']:,} logements)")
+    print(f"⏱️ Agrégation d'origine (lambda) : {resultats['origine_s']:.2f}s")
+    print(f"⏱️ Agrégation vectorisée         : {resultats['vectorisee_s']:.2f}s "
+          f"(x{resultats['acceleration']:.1f})")
+
+    if args.csv:
+        chargement = comparer_csv(df)
+        print(f"⏱️ Chargement du CSV ({chargement['taille_mo']:.0f} Mo) : d'origine {chargement['origine_s']:.2f}s, "
+              f"par morceaux {chargement['morceaux_s']:.2f}s")
+
+
+if __name__ == "__main__":
+    main()
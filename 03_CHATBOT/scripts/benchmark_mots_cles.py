@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Benchmark de la détection des mots-clés d'une requête
+=====================================================
+
+Étend les mots-clés du chatbot (MOTS_CLES) à 10 000 mots-clés synthétiques (variantes françaises,
+anglaises et translittérations de l'arabe) et compare, par requête, la
+boucle d'origine de `analyze_query` (un test `mot in requete` par mot-clé)
+à `DetecteurMotsCles` (automate construit une fois, un passage sur la
+requête). Les catégories trouvées sont comparées avant d'afficher les durées.
+
+Utilisation :
+    python benchmark_mots_cles.py [--mots-cles 10000] [--requetes 2000]
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+from chatbot_hebergement import MOTS_CLES
+from mots_cles import DetecteurMotsCles
+
+SYLLABES = ['ba', 'bi', 'dar', 'dh', 'el', 'gh', 'ha', 'jar', 'kh', 'la', 'ma', 'ni', 'ou',
+            'qa', 'ra', 'sa', 'ch', 'ta', 'we', 'za', 'é', 'è', 'ée', 'tion', 'ing', 'ly']
+
+
+def detection_origine(groupes, requete):
+    """Boucle d'origine de analyze_query : un test de sous-chaîne par mot-clé"""
+    return {groupe: [categorie for categorie, mots in categories.items()
+                     if any(mot in requete for mot in mots)]
+            for groupe, categories in groupes.items()}
+
+
+def generer_mots_cles(n_mots_cles=10_000, graine=0):
+    """
+    MOTS_CLES complété par des synonymes synthétiques répartis entre les catégories
+
+    Returns:
+        dict: groupe -> {catégorie: [mots-clés]}
+    """
+    rng = np.random.default_rng(graine)
+    groupes = {groupe: {categorie: list(mots) for categorie, mots in categories.items()}
+               for groupe, categories in MOTS_CLES.items()}
+    listes = [mots for categories in groupes.values() for mots in categories.values()]
+    existants = {mot for mots in listes for mot in mots}
+    while len(existants) < n_mots_cles:
+        mot = ''.join(rng.choice(SYLLABES, rng.integers(3, 6)))
+        if mot not in existants:
+            existants.add(mot)
+            listes[rng.integers(len(listes))].append(mot)
+    return groupes
+
+
+def generer_requetes(groupes, n_requetes=2000, graine=0):
+    """Requêtes mêlant mots-clés et mots quelconques (30 à 120 caractères)"""
+    rng = np.random.default_rng(graine)
+    mots_cles = [mot for categories in groupes.values() for mots in categories.values() for mot in mots]
+    requetes = []
+    for _ in range(n_requetes):
+        mots = ['je', 'cherche', 'un', 'appartement', 'pour', 'les', 'vacances', 'avec', 'vue']
+        mots = list(rng.choice(mots, rng.integers(4, 12)))
+        for _ in range(rng.integers(0, 4)):
+            mots.insert(rng.integers(len(mots) + 1), mots_cles[rng.integers(len(mots_cles))])
+        requetes.append(' '.join(mots).lower())
+    return requetes
+
+
+def _par_requete(fonction, requetes, repetitions):
+    """Meilleure durée moyenne par requête (microsecondes) et résultats"""
+    meilleure, resultats = float('inf'), None
+    for _ in range(repetitions):
+        debut = time.perf_counter()
+        resultats = [fonction(requete) for requete in requetes]
+        meilleure = min(meilleure, time.perf_counter() - debut)
+    return meilleure / len(requetes) * 1e6, resultats
+
+
+def comparer(n_mots_cles=10_000, n_requetes=2000, repetitions=3, graine=0):
+    """
+    Durées par requête des deux détections (catégories trouvées vérifiées identiques)
+
+    Returns:
+        dict: Durées en microsecondes, construction de l'automate en millisecondes
+    """
+    groupes = generer_mots_cles(n_mots_cles, graine)
+    requetes = generer_requetes(groupes, n_requetes, graine)
+
+    debut = time.perf_counter()
+    detecteur = DetecteurMotsCles(groupes)
+    construction = (time.perf_counter() - debut) * 1000
+
+    origine_us, origine = _par_requete(lambda r: detection_origine(groupes, r), requetes, repetitions)
+    automate_us, automate = _par_requete(detecteur.detecter, requetes, repetitions)
+    assert automate == origine, "Catégories trouvées différentes"
+    return {'origine_us': origine_us, 'automate_us': automate_us, 'construction_ms': construction,
+            'acceleration': origine_us / automate_us, 'etats': len(detecteur),
+            'mots_cles': sum(len(mots) for categories in groupes.values() for mots in categories.values())}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Détection des mots-clés : boucle d'origine contre automate")
+    parser.add_argument('--mots-cles', type=int, default=10_000)
+    parser.add_argument('--requetes', type=int, default=2000)
+    parser.add_argument('--repetitions', type=int, default=3)
+    parser.add_argument('--graine', type=int, default=0)
+    args = parser.parse_args()
+
+    resultats = comparer(args.mots_cles, args.requetes, args.repetitions, args.graine)
+    print(f"✅ Catégories identiques sur {args.requetes:,} requêtes ({resultats['mots_cles']:,} mots-clés)")
+    print(f"🔧 Automate : {resultats['etats']:,} états, construit en {resultats['construction_ms']:.0f} ms")
+    print(f"⏱️ Boucle d'origine : {resultats['origine_us']:.1f} µs / requête")
+    print(f"⏱️ Automate         : {resultats['automate_us']:.1f} µs / requête (x{resultats['acceleration']:.0f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,127 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Cache de la table des logements préparée par le chatbot
+=======================================================
+
+`ChatbotHebergement` relit tout le CSV des avis, extrait les prix, regroupe
+par logement et calcule `quality_score` à chaque démarrage. La table obtenue
+est écrite au format Arrow IPC (Feather v2, non compressé) à côté du CSV
+(`all_reviews_final.csv` -> `all_reviews_final.listings.feather`) et relue
+par mappage mémoire aux démarrages suivants.
+
+La clé du cache, dans les métadonnées du fichier :
+- taille, date de modification et empreinte SHA-256 du CSV source : tant que
+  taille et date sont inchangées, le CSV n'est même pas haché ; sinon il
+  l'est, et le cache reste valide si le contenu est le même
+- poids du score de qualité et version du format de la table
+
+Sans pyarrow, la table est recalculée à chaque démarrage comme avant.
+"""
+
+import hashlib
+import json
+import os
+
+try:
+    import pyarrow as pa
+    import pyarrow.feather as feather
+    PYARROW_AVAILABLE = True
+except ImportError:
+    PYARROW_AVAILABLE = False
+
+# À incrémenter quand les colonnes ou leur calcul changent
+VERSION_FORMAT = 1
+
+CLE_PARAMETRES = b'parametres_listings'
+CLE_SOURCE = b'source_sha256'
+CLE_ETAT_SOURCE = b'source_taille_mtime'
+
+
+def chemin_cache(data_file):
+    """`all_reviews_final.csv` -> `all_reviews_final.listings.feather`"""
+    return os.path.splitext(data_file)[0] + '.listings.feather'
+
+
+def etat_fichier(chemin):
+    """Taille et date de modification (ns) d'un fichier"""
+    etat = os.stat(chemin)
+    return f"{etat.st_size}:{etat.st_mtime_ns}".encode()
+
+
+def empreinte_fichier(chemin, taille_bloc=1 << 20):
+    """Empreinte SHA-256 d'un fichier, bloc par bloc"""
+    sha = hashlib.sha256()
+    with open(chemin, 'rb') as f:
+        for bloc in iter(lambda: f.read(taille_bloc), b''):
+            sha.update(bloc)
+    return sha.hexdigest()
+
+
+def _parametres(poids_qualite):
+    return json.dumps({'version': VERSION_FORMAT, 'poids_qualite': poids_qualite}, sort_keys=True).encode()
+
+
+def lire_cache_listings(data_file, poids_qualite, chemin=None):
+    """
+    Table des logements en cache, si elle correspond au CSV et aux poids
+
+    Args:
+        data_file (str): CSV des avis
+        poids_qualite (dict): Poids du score de qualité par colonne
+        chemin (str): Fichier du cache (défaut : à côté du CSV)
+
+    Returns:
+        DataFrame: Table des logements, ou None si absente ou périmée
+    """
+    chemin = chemin or chemin_cache(data_file)
+    if not PYARROW_AVAILABLE or not os.path.exists(chemin) or not os.path.exists(data_file):
+        return None
+    try:
+        with pa.memory_map(chemin) as source:
+            metadonnees = pa.ipc.open_file(source).schema.metadata or {}
+    except (OSError, pa.ArrowInvalid):
+        return None
+    if metadonnees.get(CLE_PARAMETRES) != _parametres(poids_qualite):
+        return None
+    if (metadonnees.get(CLE_ETAT_SOURCE) != etat_fichier(data_file)
+            and metadonnees.get(CLE_SOURCE, b'').decode() != empreinte_fichier(data_file)):
+        return None
+    return feather.read_table(chemin, memory_map=True).to_pandas()
+
+
+def ecrire_cache_listings(listings, data_file, poids_qualite, etat_source, chemin=None):
+    """
+    Écrit la table des logements avec la clé du cache
+
+    Args:
+        listings (DataFrame): Table préparée
+        data_file (str): CSV dont elle est issue
+        poids_qualite (dict): Poids du score de qualité utilisés
+        etat_source (bytes): `etat_fichier(data_file)` relevé avant la lecture du CSV ;
+            rien n'est écrit si le fichier a changé depuis
+        chemin (str): Fichier du cache (défaut : à côté du CSV)
+
+    Returns:
+        str: Chemin écrit, ou None
+    """
+    chemin = chemin or chemin_cache(data_file)
+    if not PYARROW_AVAILABLE:
+        return None
+    try:
+        empreinte = empreinte_fichier(data_file)
+        if etat_fichier(data_file) != etat_source:
+            return None
+        table = pa.Table.from_pandas(listings, preserve_index=False)
+        metadonnees = dict(table.schema.metadata or {})
+        metadonnees.update({CLE_PARAMETRES: _parametres(poids_qualite),
+                            CLE_SOURCE: empreinte.encode(), CLE_ETAT_SOURCE: etat_source})
+        # Écriture puis renommage : un autre processus ne lit jamais un fichier partiel
+        temporaire = f"{chemin}.{os.getpid()}.tmp"
+        feather.write_feather(table.replace_schema_metadata(metadonnees), temporaire,
+                              compression='uncompressed')
+        os.replace(temporaire, chemin)
+        return chemin
+    except OSError as e:
+        print(f"⚠️ Cache des logements non écrit ({e})")
+        return None
@@ -23,82 +23,286 @@ from collections import Counter
 from datetime import datetime
 import json
 import os
+import sys
+
+from cache_listings import ecrire_cache_listings, etat_fichier, lire_cache_listings
+from partitions_logements import PartitionsLogements, matrice_notes, meilleurs
+from mots_cles import DetecteurMotsCles
+
+# Mots-clés de l'analyse des requêtes : groupe -> {catégorie: [mots-clés]}.
+# Pour les villes et les sentiments, la première catégorie trouvée l'emporte ;
+# pour les notes, voir SEUILS_NOTE
+MOTS_CLES = {
+    'location_keywords': {
+        'hammamet': ['hammamet', 'hammamat', 'hammet', 'hamam'],
+        'jerba': ['jerba', 'djerba', 'gerba', 'jerb']
+    },
+    'quality_keywords': {
+        'propre': ['propre', 'propreté', 'clean', 'cleanliness', 'hygiène'],
+        'communication': ['communication', 'réactif', 'responsive', 'contact', 'hôte'],
+        'localisation': ['localisation', 'location', 'plage', 'beach', 'centre', 'proche'],
+        'prix': ['prix', 'price', 'budget', 'cher', 'économique', 'abordable'],
+        'moderne': ['moderne', 'modern', 'neuf', 'nouveau', 'récent'],
+        'confort': ['confort', 'comfortable', 'lit', 'bed', 'équipé']
+    },
+    'sentiment_keywords': {
+        'positif': ['bon', 'excellent', 'parfait', 'recommande', 'super', 'génial'],
+        'négatif': ['mauvais', 'décevant', 'problème', 'sale', 'bruyant']
+    },
+    'rating_keywords': {
+        'excellent': ['meilleur', 'top', 'excellent'],
+        'good': ['bon', 'bien', 'qualité']
+    }
+}
+
+# Vocabulaire partagé avec les autres chatbots (03_CHATBOT/config/config_chatbot.py),
+# utilisé par défaut ; MOTS_CLES si la configuration est introuvable
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config'))
+try:
+    from config_chatbot import KEYWORDS_CONFIG
+except ImportError:
+    KEYWORDS_CONFIG = MOTS_CLES
 
 # Configuration
 warnings.filterwarnings('ignore')
 
+# Agrégation des avis par logement, dans l'ordre des colonnes de `listings` :
+# 'first' = première valeur non nulle, 'mean' = moyenne des valeurs non nulles,
+# 'echantillon' = N_AVIS_ECHANTILLON premiers textes non nuls joints, 'count' = non nuls
+AGREGATIONS_AVIS = {
+    'title': 'first',
+    'description': 'first',
+    'city_listing': 'first',
+    'rating_listing': 'first',
+    'rating/cleanliness': 'first',
+    'rating/accuracy': 'first',
+    'rating/communication': 'first',
+    'rating/location': 'first',
+    'rating/value': 'first',
+    'price/label': 'first',
+    'price_numeric': 'first',
+    'coordinates/latitude': 'first',
+    'coordinates/longitude': 'first',
+    'sentiment_score': 'mean',
+    'rating_review': 'mean',
+    'localizedText': 'echantillon',
+    'id_review': 'count'
+}
+
+# Seules colonnes lues dans le CSV, avec leur type (price_numeric est extraite de price/label ;
+# rating_listing et sentiment_score sont lues en texte puis converties, valeurs invalides -> NaN)
+TYPES_COLONNES_AVIS = {
+    'id_listing': 'int64',
+    'id_review': 'str',
+    'title': 'str',
+    'description': 'str',
+    'city_listing': 'str',
+    'price/label': 'str',
+    'localizedText': 'str',
+    'rating_listing': 'str',
+    'sentiment_score': 'str',
+    'rating/cleanliness': 'float64',
+    'rating/accuracy': 'float64',
+    'rating/communication': 'float64',
+    'rating/location': 'float64',
+    'rating/value': 'float64',
+    'coordinates/latitude': 'float64',
+    'coordinates/longitude': 'float64',
+    'rating_review': 'float64'
+}
+
+N_AVIS_ECHANTILLON = 3
+TAILLE_MORCEAUX = 100_000
+
+# Poids du score de qualité global (colonnes de `listings`)
+POIDS_QUALITE = {
+    'rating_listing': 0.3,
+    'sentiment_score': 0.3,
+    'avg_review_rating': 0.2,
+    'rating/cleanliness': 0.2
+}
+
+# Note minimale demandée selon la catégorie de rating_keywords trouvée (la première l'emporte)
+SEUILS_NOTE = {
+    'excellent': 3.5,  # Abaissé pour plus de résultats
+    'good': 3.0        # Abaissé pour plus de résultats
+}
+
+# Seuils de sentiment_score selon le sentiment demandé
+SEUIL_SENTIMENT_POSITIF = 0.7
+SEUIL_SENTIMENT_NEGATIF = 0.3
+
+# Note détaillée ajoutée au score de qualité pour chaque critère demandé
+COLONNES_FOCUS = {
+    'propre': 'rating/cleanliness',
+    'communication': 'rating/communication',
+    'localisation': 'rating/location',
+    'prix': 'rating/value'
+}
+POIDS_FOCUS = 0.5
+
+
+def preparer_morceau(df):
+    """Conversions numériques d'un morceau d'avis (mêmes règles que le chargement complet)"""
+    df['rating_listing'] = pd.to_numeric(df['rating_listing'], errors='coerce')
+    df['sentiment_score'] = pd.to_numeric(df['sentiment_score'], errors='coerce')
+    # Peu de libellés de prix distincts : extraction sur chacun une seule fois
+    codes, libelles = pd.factorize(df['price/label'])
+    prix = pd.Series(libelles, dtype=object).str.extract(r'\$(\d+)', expand=False).astype(float)
+    df['price_numeric'] = np.append(prix.to_numpy(), np.nan)[codes]
+    return df
+
+
+def joindre_echantillons(textes, colonne, n=N_AVIS_ECHANTILLON):
+    """
+    Joint les n premiers textes de chaque logement, sans fonction Python par groupe
+
+    Les textes sont classés dans leur logement (`cumcount`), puis le rang 0,
+    le rang 1... sont concaténés colonne par colonne.
+
+    Args:
+        textes (DataFrame): 'id_listing' et `colonne` (textes non nuls, dans l'ordre du fichier)
+        colonne (str): Colonne des textes
+        n (int): Textes retenus par logement
+
+    Returns:
+        Series: id_listing -> textes joints par un espace
+    """
+    rangs = textes.groupby('id_listing').cumcount().to_numpy()
+    echantillons = textes.loc[rangs == 0].set_index('id_listing')[colonne]
+    for rang in range(1, n):
+        suite = ' ' + textes.loc[rangs == rang].set_index('id_listing')[colonne]
+        echantillons = echantillons + suite.reindex(echantillons.index, fill_value='')
+    return echantillons
+
+
+def agreger_avis(morceaux):
+    """
+    Agrège des morceaux d'avis par id_listing avec des accumulateurs
+
+    Par logement : premières valeurs non nulles, sommes et nombres de valeurs
+    (moyennes), nombre d'avis et au plus N_AVIS_ECHANTILLON textes. La mémoire
+    dépend de la taille d'un morceau et du nombre de logements, pas du fichier.
+    Le résultat est celui d'un `groupby('id_listing').agg(...)` sur le fichier
+    entier (moyennes à l'arrondi près).
+
+    Args:
+        morceaux (iterable): DataFrames d'avis (colonnes de TYPES_COLONNES_AVIS)
+
+    Returns:
+        DataFrame: Une ligne par id_listing (triés), colonnes de AGREGATIONS_AVIS
+    """
+    premieres = [c for c, a in AGREGATIONS_AVIS.items() if a == 'first']
+    moyennes = [c for c, a in AGREGATIONS_AVIS.items() if a == 'mean']
+    comptees = [c for c, a in AGREGATIONS_AVIS.items() if a == 'count']
+    texte = next(c for c, a in AGREGATIONS_AVIS.items() if a == 'echantillon')
+
+    valeurs_premieres = sommes = nombres = comptes = None
+    textes = pd.DataFrame(columns=['id_listing', texte])
+    for morceau in morceaux:
+        morceau = preparer_morceau(morceau)
+        groupes = morceau.groupby('id_listing', sort=False)
+        if valeurs_premieres is None:
+            valeurs_premieres = groupes[premieres].first()
+            sommes, nombres = groupes[moyennes].sum(), groupes[moyennes].count()
+            comptes = groupes[comptees].count()
+        else:
+            # Valeurs déjà vues prioritaires : seules les cases encore nulles sont complétées
+            valeurs_premieres = valeurs_premieres.combine_first(groupes[premieres].first())
+            sommes = sommes.add(groupes[moyennes].sum(), fill_value=0)
+            nombres = nombres.add(groupes[moyennes].count(), fill_value=0)
+            comptes = comptes.add(groupes[comptees].count(), fill_value=0)
+
+        # Premiers textes non nuls de chaque logement, dans l'ordre du fichier
+        nouveaux = morceau.loc[morceau[texte].notna(), ['id_listing', texte]]
+        textes = pd.concat([textes, nouveaux], ignore_index=True) if len(textes) else nouveaux
+        textes = textes[textes.groupby('id_listing').cumcount() < N_AVIS_ECHANTILLON]
+
+    if valeurs_premieres is None:
+        return pd.DataFrame(columns=['id_listing', *AGREGATIONS_AVIS])
+
+    index = valeurs_premieres.index.sort_values()
+    echantillons = joindre_echantillons(textes, texte)
+    colonnes = {}
+    for colonne, agregation in AGREGATIONS_AVIS.items():
+        if agregation == 'first':
+            colonnes[colonne] = valeurs_premieres[colonne].reindex(index)
+        elif agregation == 'mean':
+            colonnes[colonne] = (sommes[colonne] / nombres[colonne]).reindex(index)
+        elif agregation == 'count':
+            colonnes[colonne] = comptes[colonne].reindex(index).astype('int64')
+        else:
+            colonnes[colonne] = echantillons.reindex(index, fill_value='')
+    return pd.DataFrame(colonnes, index=index).rename_axis('id_listing').reset_index()
+
+
 class ChatbotHebergement:
     """
     Chatbot intelligent pour la sélection d'hébergements Airbnb
     """
     
-    def __init__(self, data_file='all_reviews_final.csv'):
+    def __init__(self, data_file='all_reviews_final.csv', taille_morceaux=TAILLE_MORCEAUX,
+                 poids_qualite=None, cache_listings=True, mots_cles=None):
         """
         Initialise le chatbot avec les données d'hébergements
         
         Args:
             data_file (str): Chemin vers le fichier de données CSV
+            taille_morceaux (int): Avis lus à la fois dans le CSV
+            poids_qualite (dict): Poids du score de qualité par colonne (défaut : POIDS_QUALITE)
+            cache_listings (bool): Relire / écrire la table préparée à côté du CSV
+            mots_cles (dict): Mots-clés de l'analyse des requêtes (défaut : KEYWORDS_CONFIG ;
+                MOTS_CLES pour le vocabulaire restreint d'origine)
         """
         self.data_file = data_file
+        self.taille_morceaux = taille_morceaux
+        self.poids_qualite = dict(poids_qualite or POIDS_QUALITE)
+        self.cache_listings = cache_listings
         self.listings = None
-        self.reviews = None
+        self.partitions = None
+        self._reviews = None
         self.conversation_history = []
         
-        # Mots-clés pour l'analyse des requêtes
-        self.location_keywords = {
-            'hammamet': ['hammamet', 'hammamat', 'hammet', 'hamam'],
-            'jerba': ['jerba', 'djerba', 'gerba', 'jerb']
-        }
-        
-        self.quality_keywords = {
-            'propre': ['propre', 'propreté', 'clean', 'cleanliness', 'hygiène'],
-            'communication': ['communication', 'réactif', 'responsive', 'contact', 'hôte'],
-            'localisation': ['localisation', 'location', 'plage', 'beach', 'centre', 'proche'],
-            'prix': ['prix', 'price', 'budget', 'cher', 'économique', 'abordable'],
-            'moderne': ['moderne', 'modern', 'neuf', 'nouveau', 'récent'],
-            'confort': ['confort', 'comfortable', 'lit', 'bed', 'équipé']
-        }
-        
-        self.sentiment_keywords = {
-            'positif': ['bon', 'excellent', 'parfait', 'recommande', 'super', 'génial'],
-            'négatif': ['mauvais', 'décevant', 'problème', 'sale', 'bruyant']
-        }
+        # Mots-clés pour l'analyse des requêtes, compilés une fois en un automate
+        mots_cles = mots_cles or KEYWORDS_CONFIG
+        self.location_keywords = mots_cles['location_keywords']
+        self.quality_keywords = mots_cles['quality_keywords']
+        self.sentiment_keywords = mots_cles['sentiment_keywords']
+        self.rating_keywords = mots_cles['rating_keywords']
+        self.detecteur_mots_cles = DetecteurMotsCles({
+            'location_keywords': self.location_keywords,
+            'quality_keywords': self.quality_keywords,
+            'sentiment_keywords': self.sentiment_keywords,
+            'rating_keywords': self.rating_keywords
+        })
         
         # Chargement des données
         self.load_data()
     
+    @property
+    def reviews(self):
+        """Avis complets (toutes les colonnes), lus à la première utilisation seulement"""
+        if self._reviews is None and self.listings is not None:
+            self._reviews = preparer_morceau(pd.read_csv(self.data_file))
+        return self._reviews
+    
     def load_data(self):
         """Charge et prépare les données d'hébergements"""
         try:
-            print(f"📂 Chargement des données depuis {self.data_file}...")
-            df = pd.read_csv(self.data_file)
-            print(f"✅ Dataset chargé : {len(df):,} avis")
-            
-            # Nettoyage des données
-            df['rating_listing'] = pd.to_numeric(df['rating_listing'], errors='coerce')
-            df['sentiment_score'] = pd.to_numeric(df['sentiment_score'], errors='coerce')
-            df['price_numeric'] = df['price/label'].str.extract(r'\$(\d+)').astype(float)
+            if self.cache_listings:
+                self.listings = lire_cache_listings(self.data_file, self.poids_qualite)
+                if self.listings is not None:
+                    print(f"✅ Données préparées relues du cache : {len(self.listings)} logements uniques")
+                    self.partitions = PartitionsLogements(self.listings, tuple(COLONNES_FOCUS.values()))
+                    return
             
-            # Création d'un dataset agrégé par logement
-            self.listings = df.groupby('id_listing').agg({
-                'title': 'first',
-                'description': 'first',
-                'city_listing': 'first',
-                'rating_listing': 'first',
-                'rating/cleanliness': 'first',
-                'rating/accuracy': 'first',
-                'rating/communication': 'first',
-                'rating/location': 'first',
-                'rating/value': 'first',
-                'price/label': 'first',
-                'price_numeric': 'first',
-                'coordinates/latitude': 'first',
-                'coordinates/longitude': 'first',
-                'sentiment_score': 'mean',
-                'rating_review': 'mean',
-                'localizedText': lambda x: ' '.join(x.dropna().astype(str)[:3]),
-                'id_review': 'count'
-            }).reset_index()
+            print(f"📂 Chargement des données depuis {self.data_file}...")
+            etat_source = etat_fichier(self.data_file)
+            # Lecture par morceaux des seules colonnes utiles, agrégées au fil de l'eau
+            morceaux = pd.read_csv(self.data_file, usecols=list(TYPES_COLONNES_AVIS),
+                                   dtype=TYPES_COLONNES_AVIS, chunksize=self.taille_morceaux)
+            self.listings = agreger_avis(morceaux)
+            print(f"✅ Dataset chargé : {self.listings['id_review'].sum():,} avis")
             
             # Renommage des colonnes
             self.listings.rename(columns={
@@ -108,24 +312,23 @@ class ChatbotHebergement:
             }, inplace=True)
             
             # Calcul d'un score de qualité global
-            self.listings['quality_score'] = (
-                self.listings['rating_listing'].fillna(0) * 0.3 +
-                self.listings['sentiment_score'].fillna(0) * 0.3 +
-                self.listings['avg_review_rating'].fillna(0) * 0.2 +
-                self.listings['rating/cleanliness'].fillna(0) * 0.2
+            self.listings['quality_score'] = sum(
+                self.listings[colonne].fillna(0) * poids for colonne, poids in self.poids_qualite.items()
             )
             
-            self.reviews = df
             print(f"✅ Données préparées : {len(self.listings)} logements uniques")
+            if self.cache_listings:
+                ecrire_cache_listings(self.listings, self.data_file, self.poids_qualite, etat_source)
+            self.partitions = PartitionsLogements(self.listings, tuple(COLONNES_FOCUS.values()))
             
         except FileNotFoundError:
             print(f"❌ Fichier {self.data_file} non trouvé")
             self.listings = None
-            self.reviews = None
+            self.partitions = None
         except Exception as e:
             print(f"❌ Erreur lors du chargement : {str(e)}")
             self.listings = None
-            self.reviews = None
+            self.partitions = None
     
     def analyze_query(self, query):
         """
@@ -146,28 +349,25 @@ class ChatbotHebergement:
             'min_rating': None
         }
         
-        # Détection de la ville
-        for city, keywords in self.location_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                criteria['city'] = city.title()
-                break
+        # Villes, critères, sentiments et niveaux de note trouvés en un passage sur la requête
+        trouvees = self.detecteur_mots_cles.detecter(query_lower)
+        
+        # Détection de la ville (la première de la configuration l'emporte)
+        if trouvees['location_keywords']:
+            criteria['city'] = trouvees['location_keywords'][0].title()
         
         # Détection des critères de qualité
-        for quality, keywords in self.quality_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                criteria['quality_focus'].append(quality)
+        criteria['quality_focus'] = trouvees['quality_keywords']
         
         # Détection du sentiment
-        for sentiment, keywords in self.sentiment_keywords.items():
-            if any(keyword in query_lower for keyword in keywords):
-                criteria['sentiment_filter'] = sentiment
-                break
+        if trouvees['sentiment_keywords']:
+            criteria['sentiment_filter'] = trouvees['sentiment_keywords'][0]
         
         # Détection de critères de rating
-        if any(word in query_lower for word in ['meilleur', 'top', 'excellent']):
-            criteria['min_rating'] = 3.5  # Abaissé pour plus de résultats
-        elif any(word in query_lower for word in ['bon', 'bien', 'qualité']):
-            criteria['min_rating'] = 3.0  # Abaissé pour plus de résultats
+        for niveau in trouvees['rating_keywords']:
+            if niveau in SEUILS_NOTE:
+                criteria['min_rating'] = SEUILS_NOTE[niveau]
+                break
         
         return criteria
     
@@ -184,57 +384,92 @@ class ChatbotHebergement:
         if self.listings is None:
             return pd.DataFrame()
         
-        filtered = self.listings.copy()
-        
-        # Filtre par ville
-        if criteria['city']:
-            filtered = filtered[filtered['city_listing'].str.contains(criteria['city'], case=False, na=False)]
+        return self.listings.iloc[self._positions_filtrees(criteria)]
+    
+    def _positions_filtrees(self, criteria):
+        """Positions des logements retenus par filter_listings (ordre de la table)"""
+        return self.partitions.filtrer(
+            # Filtre par ville
+            ville=criteria['city'],
+            # Filtre par rating minimum
+            qualite_min=criteria['min_rating'] or None,
+            # Filtre par sentiment
+            sentiment_min=SEUIL_SENTIMENT_POSITIF if criteria['sentiment_filter'] == 'positif' else None,
+            sentiment_max=SEUIL_SENTIMENT_NEGATIF if criteria['sentiment_filter'] == 'négatif' else None
+        )
+    
+    def _poids_focus(self, criteria):
+        """Poids de chaque note détaillée (colonnes de COLONNES_FOCUS) selon les critères de qualité demandés"""
+        poids = np.zeros(len(COLONNES_FOCUS), dtype=np.float32)
+        for j, focus in enumerate(COLONNES_FOCUS):
+            if focus in criteria['quality_focus']:
+                poids[j] = POIDS_FOCUS
+        return poids
+    
+    def _classer(self, qualite, notes, criteria, top_n):
+        """
+        Classe des logements par score de qualité, augmenté des notes détaillées demandées
         
-        # Filtre par rating minimum
-        if criteria['min_rating']:
-            filtered = filtered[filtered['quality_score'] >= criteria['min_rating']]
+        Args:
+            qualite (ndarray): quality_score des logements
+            notes (ndarray): Notes détaillées (float32, colonnes de COLONNES_FOCUS)
+            criteria (dict): Critères de classement
+            top_n (int): Logements gardés
+            
+        Returns:
+            tuple: (indices classés, scores personnalisés ou None sans critère de qualité)
+        """
+        if not criteria['quality_focus']:
+            return meilleurs(qualite, top_n), None
         
-        # Filtre par sentiment
-        if criteria['sentiment_filter'] == 'positif':
-            filtered = filtered[filtered['sentiment_score'] >= 0.7]
-        elif criteria['sentiment_filter'] == 'négatif':
-            filtered = filtered[filtered['sentiment_score'] <= 0.3]
+        # Un seul produit matrice-vecteur pour tous les critères demandés
+        score = qualite + notes @ self._poids_focus(criteria)
+        ordre = meilleurs(score, top_n)
+        return ordre, score[ordre]
+    
+    def _meilleures_positions(self, positions, criteria, top_n):
+        """
+        Classe des positions de la table et garde les top_n
         
-        return filtered
+        Returns:
+            tuple: (positions classées, scores personnalisés ou None sans critère de qualité)
+        """
+        ordre, scores = self._classer(self.partitions.qualite[positions], self.partitions.notes[positions],
+                                      criteria, top_n)
+        return positions[ordre], scores
     
-    def rank_by_criteria(self, filtered_listings, criteria):
+    def rank_by_criteria(self, filtered_listings, criteria, top_n=None):
         """
         Classe les logements selon les critères de qualité demandés
         
         Args:
             filtered_listings (DataFrame): Logements filtrés
             criteria (dict): Critères de classement
+            top_n (int): Logements gardés (défaut : tous)
             
         Returns:
-            DataFrame: Logements classés
+            DataFrame: Logements classés (avec 'custom_score' si des critères de qualité sont demandés)
         """
         if filtered_listings.empty:
             return filtered_listings
         
-        if not criteria['quality_focus']:
-            return filtered_listings.sort_values('quality_score', ascending=False)
-        
-        # Calcul d'un score pondéré selon les critères
-        score = filtered_listings['quality_score'].copy()
-        
-        for focus in criteria['quality_focus']:
-            if focus == 'propre' and 'rating/cleanliness' in filtered_listings.columns:
-                score += filtered_listings['rating/cleanliness'].fillna(0) * 0.5
-            elif focus == 'communication' and 'rating/communication' in filtered_listings.columns:
-                score += filtered_listings['rating/communication'].fillna(0) * 0.5
-            elif focus == 'localisation' and 'rating/location' in filtered_listings.columns:
-                score += filtered_listings['rating/location'].fillna(0) * 0.5
-            elif focus == 'prix' and 'rating/value' in filtered_listings.columns:
-                score += filtered_listings['rating/value'].fillna(0) * 0.5
-        
-        filtered_listings = filtered_listings.copy()
-        filtered_listings['custom_score'] = score
-        return filtered_listings.sort_values('custom_score', ascending=False)
+        top_n = len(filtered_listings) if top_n is None else top_n
+        positions = None
+        if self.partitions is not None and 'id_listing' in filtered_listings.columns:
+            positions = self.listings.index.get_indexer(filtered_listings.index)
+            if (positions < 0).any() or not np.array_equal(
+                    self.listings['id_listing'].to_numpy()[positions], filtered_listings['id_listing'].to_numpy()):
+                positions = None
+        if positions is not None:
+            # Lignes de self.listings (filter_listings) : notes de la matrice précalculée
+            qualite, notes = self.partitions.qualite[positions], self.partitions.notes[positions]
+        else:
+            qualite = filtered_listings['quality_score'].to_numpy(dtype=np.float64)
+            notes = matrice_notes(filtered_listings, tuple(COLONNES_FOCUS.values()))
+        
+        ordre, scores = self._classer(qualite, notes, criteria, top_n)
+        classes = filtered_listings.iloc[ordre]
+        return classes if scores is None else classes.assign(custom_score=scores)
     
     def format_listing_info(self, listing, rank):
         """
@@ -304,12 +539,11 @@ class ChatbotHebergement:
         # Analyse de la requête
         criteria = self.analyze_query(query)
         
-        # Filtrage et classement
-        filtered = self.filter_listings(criteria)
-        ranked = self.rank_by_criteria(filtered, criteria)
-        
-        # Sélection des top résultats
-        top_results = ranked.head(top_n)
+        # Filtrage et classement sur les positions : seuls les top_n logements sont extraits
+        positions, scores = self._meilleures_positions(self._positions_filtrees(criteria), criteria, top_n)
+        top_results = self.listings.iloc[positions]
+        if scores is not None:
+            top_results = top_results.assign(custom_score=scores)
         
         # Génération de la réponse
         if len(top_results) == 0:
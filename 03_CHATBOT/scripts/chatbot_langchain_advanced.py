@@ -24,6 +24,11 @@ warnings.filterwarnings('ignore')
 
 # Ajouter le chemin du projet
 sys.path.append(os.path.dirname(os.path.dirname(os.path.dirname(__file__))))
+# Cache des embeddings partagé avec le système de recommandation
+sys.path.append(os.path.join(os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__)))),
+                             '02_SYSTEME_RECOMMANDATION', 'scripts'))
+from cache_embeddings import CacheEmbeddings
+from encodeur_onnx import charger_modele_embeddings, identifiant_modele_charge
 
 try:
     # LangChain imports (versions mises à jour)
@@ -39,6 +44,11 @@ try:
         from langchain.vectorstores import FAISS
         from langchain.document_loaders import DataFrameLoader
     
+    try:
+        from langchain_core.embeddings import Embeddings
+    except ImportError:
+        from langchain.embeddings.base import Embeddings
+    
     from langchain.memory import ConversationBufferMemory
     from langchain.chains import ConversationalRetrievalChain
     from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -67,6 +77,7 @@ except ImportError as e:
     print(f"⚠️ Certaines dépendances manquent : {e}")
     print("📦 Installez avec : pip install langchain transformers torch gradio")
     LANGCHAIN_AVAILABLE = False
+    Embeddings = object
 
 
 class AirbnbChatbotConfig:
@@ -89,6 +100,11 @@ class AirbnbChatbotConfig:
     
     # Embeddings pour la recherche sémantique
     EMBEDDING_MODEL = 'sentence-transformers/paraphrase-multilingual-MiniLM-L12-v2'
+    EMBEDDING_CACHE_MB = 64
+    # 'onnx' : modèle exporté en ONNX int8 (repli automatique sur PyTorch)
+    EMBEDDING_BACKEND = os.environ.get('EMBEDDING_BACKEND', 'torch')
+    # Cache disque conservé entre les redémarrages (même dossier que le recommandeur)
+    EMBEDDING_CACHE_DIR = os.environ.get('RECO_EMBEDDING_CACHE_DIR')
     
     # Prompts en français
     SYSTEM_PROMPT = """
@@ -105,6 +121,30 @@ class AirbnbChatbotConfig:
     """
 
 
+class EmbeddingsEnCache(Embeddings):
+    """
+    Embeddings LangChain servis par le cache partagé (cache_embeddings.py) :
+    seuls les textes jamais vus sont encodés par le modèle
+    """
+    
+    def __init__(self, base, modele: str, taille_memoire_mo: float = 64, dossier: Optional[str] = None):
+        """
+        Args:
+            base: Embeddings LangChain à mettre en cache (HuggingFaceEmbeddings ou EncodeurOnnx)
+            modele (str): Nom du modèle, clé du cache
+            taille_memoire_mo (float): Taille du cache mémoire en Mo
+            dossier (str): Dossier du cache disque, ou None
+        """
+        self.base = base
+        self.cache = CacheEmbeddings(modele, base.embed_documents, taille_memoire_mo, dossier)
+    
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self.cache.encoder(texts).tolist()
+    
+    def embed_query(self, text: str) -> List[float]:
+        return self.cache.encoder([text])[0].tolist()
+
+
 class AirbnbLangChainChatbot:
     """
     Chatbot Airbnb utilisant LangChain et HuggingFace
@@ -120,6 +160,7 @@ class AirbnbLangChainChatbot:
         self.config = AirbnbChatbotConfig()
         self.conversation_history = []
         self.model_size = model_size
+        self.embeddings = None
         
         if LANGCHAIN_AVAILABLE:
             self._initialize_components()
@@ -258,14 +299,24 @@ class AirbnbLangChainChatbot:
             )
             texts = text_splitter.split_documents(documents)
             
-            # Créer les embeddings
-            embeddings = HuggingFaceEmbeddings(
-                model_name=self.config.EMBEDDING_MODEL,
-                model_kwargs={'device': 'cpu'}  # Utiliser CPU pour la compatibilité
+            # Créer les embeddings (en cache : les questions répétées ne sont pas ré-encodées)
+            base = charger_modele_embeddings(
+                self.config.EMBEDDING_MODEL,
+                self.config.EMBEDDING_BACKEND,
+                repli=lambda: HuggingFaceEmbeddings(
+                    model_name=self.config.EMBEDDING_MODEL,
+                    model_kwargs={'device': 'cpu'}  # Utiliser CPU pour la compatibilité
+                )
+            )
+            self.embeddings = EmbeddingsEnCache(
+                base,
+                identifiant_modele_charge(base, self.config.EMBEDDING_MODEL),
+                taille_memoire_mo=self.config.EMBEDDING_CACHE_MB,
+                dossier=self.config.EMBEDDING_CACHE_DIR
             )
             
             # Créer la base vectorielle FAISS
-            vectorstore = FAISS.from_documents(texts, embeddings)
+            vectorstore = FAISS.from_documents(texts, self.embeddings)
             
             print(f"✅ Base de connaissances créée avec {len(texts)} documents")
             return vectorstore
@@ -433,13 +484,16 @@ class AirbnbLangChainChatbot:
             Dict: Statistiques d'utilisation
         """
         history = self.get_conversation_history()
+        # Taux de succès et temps économisé par le cache des embeddings
+        embedding_cache = self.embeddings.cache.statistiques() if self.embeddings else None
         
         if not history:
             return {
                 "total_conversations": 0,
                 "avg_confidence": 0.0,
                 "total_sources_used": 0,
-                "langchain_enabled": LANGCHAIN_AVAILABLE
+                "langchain_enabled": LANGCHAIN_AVAILABLE,
+                "embedding_cache": embedding_cache
             }
         
         confidences = [conv.get("confidence", 0) for conv in history if "confidence" in conv]
@@ -449,7 +503,8 @@ class AirbnbLangChainChatbot:
             "total_conversations": len(history),
             "avg_confidence": np.mean(confidences) if confidences else 0.0,
             "total_sources_used": sum(sources),
-            "langchain_enabled": LANGCHAIN_AVAILABLE and self.conversation_chain is not None
+            "langchain_enabled": LANGCHAIN_AVAILABLE and self.conversation_chain is not None,
+            "embedding_cache": embedding_cache
         }
 
 
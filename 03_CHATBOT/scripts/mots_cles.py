@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Détection des mots-clés d'une requête en un seul passage
+========================================================
+
+`DetecteurMotsCles` compile une fois toutes les listes de mots-clés
+(MOTS_CLES du chatbot : villes, critères de qualité, sentiments, niveaux de note)
+en un automate d'Aho-Corasick. La requête est parcourue une seule fois,
+caractère par caractère : le coût dépend de la longueur de la requête et
+du nombre de catégories trouvées, pas du nombre de mots-clés.
+
+Même règle qu'un test `mot in requete` par mot-clé : un mot-clé est trouvé
+s'il apparaît n'importe où dans le texte, y compris à l'intérieur d'un mot
+ou en chevauchant un autre mot-clé.
+"""
+
+
+class DetecteurMotsCles:
+    """
+    Automate d'Aho-Corasick sur des mots-clés regroupés par catégorie
+    """
+
+    def __init__(self, groupes):
+        """
+        Args:
+            groupes (dict): groupe -> {catégorie: [mots-clés]}, par exemple
+                {'location_keywords': {'jerba': ['jerba', 'djerba']}, ...}
+        """
+        # Une catégorie = un indice, dans l'ordre des dictionnaires
+        self.categories = [(groupe, categorie) for groupe, categories in groupes.items()
+                           for categorie in categories]
+        self.groupes = list(groupes)
+        self._transitions = [{}]
+        sorties = [set()]
+
+        for indice, (groupe, categorie) in enumerate(self.categories):
+            for mot in groupes[groupe][categorie]:
+                etat = 0
+                for caractere in mot:
+                    suivant = self._transitions[etat].get(caractere)
+                    if suivant is None:
+                        suivant = len(self._transitions)
+                        self._transitions[etat][caractere] = suivant
+                        self._transitions.append({})
+                        sorties.append(set())
+                    etat = suivant
+                sorties[etat].add(indice)
+
+        # Liens d'échec en largeur : chaque état hérite des sorties de son suffixe
+        # le plus long, les mots-clés contenus dans un autre sont donc aussi trouvés
+        self._echecs = [0] * len(self._transitions)
+        file = list(self._transitions[0].values())
+        for etat in file:
+            for caractere, suivant in self._transitions[etat].items():
+                echec = self._echecs[etat]
+                while echec and caractere not in self._transitions[echec]:
+                    echec = self._echecs[echec]
+                self._echecs[suivant] = self._transitions[echec].get(caractere, 0)
+                sorties[suivant] |= sorties[self._echecs[suivant]]
+                file.append(suivant)
+        self._sorties = [frozenset(s) for s in sorties]
+
+    def __len__(self):
+        return len(self._transitions)
+
+    def detecter(self, texte):
+        """
+        Catégories dont au moins un mot-clé apparaît dans le texte
+
+        Args:
+            texte (str): Texte déjà normalisé (minuscules)
+
+        Returns:
+            dict: groupe -> catégories trouvées, dans l'ordre de la configuration
+        """
+        transitions, echecs, sorties = self._transitions, self._echecs, self._sorties
+        trouvees = set(sorties[0])
+        etat = 0
+        for caractere in texte:
+            while etat and caractere not in transitions[etat]:
+                etat = echecs[etat]
+            etat = transitions[etat].get(caractere, 0)
+            if sorties[etat]:
+                trouvees |= sorties[etat]
+
+        resultat = {groupe: [] for groupe in self.groupes}
+        for indice in sorted(trouvees):
+            groupe, categorie = self.categories[indice]
+            resultat[groupe].append(categorie)
+        return resultat
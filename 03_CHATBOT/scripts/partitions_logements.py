@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Partitions des logements pour le filtrage des requêtes du chatbot
+=================================================================
+
+Construit une fois au chargement de la table `listings` :
+- ville en catégorielle, avec les positions des lignes de chaque ville
+- ordre des logements par `quality_score` décroissant et par
+  `sentiment_score` croissant : un seuil devient une coupe (`searchsorted`)
+  dans l'ordre trié
+- notes détaillées (propreté, communication...) en matrice float32, valeurs
+  manquantes à 0, pour le classement
+
+`PartitionsLogements.filtrer` renvoie les positions des lignes retenues
+(intersection des tableaux de positions) ; seules les lignes finalement
+affichées sont extraites de la table.
+"""
+
+import numpy as np
+import pandas as pd
+
+
+def _croissantes(positions):
+    return np.sort(positions) if len(positions) > 1 else positions
+
+
+def matrice_notes(listings, colonnes):
+    """Colonnes de notes en matrice float32 (une ligne par logement), valeurs manquantes à 0"""
+    notes = np.zeros((len(listings), len(colonnes)), dtype=np.float32)
+    for j, colonne in enumerate(colonnes):
+        notes[:, j] = listings[colonne].to_numpy(dtype=np.float32, na_value=0)
+    return notes
+
+
+def meilleurs(scores, top_n):
+    """
+    Indices des top_n meilleurs scores, du meilleur au moins bon (ex aequo par indice)
+
+    Seuls les top_n sont triés : sélection par `argpartition` en O(n).
+    """
+    if top_n <= 0:
+        return np.empty(0, dtype=np.int64)
+    candidats = np.argpartition(-scores, top_n - 1)[:top_n] if len(scores) > top_n else np.arange(len(scores))
+    return candidats[np.lexsort((candidats, -scores[candidats]))]
+
+
+class PartitionsLogements:
+    """
+    Positions des logements par ville et par seuil de note / sentiment
+    """
+
+    def __init__(self, listings, colonnes_notes=()):
+        """
+        Args:
+            listings (DataFrame): Table préparée ('city_listing', 'quality_score', 'sentiment_score')
+            colonnes_notes (tuple): Notes détaillées utilisées pour le classement
+        """
+        self.n_logements = len(listings)
+        self.villes = pd.Categorical(listings['city_listing'])
+        codes = self.villes.codes
+        ordre_villes = np.argsort(codes, kind='stable')
+        bornes = np.searchsorted(codes[ordre_villes], np.arange(len(self.villes.categories) + 1))
+        self.positions_par_ville = {
+            ville: ordre_villes[debut:fin]
+            for ville, debut, fin in zip(self.villes.categories, bornes[:-1], bornes[1:])
+        }
+        self._villes_demandees = {}
+
+        # Qualité décroissante (ex aequo dans l'ordre de la table) ; clé croissante = -qualité
+        self.qualite = listings['quality_score'].to_numpy(dtype=np.float64)
+        self.ordre_qualite = np.argsort(-self.qualite, kind='stable')
+        self._cle_qualite = -self.qualite[self.ordre_qualite]
+
+        # Sentiment croissant, valeurs manquantes à la fin (exclues de tout seuil)
+        sentiment = listings['sentiment_score'].to_numpy(dtype=np.float64)
+        self.ordre_sentiment = np.argsort(sentiment, kind='stable')
+        self._sentiment_trie = sentiment[self.ordre_sentiment]
+        self._n_sentiments = int(np.count_nonzero(~np.isnan(sentiment)))
+
+        self.colonnes_notes = tuple(colonnes_notes)
+        self.notes = matrice_notes(listings, self.colonnes_notes)
+
+    def par_ville(self, ville):
+        """Positions (croissantes) des logements dont la ville contient `ville`, sans tenir compte de la casse"""
+        positions = self._villes_demandees.get(ville)
+        if positions is None:
+            categories = pd.Series(self.villes.categories, dtype=object)
+            retenues = categories[categories.str.contains(ville, case=False, na=False)]
+            positions = _croissantes(np.concatenate(
+                [self.positions_par_ville[c] for c in retenues] + [np.empty(0, dtype=np.int64)]))
+            self._villes_demandees[ville] = positions
+        return positions
+
+    def qualite_min(self, seuil):
+        """Positions des logements avec quality_score >= seuil, par qualité décroissante"""
+        return self.ordre_qualite[:np.searchsorted(self._cle_qualite, -seuil, side='right')]
+
+    def sentiment_min(self, seuil):
+        """Positions des logements avec sentiment_score >= seuil"""
+        debut = np.searchsorted(self._sentiment_trie[:self._n_sentiments], seuil, side='left')
+        return self.ordre_sentiment[debut:self._n_sentiments]
+
+    def sentiment_max(self, seuil):
+        """Positions des logements avec sentiment_score <= seuil"""
+        return self.ordre_sentiment[:np.searchsorted(self._sentiment_trie[:self._n_sentiments], seuil, side='right')]
+
+    def filtrer(self, ville=None, qualite_min=None, sentiment_min=None, sentiment_max=None):
+        """
+        Positions des logements qui respectent tous les filtres donnés
+
+        Args:
+            ville (str): Sous-chaîne de la ville (casse ignorée)
+            qualite_min (float): quality_score minimal
+            sentiment_min (float): sentiment_score minimal
+            sentiment_max (float): sentiment_score maximal
+
+        Returns:
+            ndarray: Positions croissantes (ordre de la table)
+        """
+        selections = []
+        if ville:
+            selections.append(self.par_ville(ville))
+        if qualite_min is not None:
+            selections.append(self.qualite_min(qualite_min))
+        if sentiment_min is not None:
+            selections.append(self.sentiment_min(sentiment_min))
+        if sentiment_max is not None:
+            selections.append(self.sentiment_max(sentiment_max))
+        if not selections:
+            return np.arange(self.n_logements)
+
+        # Intersection à partir de la plus petite sélection
+        selections.sort(key=len)
+        positions = _croissantes(selections[0])
+        for selection in selections[1:]:
+            if not len(positions):
+                break
+            positions = np.intersect1d(positions, selection, assume_unique=True)
+        return positions
@@ -5,7 +5,331 @@ Test du chatbot d'hébergements
 """
 
 import pandas as pd
+import numpy as np
 import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                '03_CHATBOT', 'scripts'))
+
+
+def _avis_synthetiques(n_avis=2000, n_logements=150, graine=0):
+    """Petit all_reviews_final.csv synthétique (valeurs manquantes et invalides comprises)"""
+    rng = np.random.default_rng(graine)
+    def _trous(valeurs, part=0.2):
+        valeurs = pd.Series(valeurs, dtype=object)
+        valeurs[rng.random(len(valeurs)) < part] = None
+        return valeurs
+    ids = rng.integers(10**17, 10**17 + n_logements, n_avis)
+    return pd.DataFrame({
+        'id_listing': ids,
+        'id_review': _trous([f"r{i}" for i in range(n_avis)], 0.05),
+        'title': _trous([f"Appartement {i % 97}" for i in ids]),
+        'description': _trous([f"Description {i}" for i in range(n_avis)]),
+        'city_listing': _trous(np.where(ids % 2, 'Hammamet', 'Jerba')),
+        'rating_listing': _trous(np.where(rng.random(n_avis) < 0.05, 'N/A',
+                                          np.round(rng.uniform(3, 5, n_avis), 2).astype(str))),
+        'sentiment_score': _trous(rng.random(n_avis)),
+        'rating_review': _trous(rng.integers(1, 6, n_avis)),
+        'rating/cleanliness': _trous(rng.uniform(3, 5, n_avis)),
+        'rating/accuracy': _trous(rng.uniform(3, 5, n_avis)),
+        'rating/communication': _trous(rng.uniform(3, 5, n_avis)),
+        'rating/location': _trous(rng.uniform(3, 5, n_avis)),
+        'rating/value': _trous(rng.uniform(3, 5, n_avis)),
+        'price/label': _trous([f"${p} par nuit" if p % 5 else "Prix libre" for p in rng.integers(20, 300, n_avis)]),
+        'coordinates/latitude': _trous(rng.uniform(33, 37, n_avis)),
+        'coordinates/longitude': _trous(rng.uniform(9, 11, n_avis)),
+        'localizedText': _trous([f"Avis numéro {i}" for i in range(n_avis)], 0.4),
+        'host_name': 'colonne non lue'
+    })
+
+
+def _listings_reference(chemin):
+    """Agrégation d'origine : tout le CSV en mémoire puis groupby avec une lambda"""
+    df = pd.read_csv(chemin)
+    df['rating_listing'] = pd.to_numeric(df['rating_listing'], errors='coerce')
+    df['sentiment_score'] = pd.to_numeric(df['sentiment_score'], errors='coerce')
+    df['price_numeric'] = df['price/label'].str.extract(r'\$(\d+)').astype(float)
+    return df.groupby('id_listing').agg({
+        'title': 'first', 'description': 'first', 'city_listing': 'first', 'rating_listing': 'first',
+        'rating/cleanliness': 'first', 'rating/accuracy': 'first', 'rating/communication': 'first',
+        'rating/location': 'first', 'rating/value': 'first', 'price/label': 'first',
+        'price_numeric': 'first', 'coordinates/latitude': 'first', 'coordinates/longitude': 'first',
+        'sentiment_score': 'mean', 'rating_review': 'mean',
+        'localizedText': lambda x: ' '.join(x.dropna().astype(str)[:3]),
+        'id_review': 'count'
+    }).reset_index()
+
+
+def test_chargement_par_morceaux():
+    """Le chargement par morceaux produit la même table `listings` que le chargement complet"""
+    print("🧪 Test du chargement par morceaux...")
+    from chatbot_hebergement import ChatbotHebergement, agreger_avis
+
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, 'all_reviews_final.csv')
+        _avis_synthetiques().to_csv(chemin, index=False)
+        reference = _listings_reference(chemin)
+
+        for taille in (60, 500, 100_000):
+            chatbot = ChatbotHebergement(chemin, taille_morceaux=taille, cache_listings=False)
+            attendu = reference.rename(columns={'id_review': 'review_count', 'rating_review': 'avg_review_rating',
+                                                'localizedText': 'sample_reviews'})
+            pd.testing.assert_frame_equal(chatbot.listings.drop(columns='quality_score'), attendu)
+        assert chatbot.listings['review_count'].dtype == np.int64
+        # Avis complets lus seulement à la demande
+        assert chatbot._reviews is None and len(chatbot.reviews) == 2000
+
+        assert agreger_avis([]).empty
+    print("   ✅ Chargement par morceaux OK")
+
+
+def test_agregation_vectorisee():
+    """Échantillon d'avis joint sans lambda : même résultat que l'agrégation d'origine"""
+    print("🧪 Test de l'agrégation vectorisée...")
+    from benchmark_chargement import comparer, generer_avis
+    from chatbot_hebergement import joindre_echantillons
+
+    textes = pd.DataFrame({'id_listing': [2, 1, 2, 2, 1, 2], 'avis': list('abcdef')})
+    assert joindre_echantillons(textes, 'avis').sort_index().to_dict() == {1: 'b e', 2: 'a c d'}
+
+    # comparer() vérifie que les deux tables sont identiques
+    resultats = comparer(generer_avis(5000, 300), repetitions=1)
+    assert resultats['logements'] == 300
+    print("   ✅ Agrégation vectorisée OK")
+
+
+def test_cache_listings():
+    """Table préparée relue du cache tant que le CSV et les poids sont inchangés"""
+    print("🧪 Test du cache des logements...")
+    import contextlib
+    import io
+    from cache_listings import PYARROW_AVAILABLE, chemin_cache
+    from chatbot_hebergement import ChatbotHebergement
+
+    if not PYARROW_AVAILABLE:
+        print("   ⚠️ pyarrow non installé, test ignoré")
+        return
+
+    def _charger(chemin, **options):
+        sortie = io.StringIO()
+        with contextlib.redirect_stdout(sortie):
+            chatbot = ChatbotHebergement(chemin, **options)
+        return chatbot, 'relues du cache' in sortie.getvalue()
+
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, 'all_reviews_final.csv')
+        _avis_synthetiques().to_csv(chemin, index=False)
+
+        premier, depuis_cache = _charger(chemin)
+        assert not depuis_cache and os.path.exists(chemin_cache(chemin))
+        second, depuis_cache = _charger(chemin)
+        assert depuis_cache and second._reviews is None
+        pd.testing.assert_frame_equal(second.listings, premier.listings)
+
+        # Date modifiée, contenu identique : l'empreinte valide encore le cache
+        os.utime(chemin, ns=(0, 10**18))
+        assert _charger(chemin)[1]
+
+        # Autres poids : score recalculé
+        poids = {'rating_listing': 0.5, 'sentiment_score': 0.5}
+        autres_poids, depuis_cache = _charger(chemin, poids_qualite=poids)
+        assert not depuis_cache
+        assert not np.allclose(autres_poids.listings['quality_score'], premier.listings['quality_score'])
+        assert _charger(chemin, poids_qualite=poids)[1]
+        assert not _charger(chemin)[1]
+
+        # CSV modifié : cache ignoré puis réécrit
+        avis = _avis_synthetiques()
+        pd.concat([avis, avis.head(1).assign(id_listing=1)]).to_csv(chemin, index=False)
+        modifie, depuis_cache = _charger(chemin)
+        assert not depuis_cache and len(modifie.listings) == len(premier.listings) + 1
+        assert _charger(chemin)[1]
+    print("   ✅ Cache des logements OK")
+
+
+def _analyse_origine(query):
+    """analyze_query d'origine : un test de sous-chaîne par mot-clé, listes d'origine"""
+    location_keywords = {
+        'hammamet': ['hammamet', 'hammamat', 'hammet', 'hamam'],
+        'jerba': ['jerba', 'djerba', 'gerba', 'jerb']
+    }
+    quality_keywords = {
+        'propre': ['propre', 'propreté', 'clean', 'cleanliness', 'hygiène'],
+        'communication': ['communication', 'réactif', 'responsive', 'contact', 'hôte'],
+        'localisation': ['localisation', 'location', 'plage', 'beach', 'centre', 'proche'],
+        'prix': ['prix', 'price', 'budget', 'cher', 'économique', 'abordable'],
+        'moderne': ['moderne', 'modern', 'neuf', 'nouveau', 'récent'],
+        'confort': ['confort', 'comfortable', 'lit', 'bed', 'équipé']
+    }
+    sentiment_keywords = {
+        'positif': ['bon', 'excellent', 'parfait', 'recommande', 'super', 'génial'],
+        'négatif': ['mauvais', 'décevant', 'problème', 'sale', 'bruyant']
+    }
+    query_lower = query.lower()
+    criteria = {'city': None, 'quality_focus': [], 'sentiment_filter': None,
+                'price_range': None, 'min_rating': None}
+    for city, keywords in location_keywords.items():
+        if any(keyword in query_lower for keyword in keywords):
+            criteria['city'] = city.title()
+            break
+    for quality, keywords in quality_keywords.items():
+        if any(keyword in query_lower for keyword in keywords):
+            criteria['quality_focus'].append(quality)
+    for sentiment, keywords in sentiment_keywords.items():
+        if any(keyword in query_lower for keyword in keywords):
+            criteria['sentiment_filter'] = sentiment
+            break
+    if any(word in query_lower for word in ['meilleur', 'top', 'excellent']):
+        criteria['min_rating'] = 3.5
+    elif any(word in query_lower for word in ['bon', 'bien', 'qualité']):
+        criteria['min_rating'] = 3.0
+    return criteria
+
+
+def test_mots_cles():
+    """Automate de mots-clés : mêmes catégories que les tests de sous-chaînes d'origine"""
+    print("🧪 Test de la détection des mots-clés...")
+    from benchmark_mots_cles import comparer
+    from chatbot_hebergement import KEYWORDS_CONFIG, MOTS_CLES, ChatbotHebergement
+    from mots_cles import DetecteurMotsCles
+
+    detecteur = DetecteurMotsCles({
+        'villes': {'jerba': ['jerb', 'djerba'], 'hammamet': ['hamam']},
+        'notes': {'excellent': ['top'], 'good': ['bon', 'on']}
+    })
+    # Mots-clés contenus dans un autre, chevauchants ou à l'intérieur d'un mot
+    assert detecteur.detecter('bonjour djerba') == {'villes': ['jerba'], 'notes': ['good']}
+    assert detecteur.detecter('stop hamamet') == {'villes': ['hammamet'], 'notes': ['excellent']}
+    assert detecteur.detecter('') == {'villes': [], 'notes': []}
+
+    # comparer() vérifie que les catégories trouvées sont identiques
+    comparer(n_mots_cles=2000, n_requetes=300, repetitions=1)
+
+    chatbot = ChatbotHebergement('fichier_absent.csv', cache_listings=False)
+    criteres = chatbot.analyze_query("Le meilleur appartement propre près de la plage à Djerba, super hôte")
+    assert criteres['city'] == 'Jerba' and criteres['min_rating'] == 3.5
+    assert criteres['quality_focus'] == ['propre', 'communication', 'localisation']
+    assert criteres['sentiment_filter'] == 'positif'
+    # Avec les listes d'origine : mêmes critères que la boucle d'origine de analyze_query
+    origine = ChatbotHebergement('fichier_absent.csv', cache_listings=False, mots_cles=MOTS_CLES)
+    for requete in ("top logement à Jerba", "appartement parfait", "logement accessible design",
+                    "studio agréable", "un logement correct", "Bon séjour à Hammamet, lit confortable",
+                    "Meilleur prix, hôte réactif mais bruyant", "djerbahammamet", ""):
+        assert origine.analyze_query(requete) == _analyse_origine(requete), requete
+
+    # Vocabulaire de config_chatbot.py (défaut) : synonymes en plus
+    if KEYWORDS_CONFIG is not MOTS_CLES:
+        assert chatbot.analyze_query("top logement à Jerba")['sentiment_filter'] == 'positif'
+        assert chatbot.analyze_query("appartement parfait")['min_rating'] == 3.5
+        assert chatbot.analyze_query("logement accessible design")['quality_focus'] == ['communication', 'moderne']
+        assert chatbot.analyze_query("un logement correct")['min_rating'] == 3.0
+    print("   ✅ Détection des mots-clés OK")
+
+
+def _filtre_origine(listings, criteria):
+    """filter_listings d'origine : copie de la table puis masques booléens"""
+    filtered = listings.copy()
+    if criteria['city']:
+        filtered = filtered[filtered['city_listing'].str.contains(criteria['city'], case=False, na=False)]
+    if criteria['min_rating']:
+        filtered = filtered[filtered['quality_score'] >= criteria['min_rating']]
+    if criteria['sentiment_filter'] == 'positif':
+        filtered = filtered[filtered['sentiment_score'] >= 0.7]
+    elif criteria['sentiment_filter'] == 'négatif':
+        filtered = filtered[filtered['sentiment_score'] <= 0.3]
+    return filtered
+
+
+def test_filtrage_indexe():
+    """Filtrage par positions (index par ville, coupes triées) : mêmes logements qu'avec les masques"""
+    print("🧪 Test du filtrage indexé...")
+    import contextlib
+    import io
+    import itertools
+    from chatbot_hebergement import ChatbotHebergement
+
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, 'all_reviews_final.csv')
+        _avis_synthetiques().to_csv(chemin, index=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            chatbot = ChatbotHebergement(chemin, cache_listings=False)
+    listings = chatbot.listings
+    seuil_existant = float(listings['quality_score'].iloc[7])
+
+    for ville, note, sentiment in itertools.product([None, 'Hammamet', 'jerba', 'Sousse'],
+                                                    [None, 0, 2.5, seuil_existant],
+                                                    [None, 'positif', 'négatif']):
+        for focus in ([], ['propre'], ['prix', 'localisation']):
+            criteria = {'city': ville, 'min_rating': note, 'sentiment_filter': sentiment,
+                        'quality_focus': focus, 'price_range': None}
+            attendu = _filtre_origine(listings, criteria)
+            pd.testing.assert_frame_equal(chatbot.filter_listings(criteria), attendu)
+
+            # Top 5 : mêmes scores que le classement complet d'origine
+            positions, scores = chatbot._meilleures_positions(chatbot._positions_filtrees(criteria), criteria, 5)
+            if attendu.empty:
+                assert len(positions) == 0
+                continue
+            classe = chatbot.rank_by_criteria(attendu, criteria).head(5)
+            if focus:
+                assert np.array_equal(scores, classe['custom_score'].to_numpy())
+            else:
+                assert scores is None
+                assert np.array_equal(listings['quality_score'].to_numpy()[positions],
+                                      classe['quality_score'].to_numpy())
+    assert chatbot.partitions.par_ville('Sousse').size == 0
+
+    _, resultats = chatbot.generate_response("appartement propre à Hammamet", top_n=3)
+    assert len(resultats) == 3 and 'custom_score' in resultats.columns
+    assert (resultats['city_listing'] == 'Hammamet').all()
+    print("   ✅ Filtrage indexé OK")
+
+
+def test_classement_top_n():
+    """Classement par produit matrice-vecteur et argpartition : mêmes scores que le tri complet d'origine"""
+    print("🧪 Test du classement des top n...")
+    import contextlib
+    import io
+    from chatbot_hebergement import ChatbotHebergement
+    from partitions_logements import meilleurs
+
+    scores = np.array([1.0, 3.0, 2.0, 3.0, 0.5])
+    assert meilleurs(scores, 3).tolist() == [1, 3, 2]
+    assert meilleurs(scores, 10).tolist() == [1, 3, 2, 0, 4] and meilleurs(scores, 0).size == 0
+
+    with tempfile.TemporaryDirectory() as dossier:
+        chemin = os.path.join(dossier, 'all_reviews_final.csv')
+        _avis_synthetiques().to_csv(chemin, index=False)
+        with contextlib.redirect_stdout(io.StringIO()):
+            chatbot = ChatbotHebergement(chemin, cache_listings=False)
+
+    colonnes = {'propre': 'rating/cleanliness', 'communication': 'rating/communication',
+                'localisation': 'rating/location', 'prix': 'rating/value'}
+    for ville in (None, 'Jerba'):
+        for focus in ([], ['propre'], ['communication', 'prix'], ['localisation', 'moderne'], ['confort']):
+            criteria = {'city': ville, 'min_rating': None, 'sentiment_filter': None,
+                        'quality_focus': focus, 'price_range': None}
+            filtered = chatbot.filter_listings(criteria)
+            # Classement d'origine : copie, fillna(0) par critère puis tri complet
+            attendu = filtered['quality_score'].copy()
+            for f in focus:
+                if f in colonnes:
+                    attendu += filtered[colonnes[f]].fillna(0) * 0.5
+            attendu = attendu.sort_values(ascending=False).to_numpy()
+
+            # Lignes de la table (matrice précalculée) ou autre DataFrame (notes recalculées)
+            for frame in (filtered, filtered.reset_index(drop=True)):
+                classes = chatbot.rank_by_criteria(frame, criteria, top_n=7)
+                assert len(classes) == 7
+                obtenu = classes['custom_score'] if focus else classes['quality_score']
+                assert ('custom_score' in classes.columns) == bool(focus)
+                assert np.allclose(obtenu.to_numpy(), attendu[:7], rtol=1e-6)
+                assert obtenu.is_monotonic_decreasing
+            assert len(chatbot.rank_by_criteria(filtered, criteria)) == len(filtered)
+    print("   ✅ Classement des top n OK")
+
 
 def test_chatbot():
     """Test complet du chatbot"""
@@ -65,5 +389,12 @@ def test_chatbot():
         print("❌ Fichier all_reviews_final.csv non trouvé")
         return False
 
+
 if __name__ == "__main__":
+    test_chargement_par_morceaux()
+    test_agregation_vectorisee()
+    test_cache_listings()
+    test_mots_cles()
+    test_filtrage_indexe()
+    test_classement_top_n()
     test_chatbot()
\ No newline at end of file
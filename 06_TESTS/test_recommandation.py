@@ -0,0 +1,973 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Tests des composants du système de recommandation
+"""
+
+import os
+import sys
+import tempfile
+import zlib
+
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
+                                '02_SYSTEME_RECOMMANDATION', 'scripts'))
+
+
+class EncodeurFactice:
+    """Remplace SentenceTransformer : vecteur pseudo-aléatoire déterministe par texte"""
+
+    def __init__(self, dim=16):
+        self.dim = dim
+        self.appels = 0
+
+    def encode(self, textes, batch_size=32, convert_to_numpy=True, **kwargs):
+        self.appels += 1
+        vecteurs = [
+            np.random.default_rng(zlib.crc32(str(t).encode('utf-8'))).standard_normal(self.dim)
+            for t in textes
+        ]
+        return np.asarray(vecteurs, dtype=np.float32).reshape(len(textes), self.dim)
+
+
+def _catalogue(n=50):
+    """Petit df_grouped synthétique"""
+    return pd.DataFrame({
+        'id_listing': np.arange(1000, 1000 + n),
+        'title': [f"Appartement {i} vue mer" if i % 7 else None for i in range(n)]
+    })
+
+
+def test_embeddings_titres():
+    """Les embeddings sont normalisés, persistés et reconstruits seulement si la source change"""
+    print("🧪 Test des embeddings des titres...")
+    from embeddings_titres import charger_embeddings_titres, encoder_requete
+
+    df = _catalogue()
+    with tempfile.TemporaryDirectory() as tmp:
+        source = os.path.join(tmp, 'df_grouped.pkl')
+        npy = os.path.join(tmp, 'title_embeddings_bert.npy')
+        meta = os.path.join(tmp, 'title_embeddings_bert.json')
+        df.to_pickle(source)
+        encodeur = EncodeurFactice()
+
+        emb = charger_embeddings_titres(df, encodeur, source, npy, meta)
+        assert emb.dtype == np.float32 and emb.shape == (len(df), encodeur.dim)
+        assert np.allclose(np.linalg.norm(emb, axis=1), 1.0, atol=1e-5)
+        assert encodeur.appels == 1
+
+        # Deuxième chargement : lecture du cache, aucun encodage
+        emb2 = charger_embeddings_titres(df, encodeur, source, npy, meta)
+        assert encodeur.appels == 1 and np.array_equal(emb, emb2)
+
+        # La source change : reconstruction
+        df.iloc[:10].to_pickle(source)
+        emb3 = charger_embeddings_titres(df.iloc[:10], encodeur, source, npy, meta)
+        assert encodeur.appels == 2 and emb3.shape[0] == 10
+
+        # Un titre identique retrouve son propre logement
+        requete = encoder_requete(encodeur, df['title'].iloc[3])
+        assert int((emb3 @ requete).argmax()) == 3
+
+    print("   ✅ Embeddings OK")
+
+
+def test_index_titres():
+    """L'index exact retrouve le bon titre ; l'IVF garde un bon rappel"""
+    print("🧪 Test de l'index des titres...")
+    from embeddings_titres import normaliser_l2
+    from index_titres import IndexTitresExact, creer_index_titres, evaluer_index
+
+    rng = np.random.default_rng(0)
+    centres = rng.standard_normal((20, 32))
+    embeddings = normaliser_l2(centres[rng.integers(0, 20, 2000)] + 0.3 * rng.standard_normal((2000, 32)))
+    exact = IndexTitresExact(embeddings)
+
+    scores, indices = exact.rechercher(embeddings[:5], k=3)
+    assert indices.shape == (5, 3) and list(indices[:, 0]) == [0, 1, 2, 3, 4]
+    assert np.all(np.diff(scores, axis=1) <= 0)
+
+    # k supérieur au catalogue : complété par -1
+    _, indices = IndexTitresExact(embeddings[:2]).rechercher(embeddings[0], k=4)
+    assert list(indices[0][2:]) == [-1, -1]
+
+    ivf = creer_index_titres(embeddings, 'ivf', n_listes=40, n_sondes=10)
+    rapport = evaluer_index(ivf, exact, embeddings[:100], k=10)
+    print(f"   📊 Rappel@10 IVF : {rapport['rappel_at_k']:.3f}")
+    assert rapport['rappel_at_k'] >= 0.9
+
+    print("   ✅ Index OK")
+
+
+def test_stockage_similarite():
+    """Les formes mappée, float16 et top-K s'indexent comme la matrice dense"""
+    print("🧪 Test du stockage de la matrice de similarité...")
+    from embeddings_titres import normaliser_l2
+    from stockage_similarite import (charger_matrice_similarite, construire_formes_compressees,
+                                     rapport_compression)
+
+    rng = np.random.default_rng(0)
+    emb = normaliser_l2(rng.standard_normal((300, 16)))
+    dense = (emb @ emb.T).astype(np.float32)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chemin = os.path.join(tmp, 'similarity_matrix_bert.npy')
+        np.save(chemin, dense)
+        construire_formes_compressees(chemin, k=20, taille_bloc=64)
+
+        mappee = charger_matrice_similarite(chemin, 'dense')
+        assert isinstance(mappee, np.memmap) and mappee[3, 7] == dense[3, 7]
+
+        f16 = charger_matrice_similarite(chemin, 'float16')
+        assert np.allclose(f16[3, np.arange(10)], dense[3, :10], atol=1e-3)
+
+        topk = charger_matrice_similarite(chemin, 'topk', k=20)
+        voisins = np.argsort(-dense[3])[:20]
+        assert np.allclose(topk[3, voisins], dense[3, voisins])
+        lointain = int(np.argmin(dense[3]))
+        assert topk[3, lointain] == 0
+
+        rapport = rapport_compression(chemin, k=20, taille_bloc=64)
+        assert rapport['float16']['gain'] == 2.0 and rapport['topk']['gain'] > 2.0
+        assert rapport['float16']['erreur_max'] < 1e-3
+        del mappee, f16
+
+    print("   ✅ Stockage OK")
+
+
+def test_scoring_hybride():
+    """Le scoring vectorisé reproduit la boucle candidat par candidat"""
+    print("🧪 Test du scoring vectorisé...")
+    from scoring_hybride import (classer_candidats, classer_vecteurs, construire_table_index,
+                                 mapper_ids, similarites_candidats, scores_hybrides,
+                                 top_n_indices, vecteurs_candidats)
+
+    rng = np.random.default_rng(0)
+    sim = rng.random((40, 40)).astype(np.float32)
+    id_to_index = {5000 + 3 * i: i for i in range(40)}
+    table = construire_table_index(id_to_index)
+
+    ids = np.array([5000, 5003, 4242, 5117, 5006])
+    assert list(mapper_ids(table, ids)) == [0, 1, -1, 39, 2]
+
+    candidats = {5000 + 3 * i: float(rng.uniform(1, 5)) for i in range(1, 40)}
+    ids_c = np.array(list(candidats))
+    notes = np.array(list(candidats.values()))
+    idx_c = mapper_ids(table, ids_c)
+
+    sims = similarites_candidats(sim, [0, 7], idx_c)
+    scores = scores_hybrides(sims, notes, 0.6, 0.4)
+    attendus = sorted(
+        ((0.6 * float(max(sim[0, id_to_index[i]], sim[7, id_to_index[i]])) + 0.4 * n / 5.0, i)
+         for i, n in candidats.items()),
+        key=lambda x: x[0], reverse=True
+    )[:5]
+    top = top_n_indices(scores, 5)
+    assert [int(ids_c[i]) for i in top] == [i for _, i in attendus]
+    assert np.allclose(scores[top], [s for s, _ in attendus])
+
+    # Égalités : l'ordre d'origine est conservé ; top_n plus grand que le tableau
+    assert list(top_n_indices(np.array([1.0, 2.0, 2.0, 0.5]), 10)) == [1, 2, 0, 3]
+    assert len(top_n_indices(np.array([]), 3)) == 0
+
+    # Vecteurs calculés une fois puis re-pondérés : même résultat que le calcul complet
+    ids_ref = [5000, 5021]
+    ids_v, sims_v, notes_v = vecteurs_candidats(sim, table, ids_ref, np.append(ids_c, 4242),
+                                                np.append(notes, 3.0))
+    assert 4242 not in ids_v and len(ids_v) == len(ids_c)
+    for alpha, beta in ((0.5, 0.5), (1.0, 0.0), (0.0, 1.0), (0.2, 0.9)):
+        complet = classer_candidats(sim, table, ids_ref, ids_c, notes, alpha, beta, 5)
+        repondere = classer_vecteurs(ids_v, sims_v, notes_v, alpha, beta, 5)
+        for a, b in zip(complet, repondere):
+            np.testing.assert_array_equal(a, b)
+
+    print("   ✅ Scoring OK")
+
+
+def test_index_logements():
+    """L'index par id_listing renvoie les mêmes données que les filtres pandas"""
+    print("🧪 Test de l'index des logements...")
+    from index_logements import charger_index_logements
+
+    avis = pd.DataFrame({
+        'id_listing': [1, 1, 1, 1, 1, 2, 2, 3],
+        'title': ['A', 'A', 'A', 'A', 'A', 'B', 'B', 'C'],
+        'city_listing': ['Hammamet'] * 5 + ['Jerba'] * 3,
+        'description': ['desc A'] * 5 + ['desc B'] * 2 + [None],
+        'sentiment_bert': ['positive', 'negative', 'positive', 'positive', 'positive',
+                           'negative', 'positive', 'negative'],
+        'localizedText': ['a1', 'a2', None, 'a4', 'a5', 'b1', 'b2', 'c1']
+    })
+    metadata = pd.DataFrame({'id_listing': [1, 2], 'rating_review_moyen': [4.5, 3.9],
+                             'accuracy_moyen': [4.8, np.nan]})
+
+    with tempfile.TemporaryDirectory() as tmp:
+        fichiers = [os.path.join(tmp, 'metadata.pkl'), os.path.join(tmp, 'df_grouped.pkl'),
+                    os.path.join(tmp, 'listing_index.pkl')]
+        metadata.to_pickle(fichiers[0])
+        avis.to_pickle(fichiers[1])
+        index = charger_index_logements(metadata, avis, *fichiers)
+
+        for id_listing in [1, 2, 3, np.int64(2)]:
+            attendus = avis[(avis['id_listing'] == id_listing) & (avis['sentiment_bert'] == 'positive')]
+            assert index.avis(id_listing) == attendus['localizedText'].dropna().tolist()[:3]
+            assert index.info(id_listing)['title'] == avis[avis['id_listing'] == id_listing].iloc[0]['title']
+        assert index.avis(1) == ['a1', 'a4', 'a5']
+        assert index.note(1) == (4.5, 4.8) and index.note(3) == (None, None)
+        assert index.info(99) == {} and index.avis(99) == []
+
+        # Rechargement depuis le disque sans reconstruction
+        recharge = charger_index_logements(None, None, *fichiers)
+        assert recharge.avis(1) == index.avis(1) and recharge.info(2) == index.info(2)
+
+    print("   ✅ Index des logements OK")
+
+
+def test_matrice_utilisateur_item():
+    """La matrice creuse reproduit les moyennes pandas et le KNN dense"""
+    print("🧪 Test de la matrice utilisateur-item creuse...")
+    from sklearn.neighbors import NearestNeighbors
+    from matrice_utilisateur_item import (MatriceUtilisateurItem, ajuster_knn_creux,
+                                          candidats_collaboratifs, candidats_collaboratifs_lot,
+                                          charger_matrice_utilisateur_item)
+
+    rng = np.random.default_rng(0)
+    notes = np.where(rng.random((60, 25)) < 0.15, rng.integers(1, 6, (60, 25)), np.nan)
+    df = pd.DataFrame(notes, index=[f"u{i}" for i in range(60)], columns=np.arange(700, 725))
+    matrice = MatriceUtilisateurItem.depuis_dataframe(df)
+    assert matrice.csr.nnz == int(df.notna().sum().sum())
+
+    refs = [703, 710]
+    lignes = matrice.utilisateurs_ayant_note(refs)
+    attendus = df[df[refs].notna().any(axis=1)].index.tolist()
+    assert matrice.user_ids[lignes].tolist() == attendus
+
+    vecteur = df.loc[attendus].mean().fillna(0).to_numpy()
+    assert np.allclose(matrice.vecteur_moyen(lignes).toarray().ravel(), vecteur)
+
+    ids, moyennes = matrice.notes_moyennes(lignes[:5])
+    attendu = df.loc[attendus[:5]].mean().dropna()
+    assert ids.tolist() == attendu.index.tolist() and np.allclose(moyennes, attendu.to_numpy())
+
+    knn_dense = NearestNeighbors(metric='cosine').fit(df.fillna(0).to_numpy())
+    knn = ajuster_knn_creux(matrice, knn_dense)
+    _, voisins_dense = knn_dense.kneighbors([vecteur], n_neighbors=5)
+    _, voisins = knn.kneighbors(matrice.vecteur_moyen(lignes), n_neighbors=5)
+    assert voisins.tolist() == voisins_dense.tolist()
+
+    # Un lot donne les mêmes candidats que des appels séparés (un seul kneighbors)
+    listes_refs = [[703], [710, 703], [], [701]]
+    lot = candidats_collaboratifs_lot(matrice, knn, listes_refs)
+    for ids_ref, resultat in zip(listes_refs, lot):
+        seul = candidats_collaboratifs(matrice, knn, ids_ref)
+        assert (resultat is None) == (seul is None)
+        if seul is not None:
+            assert resultat[0].tolist() == seul[0].tolist() and np.allclose(resultat[1], seul[1])
+    assert lot[2] is None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        source, creuse = os.path.join(tmp, 'user_item_matrix.pkl'), os.path.join(tmp, 'user_item_sparse.pkl')
+        df.to_pickle(source)
+        charger_matrice_utilisateur_item(source, creuse)
+        os.remove(source)
+        recharge = charger_matrice_utilisateur_item(source, creuse)
+        assert (recharge.csr != matrice.csr).nnz == 0
+
+    print("   ✅ Matrice creuse OK")
+
+
+def test_recommandations_precalculees():
+    """La table pré-calculée sert les mêmes résultats que le calcul en direct"""
+    print("🧪 Test des recommandations pré-calculées...")
+    from matrice_utilisateur_item import (MatriceUtilisateurItem, ajuster_knn_creux,
+                                          candidats_collaboratifs)
+    from recommandations_precalculees import (TableRecommandations, charger_table_recommandations,
+                                              precalculer_recommandations, sources_table)
+    from scoring_hybride import classer_candidats, construire_table_index
+    from sklearn.neighbors import NearestNeighbors
+    from voisins_precalcules import logements_affectes, precalculer_voisins
+
+    rng = np.random.default_rng(1)
+    ids = np.arange(900, 930)
+    notes = np.where(rng.random((80, 30)) < 0.3, rng.integers(1, 6, (80, 30)), np.nan)
+    df = pd.DataFrame(notes, index=[f"u{i}" for i in range(80)], columns=ids)
+    sim = rng.random((30, 30)).astype(np.float32)
+    table_index = construire_table_index({int(i): k for k, i in enumerate(ids)})
+
+    matrice = MatriceUtilisateurItem.depuis_dataframe(df)
+    knn = ajuster_knn_creux(matrice)
+    table, n_calcules = precalculer_recommandations(ids, matrice, knn, sim, table_index,
+                                                    n_max=8, sources={'similarite': 'x'})
+    assert n_calcules == 30 and len(table) == 30
+
+    for id_ref in ids[:10].tolist():
+        direct = classer_candidats(sim, table_index, [id_ref],
+                                   *candidats_collaboratifs(matrice, knn, [id_ref]), 0.5, 0.5, 5)
+        servi = table.servir(id_ref, 0.5, 0.5, 5)
+        assert servi[0].tolist() == direct[0].tolist() and np.allclose(servi[1], direct[1])
+    assert table.servir(int(ids[0]), 0.7, 0.3, 5) is None
+    assert table.servir(int(ids[0]), 0.5, 0.5, 20) is None
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chemin = os.path.join(tmp, 'recommandations_precalculees.npz')
+        table.sauvegarder(chemin)
+        table = TableRecommandations.charger(chemin)
+
+        # Forme de la similarité et KNN enregistrés : une autre forme ou un autre KNN est refusé
+        np.save(os.path.join(tmp, 'sim.npy'), sim)
+        sources = sources_table(matrice, knn, os.path.join(tmp, 'sim.npy'), 'topk', k=20)
+        assert sources['format_similarite'] == 'topk' and sources['k_similarite'] == 20 and sources['knn']
+        TableRecommandations(table.ids_ref, table.offsets, table.ids_candidats, table.sims, table.notes,
+                             table.signatures, 0.5, 0.5, 8, sources).sauvegarder(chemin)
+
+        def charger(knn_model, format_stockage, k=50):
+            return charger_table_recommandations(matrice, knn_model, os.path.join(tmp, 'sim.npy'),
+                                                 format_stockage, k, chemin=chemin)
+
+        assert len(charger(knn, 'topk', 20)) == 30
+        assert charger(knn, 'dense') is None and charger(knn, 'topk', 50) is None
+        knn_euclidien = ajuster_knn_creux(matrice, NearestNeighbors(n_neighbors=10, metric='euclidean'))
+        assert charger(knn_euclidien, 'topk', 20) is None
+
+    # Une nouvelle note change les voisins d'autres logements : leurs lignes sont aussi
+    # reclassées, la table rafraîchie est identique à une reconstruction complète
+    voisins_avant, _ = precalculer_voisins(ids, matrice, knn)
+    df.loc['u0', 905] = 1.0 if df.loc['u0', 905] != 1.0 else 5.0
+    matrice = MatriceUtilisateurItem.depuis_dataframe(df)
+    knn = ajuster_knn_creux(matrice)
+    table2, n_calcules = precalculer_recommandations(ids, matrice, knn, sim, table_index, n_max=8,
+                                                     sources={'similarite': 'x'}, table_existante=table)
+    complete, _ = precalculer_recommandations(ids, matrice, knn, sim, table_index, n_max=8,
+                                              sources={'similarite': 'x'})
+    assert 1 < n_calcules <= 30 and table2.ids_ref.tolist() == complete.ids_ref.tolist()
+    assert any(not np.array_equal(table.ligne(i)[2], complete.ligne(i)[2]) for i in ids.tolist() if i != 905)
+    for id_ref in complete.ids_ref.tolist():
+        assert table2.ligne(id_ref)[0].tolist() == complete.ligne(id_ref)[0].tolist()
+        assert np.array_equal(table2.ligne(id_ref)[2], complete.ligne(id_ref)[2])
+
+    # Table des voisins périmée : seuls les logements affectés repassent par le KNN
+    affectes = logements_affectes(voisins_avant, matrice, knn, ids.tolist())
+    assert 905 in affectes
+    table4, n_affectes = precalculer_recommandations(ids, matrice, knn, sim, table_index, n_max=8,
+                                                     sources={'similarite': 'x'}, table_existante=table,
+                                                     affectes=affectes)
+    assert n_affectes <= len(affectes) and table4.signatures.tolist() == complete.signatures.tolist()
+    for id_ref in complete.ids_ref.tolist():
+        assert table4.ligne(id_ref)[0].tolist() == complete.ligne(id_ref)[0].tolist()
+        assert np.array_equal(table4.ligne(id_ref)[2], complete.ligne(id_ref)[2])
+
+    # Rien n'a changé (candidats relus dans la table des voisins) : rien n'est reclassé
+    voisins, _ = precalculer_voisins(ids, matrice, knn)
+    table3, n_calcules = precalculer_recommandations(ids, matrice, knn, sim, table_index, n_max=8,
+                                                     sources={'similarite': 'x'}, table_existante=table2,
+                                                     table_voisins=voisins)
+    assert n_calcules == 0 and table3.signatures.tolist() == table2.signatures.tolist()
+
+    print("   ✅ Recommandations pré-calculées OK")
+
+
+def test_voisins_precalcules():
+    """Candidats servis sans KNN identiques au direct ; mise à jour limitée aux logements affectés"""
+    print("🧪 Test des voisins pré-calculés...")
+    from matrice_utilisateur_item import (MatriceUtilisateurItem, ajuster_knn_creux,
+                                          candidats_collaboratifs)
+    from voisins_precalcules import TableVoisins, precalculer_voisins
+
+    rng = np.random.default_rng(2)
+    ids = np.arange(900, 960)
+    notes = np.where(rng.random((200, 60)) < 0.08, rng.integers(1, 6, (200, 60)), np.nan)
+    df = pd.DataFrame(notes, index=[f"u{i:03d}" for i in range(200)], columns=ids)
+
+    matrice = MatriceUtilisateurItem.depuis_dataframe(df)
+    knn = ajuster_knn_creux(matrice)
+    table, n_calcules = precalculer_voisins(ids, matrice, knn)
+    assert n_calcules == 60 and len(table) == int((~np.isnan(notes)).any(axis=0).sum())
+    for id_ref in ids.tolist():
+        direct = candidats_collaboratifs(matrice, knn, [id_ref])
+        servi = table.candidats(id_ref)
+        assert (servi is None) == (direct is None)
+        if direct is not None:
+            assert servi[0].tolist() == direct[0].tolist() and np.array_equal(servi[1], direct[1])
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chemin = os.path.join(tmp, 'voisins_precalcules.npz')
+        table.sauvegarder(chemin)
+        table = TableVoisins.charger(chemin)
+
+    # Une nouvelle note et un nouvel utilisateur : mise à jour partielle, même résultat qu'un calcul complet
+    df.loc['u007', 905] = 1.0 if df.loc['u007', 905] != 1.0 else 5.0
+    df.loc['u500'] = np.nan
+    df.loc['u500', [910, 911]] = [5.0, 4.0]
+    matrice = MatriceUtilisateurItem.depuis_dataframe(df)
+    knn = ajuster_knn_creux(matrice)
+    partielle, n_calcules = precalculer_voisins(ids, matrice, knn, table_existante=table)
+    complete, _ = precalculer_voisins(ids, matrice, knn)
+    assert 0 < n_calcules < 60
+    assert partielle.ids_ref.tolist() == complete.ids_ref.tolist()
+    for id_ref in complete.ids_ref.tolist():
+        assert sorted(partielle.ligne(id_ref)[0].tolist()) == sorted(complete.ligne(id_ref)[0].tolist())
+        assert np.array_equal(partielle.candidats(id_ref)[1], complete.candidats(id_ref)[1])
+
+    # Rien n'a changé : rien n'est recalculé
+    _, n_calcules = precalculer_voisins(ids, matrice, knn, table_existante=partielle)
+    assert n_calcules == 0
+
+    print("   ✅ Voisins pré-calculés OK")
+
+
+def test_registre_artefacts():
+    """Chargement parallèle, dédupliqué et paresseux des artefacts"""
+    print("🧪 Test du registre des artefacts...")
+    import threading
+    from registre_artefacts import RegistreArtefacts
+
+    lectures = []
+    barriere = threading.Barrier(2, timeout=5)
+
+    def lecteur(chemin):
+        lectures.append(chemin)
+        return chemin
+
+    def lent(nom):
+        # Les deux artefacts indépendants doivent tourner en même temps
+        barriere.wait()
+        return nom
+
+    registre = RegistreArtefacts(max_workers=2)
+    registre.declarer('a', lambda: lent('a'))
+    registre.declarer('b', lambda: lent('b'))
+    registre.declarer('ab', lambda a, b: a + b, depend_de=('a', 'b'))
+    registre.declarer_fichier('df', 'df_grouped.pkl', lecteur)
+    registre.declarer_fichier('reviews', './df_grouped.pkl', lecteur, optionnel=True)
+    registre.declarer('paresseux', lambda ab: ab * 2, depend_de=('ab',), optionnel=True)
+    registre.declarer('casse', lambda: 1 / 0, optionnel=True)
+
+    assert not registre.pret()
+    registre.demarrer().attendre(timeout=10)
+    assert registre.pret()
+    assert registre['ab'] == 'ab'
+    assert registre['reviews'] is registre['df'] and len(lectures) == 1
+
+    etat = registre.etat()
+    assert etat['paresseux']['statut'] == 'differe'
+    assert registre['paresseux'] == 'abab'
+    assert registre.etat()['paresseux']['statut'] == 'charge'
+
+    try:
+        registre['casse']
+        assert False, "ZeroDivisionError attendue"
+    except ZeroDivisionError:
+        pass
+    assert registre.etat()['casse']['statut'] == 'erreur'
+    # Un artefact optionnel en erreur ne rend pas le service indisponible
+    assert registre.pret()
+
+    print("   ✅ Registre OK")
+
+
+def test_artefacts_colonnes():
+    """Export Arrow IPC, projection des colonnes et retour au pickle s'il change"""
+    print("🧪 Test des artefacts colonnaires...")
+    from artefacts_colonnes import (PYARROW_AVAILABLE, chemin_colonnes, export_utilisable,
+                                    exporter_matrice_utilisateur_item, exporter_table,
+                                    lire_table, lire_triplets_utilisateur_item)
+    from matrice_utilisateur_item import MatriceUtilisateurItem
+
+    if not PYARROW_AVAILABLE:
+        print("   ⚠️ pyarrow absent : test ignoré")
+        return
+
+    df = _catalogue(20)
+    df['inutile'] = 'x' * 50
+    notes = pd.DataFrame(np.nan, index=[f"u{i}" for i in range(6)], columns=[901, 902, 903, 904])
+    notes.iloc[0, 0], notes.iloc[2, 1], notes.iloc[5, 1] = 4.0, 5.0, 3.0
+
+    with tempfile.TemporaryDirectory() as tmp:
+        chemin = os.path.join(tmp, 'df_grouped.pkl')
+        df.to_pickle(chemin)
+        assert not export_utilisable(chemin)
+        exporter_table(chemin)
+        assert export_utilisable(chemin)
+
+        lu = lire_table(chemin, ('id_listing', 'title', 'absente'))
+        assert list(lu.columns) == ['id_listing', 'title']
+        assert lu['title'].tolist() == df['title'].tolist()
+
+        # Pickle modifié après l'export : l'export périmé est ignoré
+        df.assign(title='modifié').to_pickle(chemin)
+        assert not export_utilisable(chemin)
+        assert (lire_table(chemin, ('title',))['title'] == 'modifié').all()
+
+        chemin_notes = os.path.join(tmp, 'user_item_matrix.pkl')
+        notes.to_pickle(chemin_notes)
+        exporter_matrice_utilisateur_item(chemin_notes)
+        os.remove(chemin_notes)
+        assert export_utilisable(chemin_notes) and os.path.exists(chemin_colonnes(chemin_notes))
+        relue = MatriceUtilisateurItem.depuis_triplets(*lire_triplets_utilisateur_item(chemin_notes))
+        attendue = MatriceUtilisateurItem.depuis_dataframe(notes)
+        assert relue.user_ids.tolist() == attendue.user_ids.tolist()
+        assert relue.item_ids.tolist() == attendue.item_ids.tolist()
+        assert (relue.csr != attendue.csr).nnz == 0
+
+    print("   ✅ Artefacts colonnaires OK")
+
+
+def test_encodeur_micro_lots():
+    """Requêtes concurrentes regroupées en lots, chacune reçoit ses propres vecteurs"""
+    print("🧪 Test de l'encodage par micro-lots...")
+    import threading
+    from embeddings_titres import encoder_titres
+    from encodeur_micro_lots import EncodeurMicroLots
+
+    modele = EncodeurFactice()
+    encodeur = EncodeurMicroLots(lambda titres: encoder_titres(modele, titres),
+                                 max_batch=8, max_wait_ms=50)
+    titres = [f"Titre {i}" for i in range(24)]
+    resultats = {}
+    depart = threading.Barrier(len(titres))
+
+    def requete(titre):
+        depart.wait()
+        resultats[titre] = encodeur.encoder_sync([titre], timeout=10)
+
+    threads = [threading.Thread(target=requete, args=(t,)) for t in titres]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    attendus = encoder_titres(EncodeurFactice(), titres)
+    for i, titre in enumerate(titres):
+        assert resultats[titre].shape == (1, 16)
+        assert np.allclose(resultats[titre][0], attendus[i])
+
+    stats = encodeur.statistiques()
+    assert stats['requetes'] == 24 and modele.appels == stats['lots'] < 24
+    assert stats['latence_ms']['p50'] <= stats['latence_ms']['p99']
+
+    # Une requête de plusieurs titres garde l'ordre de ses titres
+    lot = encodeur.encoder_sync(titres[:10], timeout=10)
+    assert np.allclose(lot, attendus[:10])
+
+    print(f"   📊 {stats['lots']} lots pour {stats['requetes']} requêtes")
+    print("   ✅ Micro-lots OK")
+
+
+def test_encodeur_requete_isolee():
+    """Une requête seule en cours n'attend pas max_wait ; deux requêtes en cours partagent un lot"""
+    print("🧪 Test de l'encodage d'une requête isolée...")
+    import threading
+    import time
+    from embeddings_titres import encoder_titres
+    from encodeur_micro_lots import EncodeurMicroLots
+
+    modele = EncodeurFactice()
+    en_cours = [1]
+    encodeur = EncodeurMicroLots(lambda titres: encoder_titres(modele, titres),
+                                 max_wait_ms=2000, requetes_en_cours=lambda: en_cours[0])
+    encodeur.encoder_sync(["Premier appel"], timeout=10)
+    debut = time.perf_counter()
+    vecteurs = encodeur.encoder_sync(["Appartement vue mer"], timeout=10)
+    assert time.perf_counter() - debut < 0.5, "la requête isolée a attendu max_wait"
+    assert np.allclose(vecteurs, encoder_titres(EncodeurFactice(), ["Appartement vue mer"]))
+
+    # Deux requêtes en cours : la première attend la seconde, un seul lot
+    en_cours[0] = 2
+    lots_avant = encodeur.statistiques()['lots']
+    threads = [threading.Thread(target=encodeur.encoder_sync, args=([t], 10)) for t in ("A", "B")]
+    for t in threads:
+        t.start()
+        time.sleep(0.05)
+    for t in threads:
+        t.join()
+    assert encodeur.statistiques()['lots'] == lots_avant + 1
+
+    # Sans compteur de requêtes, max_wait_ms=0 n'attend pas non plus
+    immediat = EncodeurMicroLots(lambda titres: encoder_titres(modele, titres), max_wait_ms=0)
+    immediat.encoder_sync(["Premier appel"], timeout=10)
+    debut = time.perf_counter()
+    immediat.encoder_sync(["Studio centre"], timeout=10)
+    assert time.perf_counter() - debut < 0.5
+    print("   ✅ Requête isolée sans attente OK")
+
+
+def test_cache_reponses():
+    """LRU, expiration, backend partagé et invalidation par version"""
+    print("🧪 Test du cache des réponses...")
+    import time
+    from cache_reponses import BackendMemoire, CacheReponses, cle_requete
+
+    requete = {'title': '  Appartement   VUE mer ', 'top_n': 5, 'alpha': 0.5, 'beta': 0.5, 'top_k_refs': 1}
+    cle = cle_requete(requete)
+    assert cle == cle_requete(dict(requete, title='appartement vue mer'))
+    assert cle != cle_requete(dict(requete, top_n=3))
+
+    cache = CacheReponses(taille=2, ttl=None)
+    assert cache.lire(cle) is None
+    cache.ecrire(cle, {'n': 1})
+    cache.ecrire(('b',), {'n': 2})
+    assert cache.lire(cle) == {'n': 1}
+    cache.ecrire(('c',), {'n': 3})  # ('b',) est le moins récemment utilisé
+    assert cache.lire(('b',)) is None and cache.lire(cle) == {'n': 1}
+    stats = cache.statistiques()
+    assert (stats['hits'], stats['misses'], stats['evictions']) == (2, 2, 1)
+
+    cache = CacheReponses(taille=10, ttl=0.05)
+    cache.ecrire(cle, {'n': 1})
+    time.sleep(0.1)
+    assert cache.lire(cle) is None and cache.statistiques()['expirations'] == 1
+
+    # Deux workers partageant un backend ; une nouvelle version ignore les anciennes entrées
+    partage = BackendMemoire()
+    worker_1 = CacheReponses(ttl=60, backend=partage, version='v1')
+    worker_2 = CacheReponses(ttl=60, backend=partage, version='v1')
+    worker_1.ecrire(cle, {'n': 1})
+    assert worker_2.lire(cle) == {'n': 1} and worker_2.statistiques()['hits_partages'] == 1
+    worker_2.invalider('v2')
+    assert worker_2.lire(cle) is None and len(worker_2) == 0
+
+    assert CacheReponses(actif=False).lire(cle) is None
+
+    print("   ✅ Cache OK")
+
+
+def test_cache_embeddings():
+    """Hits mémoire, éviction LRU en octets et cache disque relu après redémarrage"""
+    print("🧪 Test du cache des embeddings...")
+    from cache_embeddings import CacheEmbeddings
+
+    attendu = EncodeurFactice().encode(['Villa piscine', 'Studio plage'])
+    modele = EncodeurFactice()
+    cache = CacheEmbeddings('modele-test', modele.encode)
+    resultat = cache.encoder(['  Villa   piscine', 'Studio plage', 'Villa piscine'])
+    assert resultat.shape == (3, 16) and modele.appels == 1
+    np.testing.assert_array_equal(resultat, attendu[[0, 1, 0]])
+    cache.encoder(['Villa piscine'])
+    stats = cache.statistiques()
+    assert (stats['hits_memoire'], stats['misses'], modele.appels) == (1, 3, 1)
+    assert stats['taux_hits'] == 0.25 and stats['temps_economise_s'] >= 0
+
+    # 16 float32 = 64 octets : deux vecteurs au plus
+    petit = CacheEmbeddings('modele-test', modele.encode, taille_memoire_mo=128 / 1024 / 1024)
+    petit.encoder(['a', 'b', 'c'])
+    assert len(petit) == 2 and petit.statistiques()['evictions'] == 1
+
+    with tempfile.TemporaryDirectory() as dossier:
+        CacheEmbeddings('org/modele-test', modele.encode, dossier=dossier).encoder(['Villa piscine'])
+        appels = modele.appels
+        # Nouveau processus : les vecteurs sont relus sur disque, pas ré-encodés
+        redemarre = CacheEmbeddings('org/modele-test', modele.encode, dossier=dossier)
+        resultat = redemarre.encoder(['Villa piscine', 'Studio plage'])
+        np.testing.assert_array_equal(resultat, attendu)
+        stats = redemarre.statistiques()
+        assert modele.appels == appels + 1
+        assert (stats['hits_disque'], stats['misses'], stats['entrees_disque']) == (1, 1, 2)
+        # Un autre modèle ne lit pas ces vecteurs
+        assert CacheEmbeddings('autre', modele.encode, dossier=dossier).statistiques()['entrees_disque'] == 0
+
+    print("   ✅ Cache des embeddings OK")
+
+
+def _modele_bert_minuscule(dossier):
+    """Petit modèle SentenceTransformer (BERT aléatoire, pooling moyen, normalisé)"""
+    import torch
+    from sentence_transformers import SentenceTransformer, models
+    from transformers import BertConfig, BertModel, BertTokenizerFast
+
+    mots = ("appartement villa studio maison chambre riad vue mer piscine plage jerba "
+            "hammamet avec sur la le à de au centre ville calme proche jardin terrasse").split()
+    lettres = list("abcdefghijklmnopqrstuvwxyzàéè")
+    with open(os.path.join(dossier, 'vocab.txt'), 'w', encoding='utf-8') as f:
+        f.write('\n'.join(['[PAD]', '[UNK]', '[CLS]', '[SEP]', '[MASK]', *mots, *lettres,
+                           *('##' + c for c in lettres)]))
+    BertTokenizerFast(os.path.join(dossier, 'vocab.txt')).save_pretrained(dossier)
+    torch.manual_seed(0)
+    BertModel(BertConfig(vocab_size=len(mots) + 2 * len(lettres) + 5, hidden_size=64,
+                         num_hidden_layers=2, num_attention_heads=4,
+                         intermediate_size=128)).save_pretrained(dossier)
+    modele = SentenceTransformer(modules=[models.Transformer(dossier, max_seq_length=64),
+                                          models.Pooling(64, 'mean'), models.Normalize()])
+    chemin = os.path.join(dossier, 'st')
+    modele.save(chemin)
+    return chemin
+
+
+def test_encodeur_onnx():
+    """Repli sur PyTorch, puis parité cosinus ONNX fp32 / int8 si les dépendances sont là"""
+    print("🧪 Test du backend ONNX...")
+    import importlib.util
+    from encodeur_onnx import (ONNX_AVAILABLE, EncodeurOnnx, charger_modele_embeddings,
+                               identifiant_modele, identifiant_modele_charge, verifier_parite)
+
+    # Export illisible (ou ONNX Runtime absent) : le modèle PyTorch est utilisé
+    with tempfile.TemporaryDirectory() as dossier:
+        for fichier in ('config_onnx.json', 'modele_int8.onnx'):
+            with open(os.path.join(dossier, fichier), 'w') as f:
+                f.write('corrompu')
+        repli = charger_modele_embeddings('modele-test', backend='onnx', dossier=dossier,
+                                          repli=lambda: 'pytorch')
+    assert repli == 'pytorch'
+    assert identifiant_modele('m', backend='torch') == 'm'
+    assert identifiant_modele('m', backend='onnx') == ('m@onnx-int8' if ONNX_AVAILABLE else 'm')
+
+    # Repli forcé avec EMBEDDING_BACKEND=onnx : le cache des embeddings est rangé
+    # sous le modèle PyTorch chargé, jamais sous l'identifiant ONNX
+    from cache_embeddings import CacheEmbeddings
+    ancien_backend = os.environ.get('EMBEDDING_BACKEND')
+    os.environ['EMBEDDING_BACKEND'] = 'onnx'
+    try:
+        with tempfile.TemporaryDirectory() as dossier:
+            modele = charger_modele_embeddings('modele-test', dossier=os.path.join(dossier, 'absent'),
+                                               repli=EncodeurFactice)
+            assert isinstance(modele, EncodeurFactice)
+            cache = CacheEmbeddings(identifiant_modele_charge(modele, 'modele-test'), modele.encode,
+                                    dossier=os.path.join(dossier, 'cache'))
+            cache.encoder(['Villa piscine'])
+            assert cache.statistiques()['modele'] == 'modele-test'
+            assert sorted(os.listdir(os.path.join(dossier, 'cache'))) == ['modele-test.cles.jsonl', 'modele-test.f32']
+    finally:
+        if ancien_backend is None:
+            os.environ.pop('EMBEDDING_BACKEND')
+        else:
+            os.environ['EMBEDDING_BACKEND'] = ancien_backend
+
+    class EncodeurOnnxCharge:
+        identifiant = 'modele-test@onnx-int8'
+    assert identifiant_modele_charge(EncodeurOnnxCharge(), 'modele-test') == 'modele-test@onnx-int8'
+
+    if not (ONNX_AVAILABLE and all(importlib.util.find_spec(m) for m in
+                                   ('torch', 'sentence_transformers', 'onnx'))):
+        print("   ⏭️ Parité ignorée (onnxruntime, onnx, torch ou sentence-transformers absent)")
+        return
+
+    with tempfile.TemporaryDirectory() as dossier:
+        modele = _modele_bert_minuscule(dossier)
+        export = os.path.join(dossier, 'onnx')
+        fp32 = verifier_parite(modele, dossier=export, quantifie=False)
+        int8 = verifier_parite(modele, dossier=export, quantifie=True)
+        assert fp32['cosinus_min'] > 0.9999, fp32
+        assert int8['cosinus_min'] > 0.99, int8
+
+        encodeur = EncodeurOnnx(export)
+        assert encodeur.encode("villa avec piscine").shape == (64,)
+        assert len(encodeur.embed_documents(["villa", "studio vue mer"])) == 2
+
+    print("   ✅ Backend ONNX OK")
+
+
+def test_evaluation_recommandeur():
+    """Jeu synthétique au format des pickles, métriques de qualité et rapport par étape"""
+    print("🧪 Test du banc d'évaluation...")
+    from artefacts_colonnes import COLONNES_DF_GROUPED, COLONNES_METADATA
+    from evaluation_recommandeur import (ETAPES, EncodeurHachage, convertir_similarite, evaluer,
+                                         generer_jeu_synthetique, matrice_dense, metriques_qualite,
+                                         preparer_artefacts, recommander_chronometre,
+                                         regressions_qualite, separer_notes)
+
+    jeu = generer_jeu_synthetique(n_logements=80, n_utilisateurs=150, notes_par_utilisateur=8)
+    assert set(COLONNES_DF_GROUPED) <= set(jeu['df_grouped'].columns)
+    assert set(COLONNES_METADATA) <= set(jeu['metadata'].columns)
+    assert jeu['df_grouped']['id_listing'].nunique() == 80
+    assert matrice_dense(jeu['notes']).shape[1] <= 80
+
+    train, test = separer_notes(jeu['notes'])
+    assert len(train) + len(test) == len(jeu['notes']) and (test['note'] >= 4).all()
+    assert not set(train.index) & set(test.index)
+
+    # Premier attendu en tête, second absent : précision 1/2, rappel 1/2, NDCG 1/(1 + 1/log2(3))
+    qualite = metriques_qualite([[1, 2]], [{1, 3}], k=2, n_logements=4)
+    assert qualite['precision@2'] == 0.5 and qualite['rappel@2'] == 0.5
+    assert np.isclose(qualite['ndcg@2'], 1 / (1 + 1 / np.log2(3))) and qualite['couverture'] == 0.5
+
+    rapport = evaluer(n_logements=80, n_utilisateurs=150, notes_par_utilisateur=8, n_requetes=40, k=5)
+    assert set(ETAPES) | {'total'} == set(rapport['latences_ms'])
+    assert rapport['latences_ms']['total']['p50'] <= rapport['latences_ms']['total']['p99']
+    # Bien au-dessus d'un tirage au hasard (rappel@5 d'environ 5 / 80)
+    assert rapport['qualite']['rappel@5'] > 0.3
+    assert regressions_qualite(rapport, rapport) == {}
+    assert 'precision@5' in regressions_qualite(rapport, {'qualite': {'precision@5': 1.0}})
+
+    # Modes servis : tables pré-calculées (mêmes résultats, étapes évitées) et formes compressées
+    artefacts = preparer_artefacts(jeu, train, EncodeurHachage(), precalcul=('voisins',))
+    precalcules = preparer_artefacts(jeu, train, EncodeurHachage(), precalcul=('voisins', 'recommandations'))
+    assert artefacts['table_precalculee'] is None and len(precalcules['table_precalculee'])
+    for titre in artefacts['logements_titres']['title'].iloc[:20]:
+        recommandations, durees = recommander_chronometre(artefacts, titre, top_n=5)
+        servies, durees_servies = recommander_chronometre(precalcules, titre, top_n=5)
+        assert [r['id_listing'] for r in servies] == [r['id_listing'] for r in recommandations]
+        assert 'knn' not in durees and 'scoring' not in durees_servies
+    dense = np.random.default_rng(0).random((30, 30), dtype=np.float32)
+    assert np.allclose(convertir_similarite(dense, 'float16')[3, [1, 2]], dense[3, [1, 2]], atol=1e-3)
+    assert np.array_equal(convertir_similarite(dense, 'topk', k=30)[3, np.arange(30)], dense[3])
+    rapport = evaluer(n_logements=80, n_utilisateurs=150, notes_par_utilisateur=8, n_requetes=10, k=5,
+                      format_similarite='topk', k_similarite=20, precalcul=('voisins',))
+    assert rapport['parametres']['similarite'] == 'topk' and rapport['parametres']['precalcul'] == ['voisins']
+
+    print("   ✅ Banc d'évaluation OK")
+
+
+def test_metriques():
+    """Chronomètre par étape et exposition des histogrammes au format Prometheus"""
+    print("🧪 Test des métriques...")
+    from metriques import Chronometre, RegistreMetriques, percentiles
+
+    chrono = Chronometre()
+    chrono.marquer('encodage')
+    chrono.marquer('knn')
+    chrono.marquer('encodage')
+    assert list(chrono.durees) == ['encodage', 'knn'] and all(d >= 0 for d in chrono.durees.values())
+
+    registre = RegistreMetriques()
+    duree = registre.histogramme('etape_secondes', 'Durée', seaux=(0.1, 1.0), etiquettes=('etape',))
+    compteur = registre.compteur('reponses_total', 'Réponses', etiquettes=('source',))
+    for valeur in (0.05, 0.5, 0.1, 3.0):
+        duree.observer(valeur, etape='knn')
+    compteur.incrementer(source='cache')
+    compteur.incrementer(2, source='cache')
+
+    texte = registre.exposer()
+    assert '# TYPE etape_secondes histogram' in texte and '# TYPE reponses_total counter' in texte
+    lignes = {l.split(' ')[0]: l.split(' ')[1] for l in texte.splitlines() if not l.startswith('#')}
+    # Seaux cumulés : une borne est incluse dans son seau
+    seau = lambda borne: lignes[f'etape_secondes_bucket{{etape="knn",worker="{os.getpid()}",le="{borne}"}}']
+    assert (seau('0.1'), seau('1.0'), seau('+Inf')) == ('2', '3', '4')
+    assert float(lignes[f'etape_secondes_sum{{etape="knn",worker="{os.getpid()}"}}']) == 3.65
+    assert lignes[f'reponses_total{{source="cache",worker="{os.getpid()}"}}'] == '3'
+
+    valeurs = np.random.default_rng(0).random(101)
+    assert np.allclose(list(percentiles(valeurs, 1000).values()), np.percentile(valeurs * 1000, [50, 95, 99]))
+    assert percentiles([]) == {'p50': None, 'p95': None, 'p99': None}
+
+    print("   ✅ Métriques OK")
+
+
+def test_api_flask():
+    """Endpoints de app.py sur un jeu synthétique : lots, validation, cache, /ready, /stats, /metrics"""
+    print("🧪 Test de l'API Flask...")
+    import importlib.util
+    import json
+    import pickle
+    import encodeur_onnx
+    from evaluation_recommandeur import EncodeurHachage, generer_jeu_synthetique, sauvegarder_jeu
+
+    if not all(importlib.util.find_spec(m) for m in ('flask', 'flasgger', 'flask_cors')):
+        print("   ⏭️ API ignorée (flask, flasgger ou flask-cors absent)")
+        return
+    if not hasattr(os, 'mkfifo'):
+        print("   ⏭️ API ignorée (os.mkfifo indisponible)")
+        return
+
+    jeu = generer_jeu_synthetique(n_logements=60, n_utilisateurs=120, notes_par_utilisateur=8)
+    titres = jeu['df_grouped'].drop_duplicates('id_listing')['title'].tolist()[:3]
+    variables = {'MAX_BATCH_SIZE': '3', 'RECO_ARTEFACT_CHECK_S': '0',
+                 'RECO_EMBEDDING_CACHE_DIR': None, 'RECO_CACHE_REDIS_URL': None}
+    anciennes = {nom: os.environ.get(nom) for nom in variables}
+    dossier_initial = os.getcwd()
+    with tempfile.TemporaryDirectory() as dossier:
+        sauvegarder_jeu(jeu, dossier)
+        # knn_model.pkl en tube nommé : son chargement attend que le test l'écrive
+        with open(os.path.join(dossier, 'knn_model.pkl'), 'rb') as f:
+            knn = f.read()
+        os.remove(os.path.join(dossier, 'knn_model.pkl'))
+        os.mkfifo(os.path.join(dossier, 'knn_model.pkl'))
+        module = None
+        # Le jeu synthétique est encodé sans modèle BERT : app.py importe le chargeur patché
+        charger_origine = encodeur_onnx.charger_modele_embeddings
+        encodeur_onnx.charger_modele_embeddings = lambda nom_modele, *args, **kwargs: EncodeurHachage()
+        try:
+            for nom, valeur in variables.items():
+                os.environ.pop(nom, None) if valeur is None else os.environ.__setitem__(nom, valeur)
+            os.chdir(dossier)
+            chemin = os.path.join(sys.path[0], 'app.py')
+            spec = importlib.util.spec_from_file_location('app_test', chemin)
+            module = importlib.util.module_from_spec(spec)
+            spec.loader.exec_module(module)
+            client = module.app.test_client()
+
+            reponse = client.get('/ready')
+            assert reponse.status_code == 503 and reponse.get_json()['status'] == 'loading'
+            with open('knn_model.pkl', 'wb') as f:
+                f.write(knn)
+            module.registre.attendre(timeout=60)
+            reponse = client.get('/ready')
+            assert reponse.status_code == 200 and reponse.get_json()['status'] == 'ready'
+
+            # Un lot et des appels séparés (caches vidés entre les deux) donnent les mêmes réponses
+            lot = client.post('/recommend/batch', json={'requests': titres[:2] + [
+                {'title': titres[2], 'top_n': 3, 'weights': [{'alpha': 1.0, 'beta': 0.0}]}]})
+            assert lot.status_code == 200
+            module.cache_reponses.invalider()
+            module.cache_candidats.invalider()
+            separes = [client.post('/recommend', json={'title': titres[0]}).get_json(),
+                       client.post('/recommend', json={'title': titres[1]}).get_json(),
+                       client.post('/recommend', json={'title': titres[2], 'top_n': 3,
+                                                       'weights': [{'alpha': 1.0, 'beta': 0.0}]}).get_json()]
+            assert lot.get_json()['results'] == separes
+            assert all(len(r['recommendations']) for r in separes) and len(separes[2]['weightings']) == 1
+
+            for corps, message in (({}, 'requests must be a non-empty list'),
+                                   ({'requests': []}, 'requests must be a non-empty list'),
+                                   ({'requests': ['a', 'b', 'c', 'd']}, 'At most 3 requests per batch'),
+                                   ({'requests': ['a', {'top_n': 2}]}, 'requests[1]: title is required'),
+                                   ({'requests': [{'title': 'a', 'top_n': 0}]}, 'requests[0]: top_n must be >= 1'),
+                                   ({'requests': [{'title': 'a', 'weights': 'x'}]}, 'requests[0]: weights')):
+                reponse = client.post('/recommend/batch', json=corps)
+                assert reponse.status_code == 400 and reponse.get_json()['error'].startswith(message)
+            assert client.post('/recommend/batch', json={'requests': titres}).status_code == 200
+
+            # Deuxième appel servi par le cache, abandonné quand un artefact change sur le disque
+            statistiques = lambda: client.get('/stats/cache').get_json()
+            avant = statistiques()
+            premiere = client.post('/recommend', json={'title': titres[0], 'top_n': 4}).get_json()
+            assert client.post('/recommend', json={'title': titres[0], 'top_n': 4}).get_json() == premiere
+            assert statistiques()['hits'] == avant['hits'] + 1
+            etat = os.stat('df_grouped.pkl')
+            os.utime('df_grouped.pkl', ns=(etat.st_atime_ns, etat.st_mtime_ns + 10 ** 9))
+            assert client.post('/recommend', json={'title': titres[0], 'top_n': 4}).get_json() == premiere
+            apres = statistiques()
+            # Cache vidé et désactivé : ce worker sert encore les artefacts chargés
+            assert apres['hits'] == avant['hits'] + 1 and apres['invalidations'] == avant['invalidations'] + 1
+            assert not apres['actif'] and apres['entrees'] == 0 and not apres['candidats']['actif']
+
+            encodeur = client.get('/stats/encoder').get_json()
+            assert encodeur['requetes'] >= 1 and encodeur['latence_ms']['p50'] is not None
+            embeddings = client.get('/stats/embeddings').get_json()
+            assert embeddings['modele'] == 'hachage-256' and embeddings['hits_memoire'] >= 1
+
+            texte = client.get('/metrics').get_data(as_text=True)
+            assert f'recommandation_reponses_total{{source="cache",worker="{os.getpid()}"}}' in texte
+            assert 'recommandation_reponses_total{source="calcul"' in texte
+            assert 'http_requete_secondes_count{endpoint="recommend_batch",statut="400"' in texte
+        finally:
+            encodeur_onnx.charger_modele_embeddings = charger_origine
+            os.chdir(dossier_initial)
+            if module is not None:
+                module.registre.fermer()
+            for nom, valeur in anciennes.items():
+                os.environ.pop(nom, None) if valeur is None else os.environ.__setitem__(nom, valeur)
+
+    print("   ✅ API Flask OK")
+
+
+if __name__ == "__main__":
+    test_embeddings_titres()
+    test_index_titres()
+    test_stockage_similarite()
+    test_scoring_hybride()
+    test_index_logements()
+    test_matrice_utilisateur_item()
+    test_recommandations_precalculees()
+    test_voisins_precalcules()
+    test_registre_artefacts()
+    test_artefacts_colonnes()
+    test_encodeur_micro_lots()
+    test_encodeur_requete_isolee()
+    test_cache_reponses()
+    test_cache_embeddings()
+    test_encodeur_onnx()
+    test_evaluation_recommandeur()
+    test_metriques()
+    test_api_flask()
+    print("\n✅ TOUS LES TESTS RÉUSSIS !")